@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 from database_manager import DatabaseManager
 from official_place_database import OfficialPlaceDatabase
+from name_normalize import public_row
 from exif_manager import ExifManager
 import os
 from place_database_manager import PlaceDatabaseManager
@@ -38,7 +39,7 @@ def get_official_place(place_id):
     row = c.fetchone()
     sqlite_conn.close()
     if row:
-        return jsonify(dict(row))
+        return jsonify(public_row(row))
     else:
         return jsonify({'error': 'Place not found'}), 404
 
@@ -1,18 +1,47 @@
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, stream_with_context
 
-import re
 import os
+import time
 from flask_cors import CORS
 from database_manager import DatabaseManager
 from place_database_manager import PlaceDatabaseManager
 from official_place_database import OfficialPlaceDatabase
+from name_normalize import public_row
+from place_hierarchy import AncestryField, HierarchyResolver
+from place_tree_cache import PlaceTreeCache
+from place_matcher import MATCH_THRESHOLD, PlaceMatcher, parse_place_string
 from exif_manager import ExifManager
+from media_index import MediaIndex, parse_bbox
+from media_watcher import MEDIA_WATCH_ENV, MediaWatcher
+import sqlite_pool
+from json_stream import NDJSON_MIMETYPE, iter_json_array, iter_ndjson
 
 
 app = Flask(__name__)
 CORS(app)  # Aktivera CORS för alla routes
 
+# Lämna tillbaka SQLite-anslutningar till poolen efter varje request
+@app.teardown_appcontext
+def release_db_connections(exc):
+    sqlite_pool.release_all()
+
+# Statistik för anslutningspoolerna (träffar/missar per databas)
+@app.route('/debug/pool_stats')
+def get_pool_stats():
+    return jsonify(sqlite_pool.pool_stats())
+
+def wants_stream():
+    # Strömmat svar: Accept: application/x-ndjson eller ?stream=1 (chunkad JSON-array)
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE or request.args.get('stream') == '1'
+
+def streamed_response(items):
+    """Svar från en generator; anslutningen i poolen hålls tills hela svaret är skickat."""
+    if request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return app.response_class(stream_with_context(iter_ndjson(items)), mimetype=NDJSON_MIMETYPE)
+    return app.response_class(stream_with_context(iter_json_array(items)), mimetype='application/json')
+
 # Proxy till Riksarkivets Sök-API (REST)
 @app.route('/riksarkivet_search')
 def riksarkivet_search():
@@ -32,6 +61,12 @@ db = DatabaseManager()
 place_db = PlaceDatabaseManager()
 place_db.create_table()
 exif_manager = ExifManager()
+# Metadataindex över bildmappar (rötter via /media/roots eller miljövariabeln MEDIA_ROOTS)
+media_index = MediaIndex(exif_manager)
+# Håller indexet aktuellt via inotify/polling; startas via /media/watch/start eller MEDIA_WATCH=auto|inotify|poll
+media_watcher = MediaWatcher(media_index, exif_manager)
+if os.environ.get(MEDIA_WATCH_ENV, '') not in ('', '0'):
+    media_watcher.start(os.environ[MEDIA_WATCH_ENV])
 # Sätt absolut path till official_places.db i samma mapp som denna fil
 
 """
@@ -42,11 +77,18 @@ ALT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'WestFa
 if os.path.exists(ALT_PATH):
     OFFICIAL_PLACES_PATH = ALT_PATH
 
+def _page_args():
+    # Sidindelning av /official_places/all är frivillig: utan ?limit/?after returneras hela listan
+    after = request.args.get('after')
+    limit = request.args.get('limit', type=int)
+    if after is None and limit is None:
+        return None
+    return {'after': after, 'limit': limit}
+
 # Hämta alla kommuner (oberoende av län)
 @app.route('/official_places/kommuner')
 def get_all_kommuner():
-    import sqlite3
-    conn = sqlite3.connect(official_place_db.db_path)
+    conn = official_place_db.pool.connection()
     c = conn.cursor()
     c.execute('''
         SELECT DISTINCT kommunkod, kommunnamn FROM official_places
@@ -54,14 +96,12 @@ def get_all_kommuner():
         ORDER BY kommunnamn
     ''')
     result = [{'kommunkod': row[0], 'kommunnamn': row[1]} for row in c.fetchall()]
-    conn.close()
     return jsonify(result)
 
 # Hämta alla församlingar (oberoende av kommun)
 @app.route('/official_places/forsamlingar')
 def get_all_forsamlingar():
-    import sqlite3
-    conn = sqlite3.connect(official_place_db.db_path)
+    conn = official_place_db.pool.connection()
     c = conn.cursor()
     c.execute('''
         SELECT DISTINCT sockenstadkod, sockenstadnamn FROM official_places
@@ -69,14 +109,12 @@ def get_all_forsamlingar():
         ORDER BY sockenstadnamn
     ''')
     result = [{'sockenstadkod': row[0], 'sockenstadnamn': row[1]} for row in c.fetchall()]
-    conn.close()
     return jsonify(result)
 
 # Hämta alla orter (oberoende av församling)
 @app.route('/official_places/orter')
 def get_all_orter():
-    import sqlite3
-    conn = sqlite3.connect(official_place_db.db_path)
+    conn = official_place_db.pool.connection()
     c = conn.cursor()
     c.execute('''
         SELECT DISTINCT id, ortnamn FROM official_places
@@ -84,7 +122,6 @@ def get_all_orter():
         ORDER BY ortnamn
     ''')
     result = [{'id': row[0], 'ortnamn': row[1]} for row in c.fetchall()]
-    conn.close()
     return jsonify(result)
 print(f"[DEBUG] Backend använder official_places.db på: {OFFICIAL_PLACES_PATH}")
 import os
@@ -93,6 +130,8 @@ if os.path.exists(OFFICIAL_PLACES_PATH):
 else:
     print(f"[DEBUG] Filen finns INTE: {OFFICIAL_PLACES_PATH}")
 official_place_db = OfficialPlaceDatabase(db_path=OFFICIAL_PLACES_PATH)
+place_tree_cache = PlaceTreeCache(official_place_db)
+place_matcher = PlaceMatcher(official_place_db)
 
 # --- Hierarkiska plats-API:er ---
 # Hämta alla län
@@ -115,21 +154,29 @@ def get_forsamlingar_for_kommun(kommunkod):
 def get_orter_for_forsamling(sockenstadkod):
     return jsonify(official_place_db.get_orter_for_forsamling(sockenstadkod))
 
+# Lat trädnavigering: en sida barn till en nod, med antal platser per barn
+# GET /official_places/children/<lan|kommun|forsamling|ort>?lanskod=&kommunkod=&sockenstadkod=&after=&limit=
+@app.route('/official_places/children/<level>')
+def get_place_children(level):
+    codes = {key: request.args.get(key) for key in ('lanskod', 'kommunkod', 'sockenstadkod')}
+    try:
+        return jsonify(official_place_db.get_place_children(
+            level, after=request.args.get('after'), limit=request.args.get('limit', type=int), **codes
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 # --- ROUTES ---
 
 
 # GET /official_places/<id>
 @app.route('/official_places/<int:place_id>', methods=['GET'])
 def get_official_place(place_id):
-    import sqlite3
-    sqlite_conn = sqlite3.connect(official_place_db.db_path)
-    sqlite_conn.row_factory = sqlite3.Row
-    c = sqlite_conn.cursor()
+    c = official_place_db.pool.connection().cursor()
     c.execute('SELECT * FROM official_places WHERE id = ?', (place_id,))
     row = c.fetchone()
-    sqlite_conn.close()
     if row:
-        return jsonify(dict(row))
+        return jsonify(public_row(row))
     else:
         return jsonify({'error': 'Place not found'}), 404
 
@@ -139,7 +186,10 @@ def update_official_place(place_id):
     if not data:
         return jsonify({'error': 'Missing data'}), 400
     try:
+        version_before = official_place_db.get_data_version()
+        before = official_place_db.get_official_place(place_id)
         updated = official_place_db.update_official_place(place_id, data)
+        place_tree_cache.invalidate([before, official_place_db.get_official_place(place_id)], version_before)
         return jsonify(updated)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -147,12 +197,11 @@ def update_official_place(place_id):
 @app.route('/official_places/<int:place_id>', methods=['DELETE'])
 def delete_official_place(place_id):
     try:
-        import sqlite3
-        conn = sqlite3.connect(OFFICIAL_PLACES_PATH)
-        c = conn.cursor()
-        c.execute('DELETE FROM official_places WHERE id = ?', (place_id,))
-        conn.commit()
-        conn.close()
+        version_before = official_place_db.get_data_version()
+        before = official_place_db.get_official_place(place_id)
+        with official_place_db.pool.transaction() as conn:
+            conn.execute('DELETE FROM official_places WHERE id = ?', (place_id,))
+        place_tree_cache.invalidate([before], version_before)
         return jsonify({'status': 'deleted', 'id': place_id})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -161,76 +210,48 @@ def delete_official_place(place_id):
 @app.route('/official_places/search')
 def search_official_places():
     q = request.args.get('q', '')
-    results = official_place_db.search_places(q)
+    limit = request.args.get('limit', 50, type=int)
+    results = official_place_db.search_places(q, limit=limit)
     print(f'[DEBUG] Sökfråga: "{q}", antal träffar: {len(results)}')
     if results:
         print('[DEBUG] Exempelplats:', results[0])
     return jsonify(results)
 
+# Rankade matchningar i officiella registret för en platssträng
+# GET /official_places/match?q=Ekby, Kalmar län, Sverige&limit=5
+@app.route('/official_places/match')
+def match_official_places():
+    q = request.args.get('q', '')
+    limit = request.args.get('limit', 5, type=int)
+    return jsonify({'query': q, 'components': parse_place_string(q), 'matches': place_matcher.match(q, limit=limit)})
+
+# Statistik för platsmatchningen (cacheträffar, blockning, antal poängsatta kandidater)
+@app.route('/debug/place_matcher_stats')
+def get_place_matcher_stats():
+    return jsonify(place_matcher.stats)
+
 # Hämta ALLA officiella platser (för register-träd)
 @app.route('/official_places/all')
 def get_all_official_places():
+    page = _page_args()
+    if page is not None:
+        try:
+            return jsonify(official_place_db.get_places_page(**page))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if wants_stream():
+        return streamed_response(official_place_db.iter_all_places())
     return jsonify(official_place_db.get_all_places())
 
 # Flytta ut full_tree till toppnivå
+# Trädet byggs en gång och cachas (minne + disk); ändringar invaliderar bara berörd kommun
 @app.route('/official_places/full_tree')
 def get_full_tree():
-    # Hämta alla platser som lista
-    all_places = official_place_db.get_all_places() if hasattr(official_place_db, 'get_all_places') else []
-    print('[DEBUG] Antal platser:', len(all_places))
-    if all_places:
-        print('[DEBUG] Exempelplats:', all_places[0])
-    else:
-        print('[DEBUG] Inga platser hittades i official_places.db!')
-    import json
-    print('[DEBUG] Första 5 platser:', json.dumps(all_places[:5], ensure_ascii=False, indent=2))
-    # Filtrera bort platser utan län, kommun och församling/ort
-    filtered = [p for p in all_places if p.get('region') and p.get('municipality') and (p.get('parish') or p.get('village'))]
-    print(f'[DEBUG] Platser efter filtrering: {len(filtered)}')
-    # Bygg hierarki: Country > Region > Municipality > Parish > Village
-    tree = {}
-    for place in filtered:
-        country = place.get('country', 'Sverige') or 'Sverige'
-        region = place.get('region')
-        municipality = place.get('municipality')
-        parish = place.get('parish')
-        village = place.get('village')
-        # Bygg träd
-        if country not in tree:
-            tree[country] = {'country': country, 'children': {}}
-        if region not in tree[country]['children']:
-            tree[country]['children'][region] = {'region': region, 'children': {}}
-        if municipality not in tree[country]['children'][region]['children']:
-            tree[country]['children'][region]['children'][municipality] = {'municipality': municipality, 'children': {}}
-        if parish:
-            if parish not in tree[country]['children'][region]['children'][municipality]['children']:
-                tree[country]['children'][region]['children'][municipality]['children'][parish] = {'parish': parish, 'children': {}}
-            parish_node = tree[country]['children'][region]['children'][municipality]['children'][parish]
-        else:
-            parish_node = None
-        if village:
-            if parish_node:
-                if village not in parish_node['children']:
-                    parish_node['children'][village] = {'village': village, 'children': {}}
-                village_node = parish_node['children'][village]
-            else:
-                if village not in tree[country]['children'][region]['children'][municipality]['children']:
-                    tree[country]['children'][region]['children'][municipality]['children'][village] = {'village': village, 'children': {}}
-                village_node = tree[country]['children'][region]['children'][municipality]['children'][village]
-    # Konvertera till arraystruktur för frontend
-    def node_to_array(node, level=0):
-        arr = []
-        for key, value in node.items():
-            item = {k: v for k, v in value.items() if k != 'children'}
-            if isinstance(value.get('children'), dict):
-                item['children'] = node_to_array(value['children'], level+1)
-            else:
-                item['children'] = value.get('children', [])
-            arr.append(item)
-        return arr
-    tree_array = node_to_array(tree)
-    return jsonify({'list': filtered, 'tree': tree_array})
-    return jsonify(official_place_db.get_all_places())
+    payload, etag = place_tree_cache.get_payload()
+    response = app.response_class(payload, mimetype='application/json')
+    response.set_etag(etag)
+    # Svarar 304 Not Modified om klientens If-None-Match matchar
+    return response.make_conditional(request)
 
 # Skapa ny officiell plats
 @app.route('/official_places', methods=['POST'])
@@ -250,9 +271,6 @@ def create_official_place():
     latitude = data.get('latitude')
     longitude = data.get('longitude')
 
-    import sqlite3
-    conn = sqlite3.connect(OFFICIAL_PLACES_PATH)
-    c = conn.cursor()
     # Mappa typ till kolumnsättning
     # Village/Building/Cemetary: sätt ortnamn + överliggande kommun/län
     # Parish: sätt sockenstadnamn/kod + överliggande kommun/län
@@ -280,29 +298,34 @@ def create_official_place():
     if sockenstadkod: values[2] = sockenstadkod
     if sockenstadnamn: values[1] = sockenstadnamn
 
-    c.execute(f'''
-        INSERT INTO official_places ({','.join(cols)})
-        VALUES (?,?,?,?,?,?,?,?,?,?,?)
-    ''', values)
-    new_id = c.lastrowid
-    conn.commit()
+    version_before = official_place_db.get_data_version()
+    with official_place_db.pool.transaction() as conn:
+        c = conn.execute(f'''
+            INSERT INTO official_places ({','.join(cols)})
+            VALUES (?,?,?,?,?,?,?,?,?,?,?)
+        ''', values)
+        new_id = c.lastrowid
+    official_place_db.refresh_normalized_columns()
     # Returnera skapad rad
-    conn.row_factory = sqlite3.Row
     cur = conn.cursor()
     cur.execute('SELECT * FROM official_places WHERE id = ?', (new_id,))
     row = cur.fetchone()
-    conn.close()
-    return jsonify(dict(row)), 201
+    place = public_row(row)
+    place_tree_cache.invalidate([place], version_before)
+    return jsonify(place), 201
 
 @app.route('/places/unmatched')
 def get_unmatched_places():
-    # Hämta alla personer (med events) från genealogy.db
-    try:
-        all_people = db.get_all_people_with_events() if hasattr(db, 'get_all_people_with_events') else []
-    except Exception as e:
-        print(f"[BACKEND] Kunde inte hämta personer/events: {e}")
-        all_people = []
-    return jsonify(place_db.get_unmatched_places(person_event_data=all_people))
+    # Person/händelse-kopplingar hämtas per sida platser via indexet events.place_id i genealogy.db
+    def link_lookup(place_ids):
+        try:
+            return db.get_place_links(place_ids)
+        except Exception as e:
+            print(f"[BACKEND] Kunde inte hämta personer/events: {e}")
+            return {}
+    if wants_stream():
+        return streamed_response(place_db.iter_unmatched_places(link_lookup=link_lookup))
+    return jsonify(place_db.get_unmatched_places(link_lookup=link_lookup))
 
 @app.route('/place/<int:place_id>/match', methods=['PATCH'])
 def update_matched_place(place_id):
@@ -314,45 +337,6 @@ def update_matched_place(place_id):
     return jsonify({'status': 'ok'})
 
 
-# --- Platssträngsparser enligt svensk/amerikansk logik ---
-def parse_place_string(plac_string):
-    if not plac_string or not isinstance(plac_string, str):
-        return {}
-    parts = [p.strip() for p in plac_string.split(',') if p.strip()]
-    if not parts:
-        return {}
-    country = parts[-1].lower()
-    sweden_keywords = ['sverige', 'sweden', 'swe']
-    usa_keywords = ['usa', 'united states', 'amerika', 'america']
-    sweden_lan_suffix = 'län'
-    us_state_regex = re.compile(r'^[A-Z]{2}$')
-    result = {}
-    # Landstyp
-    if country in sweden_keywords:
-        result['type'] = 'sweden'
-    elif country in usa_keywords:
-        result['type'] = 'usa'
-    elif country.endswith(sweden_lan_suffix):
-        result['type'] = 'sweden'
-    elif us_state_regex.match(parts[-1]):
-        result['type'] = 'usa'
-    # Fältmappning
-    if result.get('type') == 'sweden':
-        # Gård/Torp, By, Socken, Län, Land
-        result['country'] = parts[-1] if len(parts) > 0 else ''
-        result['region'] = parts[-2] if len(parts) > 1 else ''
-        result['parish'] = parts[-3] if len(parts) > 2 else ''
-        result['village'] = parts[-4] if len(parts) > 3 else ''
-        result['specific'] = parts[-5] if len(parts) > 4 else ''
-    elif result.get('type') == 'usa':
-        # Stad, County, Stat, Land
-        result['country'] = parts[-1] if len(parts) > 0 else ''
-        result['region'] = parts[-2] if len(parts) > 1 else ''
-        result['municipality'] = parts[-3] if len(parts) > 2 else ''
-        result['village'] = parts[-4] if len(parts) > 3 else ''
-        result['specific'] = parts[-5] if len(parts) > 4 else ''
-    return result
-
 @app.route('/place', methods=['POST'])
 def add_place():
     data = request.get_json()
@@ -366,47 +350,17 @@ def add_place():
             if key in parsed:
                 data[key] = parsed[key]
 
-    import difflib
     import sys
-    def is_full_match(official, incoming):
-        for key in ['country', 'region', 'municipality', 'parish', 'village', 'specific']:
-            v1 = (official.get(key) or '').strip().lower()
-            v2 = (incoming.get(key) or '').strip().lower()
-            if v2 and v1 != v2:
-                return False
-        return True
-
-    def fuzzy_match(official, incoming):
-        # Matcha på ortnamn + region/län, case-insensitive, tillåt små stavfel
-        ort1 = (official.get('ortnamn') or '').strip().lower()
-        ort2 = (incoming.get('village') or incoming.get('parish') or incoming.get('name') or '').strip().lower()
-        lan1 = (official.get('lansnamn') or '').strip().lower()
-        lan2 = (incoming.get('region') or '').strip().lower()
-        # Exakt eller nära match på ortnamn
-        ort_match = ort1 and ort2 and (ort1 == ort2 or difflib.SequenceMatcher(None, ort1, ort2).ratio() > 0.85)
-        lan_match = not lan1 or not lan2 or lan1 == lan2
-        return ort_match and lan_match
-
+    # Kandidater blockas via index och rankas med poäng (se place_matcher)
     match_id = None
     match_reason = ""
     try:
-        candidates = official_place_db.search_places(data.get('name', ''))
-        if candidates:
-            for cand in candidates:
-                if is_full_match(cand, data):
-                    match_id = cand.get('id')
-                    match_reason = "EXACT"
-                    break
-            if not match_id:
-                # Fuzzy fallback
-                for cand in candidates:
-                    if fuzzy_match(cand, data):
-                        match_id = cand.get('id')
-                        match_reason = "FUZZY"
-                        break
+        best = place_matcher.best_match(data)
+        if best:
+            match_id = best['id']
+            match_reason = f"{best['reason']} {best['score']:.2f}"
     except Exception as e:
         print(f"[BACKEND] OFFICIAL PLACE MATCH ERROR: {e}", file=sys.stderr)
-        candidates = []
         match_id = None
     if match_id:
         data['matched_place_id'] = match_id
@@ -423,8 +377,103 @@ def add_place():
         new_place['matched_place_id'] = None
     return jsonify(new_place)
 
+# Textfält i /places/bulk-objekt (sträng eller null)
+BULK_PLACE_TEXT_FIELDS = ('name', 'country', 'region', 'municipality', 'parish', 'village', 'specific', 'coordinates', 'note')
+
+# Matcha och spara många platssträngar på en gång (t.ex. alla platser i ett importerat träd)
+# POST /places/bulk {"places": ["Ekby, Kalmar län, Sverige", {"name": ..., "parish": ...}, ...]}
+@app.route('/places/bulk', methods=['POST'])
+def add_places_bulk():
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a JSON object'}), 400
+    items = data.get('places')
+    if not isinstance(items, list):
+        return jsonify({'error': 'Missing places'}), 400
+    threshold = data.get('threshold', MATCH_THRESHOLD)
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1:
+        return jsonify({'error': 'threshold must be a number between 0 and 1'}), 400
+    for index, item in enumerate(items):
+        if item is None or isinstance(item, str):
+            continue
+        if not isinstance(item, dict):
+            return jsonify({'error': f'places[{index}] must be a string or an object'}), 400
+        for field in BULK_PLACE_TEXT_FIELDS:
+            if not isinstance(item.get(field), (str, type(None))):
+                return jsonify({'error': f'places[{index}].{field} must be a string or null'}), 400
+        matched_place_id = item.get('matched_place_id')
+        if isinstance(matched_place_id, bool) or not isinstance(matched_place_id, (int, str, type(None))):
+            return jsonify({'error': f'places[{index}].matched_place_id must be an integer, a string or null'}), 400
+    start = time.perf_counter()
+    # Tolka och slå ihop identiska platser
+    unique = []
+    index_for_key = {}
+    item_slots = []
+    for item in items:
+        place = {'name': item} if isinstance(item, str) else dict(item or {})
+        name = (place.get('name') or '').strip()
+        if not name:
+            item_slots.append(None)
+            continue
+        place['name'] = name
+        parsed = parse_place_string(name)
+        for key in ['country', 'region', 'municipality', 'parish', 'village', 'specific']:
+            if not place.get(key) and key in parsed:
+                place[key] = parsed[key]
+        key = tuple(sorted((k, str(v)) for k, v in place.items() if v not in (None, '')))
+        if key not in index_for_key:
+            index_for_key[key] = len(unique)
+            unique.append(place)
+        item_slots.append(index_for_key[key])
+    parsed_at = time.perf_counter()
+    # Matcha alla unika platser i ett svep
+    matches = place_matcher.match_many(unique, limit=1)
+    for place, found in zip(unique, matches):
+        best = found[0] if found and found[0]['score'] >= threshold else None
+        if best:
+            place['matched_place_id'] = best['id']
+        elif place.get('matched_place_id') in ['', 'null']:
+            place['matched_place_id'] = None
+        place['_match'] = best
+    matched_at = time.perf_counter()
+    # Spara i en transaktion
+    new_ids = place_db.add_places(unique)
+    stored_at = time.perf_counter()
+
+    results = []
+    for index, slot in enumerate(item_slots):
+        if slot is None:
+            results.append({'index': index, 'error': 'Missing name'})
+            continue
+        place = unique[slot]
+        best = place['_match']
+        results.append({
+            'index': index,
+            'id': new_ids[slot],
+            'name': place['name'],
+            'matched_place_id': place.get('matched_place_id'),
+            'score': best['score'] if best else None,
+            'reason': best['reason'] if best else None,
+        })
+    elapsed = stored_at - start
+    stats = {
+        'received': len(items),
+        'unique': len(unique),
+        'matched': sum(1 for place in unique if place['_match']),
+        'inserted': len(new_ids),
+        'parse_seconds': round(parsed_at - start, 4),
+        'match_seconds': round(matched_at - parsed_at, 4),
+        'insert_seconds': round(stored_at - matched_at, 4),
+        'total_seconds': round(elapsed, 4),
+        'places_per_second': round(len(items) / elapsed, 1) if elapsed else None,
+    }
+    print(f"[BACKEND] Bulkimport: {stats}")
+    return jsonify({'results': results, 'stats': stats})
+
 @app.route('/places')
 def get_places():
+    if wants_stream():
+        return streamed_response(place_db.iter_all_places())
     return jsonify(place_db.get_all_places())
 
 @app.route('/search')
@@ -441,6 +490,20 @@ def parents(id):
     father, mother = db.get_parents(id)
     return jsonify({'father': father, 'mother': mother})
 
+# Anor/ättlingar i N led i ett anrop (kompakta rader: id, name, birth_date, father_id, mother_id, generation)
+# GET /ancestors/<id>?generations=4&full=1  (full=1 tar med hela persondatan)
+@app.route('/ancestors/<id>')
+def ancestors(id):
+    generations = request.args.get('generations', 4, type=int)
+    full = request.args.get('full') == '1'
+    return jsonify(db.get_ancestors(id, generations=generations, full=full))
+
+@app.route('/descendants/<id>')
+def descendants(id):
+    generations = request.args.get('generations', 4, type=int)
+    full = request.args.get('full') == '1'
+    return jsonify(db.get_descendants(id, generations=generations, full=full))
+
 @app.route('/place/<int:place_id>', methods=['DELETE'])
 def delete_place(place_id):
     try:
@@ -450,116 +513,68 @@ def delete_place(place_id):
         return jsonify({'error': str(e)}), 500
 
 # Import platser från XML (Genney-format)
+GENNEY_IMPORT_FIELDS = (
+    # Närmaste län med förkortning (annars det översta länets namn), närmaste kommun med id
+    AncestryField('lan', lambda p: p.get('type', '').lower() in ('county', 'landscape'),
+                  lambda p: (p.get('name', ''), p.get('abbreviation', '')), default=('', ''),
+                  complete=lambda value: bool(value[1])),
+    AncestryField('kommun', lambda p: p.get('type', '').lower() == 'municipality',
+                  lambda p: (p.get('name', ''), p.get('id', '')), default=('', ''),
+                  complete=lambda value: bool(value[1])),
+)
+
+
+def _genney_place_row(place, ancestry):
+    """Rad för official_places, eller None för typer som inte importeras."""
+    lansnamn, lanskod = ancestry['lan']
+    kommunnamn, kommunkod = ancestry['kommun']
+    place_type = place.get('type', '').lower()
+    # Bestäm vilka fält som ska sparas beroende på typ
+    if place_type == 'parish':
+        names = (None, place.get('name', ''), place.get('id', ''), kommunkod, kommunnamn)
+    elif place_type == 'municipality':
+        names = (None, None, None, place.get('id', ''), place.get('name', ''))
+    elif place_type in ['village', 'building', 'cemetary']:
+        names = (place.get('name', ''), None, None, kommunkod, kommunnamn)
+    else:
+        return None
+    return names + (lanskod, lansnamn, place.get('type', ''), place.get('latitude'), place.get('longitude'))
+
+
 @app.route('/official_places/import_xml', methods=['POST'])
 def import_xml_places():
     try:
+        started = time.perf_counter()
         data = request.get_json()
         places = data.get('places', [])
         
         if not places:
             return jsonify({'error': 'Inga platser att importera'}), 400
         
-        # Skapa en dictionary för att bygga hierarki
-        place_map = {}
-        for place in places:
-            place_map[place['id']] = place
+        # Län/kommun härleds en gång per plats via föräldrarnas (memoiserade) resultat
+        place_map = {place['id']: place for place in places}
+        resolver = HierarchyResolver(place_map, lambda place: place.get('parentid') or None, GENNEY_IMPORT_FIELDS)
+        rows = [row for row in (_genney_place_row(place, resolver.resolve_parent(place)) for place in places) if row]
+        resolved = time.perf_counter()
         
-        # Bygg hierarki och härled län/kommun
-        for place in places:
-            parent_id = place.get('parentid')
-            parent = place_map.get(parent_id) if parent_id else None
-            
-            # Härled län och kommun från parent-hierarkin
-            lanskod = ''
-            lansnamn = ''
-            kommunkod = ''
-            kommunnamn = ''
-            
-            current = parent
-            while current:
-                place_type = current.get('type', '').lower()
-                
-                # Hitta län
-                if place_type in ['county', 'landscape'] and not lanskod:
-                    lansnamn = current.get('name', '')
-                    # Försök hitta länskod (t.ex. "AB", "K", etc.)
-                    abbrev = current.get('abbreviation', '')
-                    if abbrev:
-                        lanskod = abbrev
-                
-                # Hitta kommun
-                if place_type == 'municipality' and not kommunkod:
-                    kommunnamn = current.get('name', '')
-                    kommunkod = current.get('id', '')
-                
-                # Gå till nästa parent
-                parent_id = current.get('parentid')
-                current = place_map.get(parent_id) if parent_id else None
-            
-            # Spara i official_places
-            import sqlite3
-            conn = sqlite3.connect(OFFICIAL_PLACES_PATH)
-            c = conn.cursor()
-            
-            place_type = place.get('type', '').lower()
-            
-            # Bestäm vilka fält som ska sparas beroende på typ
-            if place_type == 'parish':
-                c.execute('''
-                    INSERT OR REPLACE INTO official_places 
-                    (ortnamn, sockenstadnamn, sockenstadkod, kommunkod, kommunnamn, lanskod, lansnamn, detaljtyp, latitude, longitude)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    None,
-                    place.get('name', ''),
-                    place.get('id', ''),
-                    kommunkod,
-                    kommunnamn,
-                    lanskod,
-                    lansnamn,
-                    place.get('type', ''),
-                    place.get('latitude'),
-                    place.get('longitude')
-                ))
-            elif place_type == 'municipality':
-                c.execute('''
-                    INSERT OR REPLACE INTO official_places 
-                    (ortnamn, sockenstadnamn, sockenstadkod, kommunkod, kommunnamn, lanskod, lansnamn, detaljtyp, latitude, longitude)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    None,
-                    None,
-                    None,
-                    place.get('id', ''),
-                    place.get('name', ''),
-                    lanskod,
-                    lansnamn,
-                    place.get('type', ''),
-                    place.get('latitude'),
-                    place.get('longitude')
-                ))
-            elif place_type in ['village', 'building', 'cemetary']:
-                c.execute('''
-                    INSERT OR REPLACE INTO official_places 
-                    (ortnamn, sockenstadnamn, sockenstadkod, kommunkod, kommunnamn, lanskod, lansnamn, detaljtyp, latitude, longitude)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    place.get('name', ''),
-                    None,
-                    None,
-                    kommunkod,
-                    kommunnamn,
-                    lanskod,
-                    lansnamn,
-                    place.get('type', ''),
-                    place.get('latitude'),
-                    place.get('longitude')
-                ))
-            
-            conn.commit()
-            conn.close()
+        # Alla rader skrivs i en transaktion på poolens anslutning
+        with official_place_db.pool.transaction() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO official_places
+                (ortnamn, sockenstadnamn, sockenstadkod, kommunkod, kommunnamn, lanskod, lansnamn, detaljtyp, latitude, longitude)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+        written = time.perf_counter()
         
-        return jsonify({'status': 'success', 'imported': len(places)})
+        official_place_db.refresh_normalized_columns()
+        place_tree_cache.invalidate_all()
+        stats = dict(
+            resolver.stats(),
+            inserted=len(rows),
+            write_ms=round((written - resolved) * 1000, 2),
+            total_ms=round((time.perf_counter() - started) * 1000, 2),
+        )
+        return jsonify({'status': 'success', 'imported': len(places), 'stats': stats})
     
     except Exception as e:
         import traceback
@@ -587,6 +602,30 @@ def read_exif():
     return jsonify(exif_data)
 
 
+@app.route('/exif/cache_stats')
+def exif_cache_stats():
+    """Träffstatistik för EXIF-läscachen"""
+    return jsonify(exif_manager.cache_stats())
+
+
+@app.route('/exif/exiftool_stats')
+def exiftool_stats():
+    """Status för exiftool-poolen (processer, anrop, fel, omstarter)"""
+    return jsonify(exif_manager.exiftool.stats())
+
+
+@app.route('/exif/capabilities')
+def exif_capabilities():
+    """Sparad exiftool-kontroll (tillgänglig, version, funktioner)"""
+    return jsonify(exif_manager.capabilities())
+
+
+@app.route('/exif/capabilities/reload', methods=['POST'])
+def reload_exif_capabilities():
+    """Kontrollerar exiftool igen (t.ex. efter installation/uppgradering)"""
+    return jsonify(exif_manager.capabilities(reload=True))
+
+
 @app.route('/exif/write_keywords', methods=['POST'])
 def write_keywords():
     """
@@ -711,6 +750,60 @@ def copy_metadata():
     return jsonify({'success': success})
 
 
+@app.route('/exif/backups')
+def list_exif_backups():
+    """Backuper nyaste först; ?path= för en bild, ?limit= (standard 100)"""
+    try:
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({
+        'backups': exif_manager.list_backups(request.args.get('path'), limit),
+        'stats': exif_manager.backups.stats(),
+    })
+
+
+@app.route('/exif/backups/<int:backup_id>/restore', methods=['POST'])
+def restore_exif_backup(backup_id):
+    """Återställer en backup; Body (valfri): {"target_path": "/annan/sökväg.jpg"}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        record = exif_manager.restore_backup(backup_id, data.get('target_path'))
+    except KeyError:
+        return jsonify({'error': 'Unknown backup id'}), 404
+    except OSError as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'success': True, 'backup': record})
+
+
+@app.route('/exif/undo', methods=['POST'])
+def undo_exif_write():
+    """Ångrar senaste metadataskrivningen; Body: {"image_path": "/path/to/image.jpg"}"""
+    data = request.get_json(silent=True) or {}
+    image_path = data.get('image_path')
+    if not image_path:
+        return jsonify({'error': 'image_path required'}), 400
+    try:
+        record = exif_manager.undo(image_path)
+    except (OSError, ValueError) as e:
+        return jsonify({'error': str(e)}), 500
+    if record is None:
+        return jsonify({'error': 'No backup for image'}), 404
+    return jsonify({'success': True, 'backup': record})
+
+
+@app.route('/exif/backups/prune', methods=['POST'])
+def prune_exif_backups():
+    """Gallrar backuper; Body (valfri): {"max_bytes": ..., "max_age_days": ...} (annars serverns inställning)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        max_bytes = int(data['max_bytes']) if data.get('max_bytes') is not None else None
+        max_age_days = float(data['max_age_days']) if data.get('max_age_days') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_bytes and max_age_days must be numbers'}), 400
+    return jsonify(exif_manager.backups.prune(max_bytes, max_age_days))
+
+
 @app.route('/exif/batch', methods=['POST'])
 def batch_exif():
     """
@@ -720,7 +813,11 @@ def batch_exif():
         "operation": "read" | "write_keywords" | "write_face_tags" | "remove_metadata",
         "keywords": [...],  // om operation = write_keywords
         "face_tags": [...], // om operation = write_face_tags
+        "max_workers": 4,   // valfritt, max antal samtidiga filer
+        "async": true       // valfritt, svara direkt med job_id (pollas via /exif/batch/<job_id>)
     }
+    Med Accept: application/x-ndjson (eller ?stream=1) strömmas progress-händelser
+    (start, en progress per fil, end) medan jobbet körs.
     """
     data = request.get_json()
     image_paths = data.get('image_paths', [])
@@ -735,10 +832,139 @@ def batch_exif():
     elif operation == 'write_face_tags':
         kwargs['face_tags'] = data.get('face_tags', [])
     
-    results = exif_manager.batch_process(image_paths, operation, **kwargs)
+    try:
+        max_workers = int(data['max_workers']) if data.get('max_workers') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_workers must be an integer'}), 400
+    
+    if data.get('async') or wants_stream():
+        job = exif_manager.start_batch(image_paths, operation, max_workers=max_workers, **kwargs)
+        if data.get('async'):
+            return jsonify(job.to_dict()), 202
+        # Jobbet fortsätter i bakgrunden även om klienten kopplar ner
+        return streamed_response(job.iter_events())
+    
+    results = exif_manager.batch_process(image_paths, operation, max_workers=max_workers, **kwargs)
     return jsonify({'results': results})
 
 
+@app.route('/exif/batch/<job_id>', methods=['GET'])
+def batch_exif_status(job_id):
+    """Status för ett batchjobb; ?results=1 tar med resultat per fil, ?events=N strömmar händelser från index N."""
+    job = exif_manager.batch.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    if request.args.get('events') is not None:
+        try:
+            start = max(0, int(request.args.get('events')))
+        except ValueError:
+            return jsonify({'error': 'events must be an integer'}), 400
+        return streamed_response(job.iter_events(start))
+    return jsonify(job.to_dict(include_results=request.args.get('results') == '1'))
+
+
+@app.route('/exif/batch/<job_id>', methods=['DELETE'])
+@app.route('/exif/batch/<job_id>/cancel', methods=['POST'])
+def cancel_batch_exif(job_id):
+    """Avbryter ett batchjobb; filer som redan påbörjats körs klart."""
+    job = exif_manager.batch.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/media/roots', methods=['GET'])
+def media_roots():
+    """Indexerade bildmappar med antal filer och senaste genomsökning"""
+    return jsonify(media_index.roots())
+
+
+@app.route('/media/roots', methods=['POST', 'DELETE'])
+def edit_media_roots():
+    """Body: {"path": "/bilder"}; POST lägger till och startar genomsökning, DELETE tar bort roten ur indexet"""
+    data = request.get_json(silent=True) or {}
+    path = data.get('path')
+    if not path:
+        return jsonify({'error': 'path required'}), 400
+    if request.method == 'DELETE':
+        removed = media_index.remove_root(path)
+        media_watcher.sync_roots()
+        return jsonify({'removed_files': removed})
+    if not os.path.isdir(path):
+        return jsonify({'error': 'Directory not found'}), 404
+    root = media_index.add_root(path)
+    media_watcher.sync_roots()
+    return jsonify({'root': root, 'scan': media_index.start_scan([root])}), 202
+
+
+@app.route('/media/scan', methods=['GET', 'POST'])
+def media_scan():
+    """POST startar en inkrementell genomsökning i bakgrunden (Body valfri: {"roots": [...]}); GET visar status"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        return jsonify(media_index.start_scan(data.get('roots'))), 202
+    return jsonify(media_index.scan_status())
+
+
+@app.route('/media/scan/cancel', methods=['POST'])
+def cancel_media_scan():
+    media_index.cancel_scan()
+    return jsonify(media_index.scan_status())
+
+
+@app.route('/media/search')
+def media_search():
+    """
+    Söker i metadataindexet (läser aldrig bildfilerna)
+    ?keyword=&person=&q=&bbox=min_lon,min_lat,max_lon,max_lat&date_from=&date_to=&limit=&after=
+    """
+    try:
+        bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+        result = media_index.search(
+            keyword=request.args.get('keyword'),
+            person=request.args.get('person'),
+            q=request.args.get('q'),
+            bbox=bbox,
+            date_from=request.args.get('date_from'),
+            date_to=request.args.get('date_to'),
+            after=request.args.get('after'),
+            limit=request.args.get('limit', type=int),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+
+@app.route('/media/stats')
+def media_stats():
+    return jsonify(media_index.stats())
+
+
+@app.route('/media/watch')
+def media_watch_status():
+    """Bevakningens status: backend (inotify/poll), bevakade rötter, väntande och behandlade händelser"""
+    return jsonify(media_watcher.status())
+
+
+@app.route('/media/watch/start', methods=['POST'])
+def start_media_watch():
+    """Body valfri: {"backend": "auto" | "inotify" | "poll"}"""
+    data = request.get_json(silent=True) or {}
+    backend = data.get('backend', 'auto')
+    if backend not in ('auto', 'inotify', 'poll'):
+        return jsonify({'error': 'backend must be auto, inotify or poll'}), 400
+    try:
+        return jsonify(media_watcher.start(backend))
+    except OSError as e:
+        return jsonify({'error': f'Cannot start watcher: {e}'}), 503
+
+
+@app.route('/media/watch/stop', methods=['POST'])
+def stop_media_watch():
+    media_watcher.stop()
+    return jsonify(media_watcher.status())
+
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("WestFamilyTree API Server Starting...")
@@ -748,6 +974,11 @@ if __name__ == '__main__':
     print("  POST /exif/write_face_tags")
     print("  POST /exif/remove_metadata")
     print("  POST /exif/copy_metadata")
+    print("  GET  /exif/backups")
+    print("  POST /exif/backups/<id>/restore")
+    print("  POST /exif/undo")
     print("  POST /exif/batch")
+    print("  GET  /exif/batch/<job_id>")
+    print("  POST /exif/batch/<job_id>/cancel")
     print("="*60 + "\n")
     app.run(port=5005, debug=True)
@@ -0,0 +1,303 @@
+"""
+Backup Store - Innehållsadresserad backup av bilder före EXIF-skrivning
+
+Varje backup lagras som en blob namngiven efter filens SHA-256:
+    <root>/blobs/ab/abcdef0123...
+En SQLite-manifest (<root>/manifest.db) håller en rad per backup:
+    (path, hash, size, mtime_ns, operation, created_at)
+
+  - Samma innehåll lagras bara en gång (omkörda batcher, kopior av samma bild,
+    skrivningar som gav identiskt resultat)
+  - Oförändrad fil (storlek + mtime_ns som senaste backupen) hashas inte om
+  - Blobben skapas med reflink (copy-on-write, t.ex. Btrfs/XFS) där det stöds, annars kopia.
+    Hårda länkar till originalet används inte: piexif skriver om filen på plats,
+    vilket då skulle ändra backupen också.
+  - Gallring efter ålder och/eller total storlek; blobbar utan referenser tas bort
+
+Två slags backuper (kolumnen kind):
+  - 'full':     hela bildfilen
+  - 'metadata': bara metadatasegmenten (se metadata_segments), som en liten
+                sidofil i samma blob-lager; återställs genom att segmenten sätts
+                tillbaka i bilden utan att bilddatan skrivs om från backupen
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from metadata_segments import apply_metadata, dump_sidecar, extract_metadata, load_sidecar
+from sqlite_pool import get_pool
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+DEFAULT_BACKUP_ROOT = os.path.join('backups', 'exif')
+HASH_CHUNK_SIZE = 1024 * 1024
+# Linux ioctl FICLONE (reflink)
+FICLONE = 0x40049409
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(src: str, dst: str) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+
+class BackupStore:
+    """Deduplicerande backup-lager med manifest och gallring."""
+
+    def __init__(self, root: str = DEFAULT_BACKUP_ROOT, max_bytes: Optional[int] = None,
+                 max_age_days: Optional[float] = None):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.pool = get_pool(os.path.join(root, 'manifest.db'))
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self.reflinks = 0
+        self.copies = 0
+        self.deduplicated = 0
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS backups (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    hash TEXT NOT NULL REFERENCES blobs(hash),
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    operation TEXT,
+                    created_at REAL NOT NULL,
+                    kind TEXT NOT NULL DEFAULT 'full'
+                )
+            ''')
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(backups)').fetchall()}
+            if 'kind' not in columns:
+                conn.execute("ALTER TABLE backups ADD COLUMN kind TEXT NOT NULL DEFAULT 'full'")
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_backups_path ON backups(path, created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_backups_hash ON backups(hash)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_backups_created ON backups(created_at)')
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def backup(self, path: str, operation: str = '') -> Dict:
+        """Sparar filens nuvarande innehåll; returnerar manifestraden."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        latest = self.pool.connection().execute(
+            "SELECT hash FROM backups WHERE path = ? AND size = ? AND mtime_ns = ? AND kind = 'full' "
+            "ORDER BY id DESC LIMIT 1",
+            (path, st.st_size, st.st_mtime_ns)
+        ).fetchone()
+        digest = latest['hash'] if latest else file_sha256(path)
+        return self._record(path, st, digest, st.st_size, 'full', operation,
+                            lambda target: self._copy_into(path, target))
+
+    def backup_metadata(self, path: str, operation: str = '') -> Optional[Dict]:
+        """
+        Sparar bara bildens metadatasegment (några KB i stället för hela filen).
+        Returnerar None om formatet inte stöds; anroparen tar då en hel backup.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        snapshot = extract_metadata(path)
+        if snapshot is None:
+            return None
+        data = dump_sidecar(snapshot)
+        digest = hashlib.sha256(data).hexdigest()
+
+        def write(target):
+            with open(target, 'wb') as f:
+                f.write(data)
+
+        return self._record(path, st, digest, len(data), 'metadata', operation, write)
+
+    def _record(self, path: str, st: os.stat_result, digest: str, size: int, kind: str, operation: str,
+                write_blob) -> Dict:
+        # Låset hindrar att gallringen tar bort en blob mellan dedup-kontrollen och manifestraden
+        with self._write_lock:
+            self._store_blob(digest, write_blob)
+            now = time.time()
+            with self.pool.transaction() as conn:
+                conn.execute('INSERT OR IGNORE INTO blobs (hash, size, created_at) VALUES (?, ?, ?)',
+                             (digest, size, now))
+                cursor = conn.execute(
+                    'INSERT INTO backups (path, hash, size, mtime_ns, operation, created_at, kind) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (path, digest, st.st_size, st.st_mtime_ns, operation, now, kind)
+                )
+                backup_id = cursor.lastrowid
+        if self.max_bytes is not None or self.max_age_days is not None:
+            self.prune()
+        return self.get(backup_id)
+
+    def _copy_into(self, path: str, target: str):
+        if _reflink(path, target):
+            with self._lock:
+                self.reflinks += 1
+        else:
+            shutil.copyfile(path, target)
+            with self._lock:
+                self.copies += 1
+
+    def _store_blob(self, digest: str, write_blob):
+        target = self.blob_path(digest)
+        if os.path.exists(target):
+            with self._lock:
+                self.deduplicated += 1
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f'{target}.{uuid.uuid4().hex}.tmp'
+        try:
+            write_blob(tmp)
+            # Atomiskt: samtidiga backuper av samma innehåll skriver samma blob
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def get(self, backup_id: int) -> Optional[Dict]:
+        row = self.pool.connection().execute('SELECT * FROM backups WHERE id = ?', (backup_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def latest(self, path: str) -> Optional[Dict]:
+        row = self.pool.connection().execute(
+            'SELECT * FROM backups WHERE path = ? ORDER BY id DESC LIMIT 1', (os.path.abspath(path),)
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def list_backups(self, path: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Senaste backuperna, nyaste först (för en fil om path anges)."""
+        conn = self.pool.connection()
+        if path:
+            rows = conn.execute('SELECT * FROM backups WHERE path = ? ORDER BY id DESC LIMIT ?',
+                                (os.path.abspath(path), limit)).fetchall()
+        else:
+            rows = conn.execute('SELECT * FROM backups ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def _row(self, row) -> Dict:
+        data = dict(row)
+        data['blob_path'] = self.blob_path(row['hash'])
+        return data
+
+    def restore(self, backup_id: int, target_path: Optional[str] = None) -> Dict:
+        """
+        Återställer en backup till target_path (standard: ursprunglig sökväg).
+        Skrivs via temporär fil + os.replace så att målet aldrig blir halvskrivet.
+        En metadata-backup sätter tillbaka metadatasegmenten i målets nuvarande bild.
+        """
+        record = self.get(backup_id)
+        if record is None:
+            raise KeyError(f'Unknown backup id {backup_id}')
+        blob = record['blob_path']
+        if not os.path.exists(blob):
+            raise FileNotFoundError(f'Backup blob missing: {blob}')
+        target = os.path.abspath(target_path or record['path'])
+        if record['kind'] == 'metadata':
+            with open(blob, 'rb') as f:
+                apply_metadata(target, load_sidecar(f.read()))
+            return dict(record, restored_to=target)
+        tmp = f'{target}.{uuid.uuid4().hex}.restore'
+        try:
+            if not _reflink(blob, tmp):
+                shutil.copyfile(blob, tmp)
+            if os.path.exists(target):
+                # Bara rättigheterna: ny mtime så att snabbvägen i backup() inte tror att filen är oförändrad
+                shutil.copymode(target, tmp)
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return dict(record, restored_to=target)
+
+    def prune(self, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> Dict:
+        """
+        Gallrar backuper äldre än max_age_days och, om blobbarna tillsammans är större
+        än max_bytes, de äldsta tills gränsen nås. Senaste backupen per fil behålls alltid.
+        """
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        max_age_days = max_age_days if max_age_days is not None else self.max_age_days
+        removed = 0
+        with self._write_lock, self.pool.transaction() as conn:
+            # Senaste backupen per fil skyddas
+            keep = 'id NOT IN (SELECT MAX(id) FROM backups GROUP BY path)'
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                removed += conn.execute(f'DELETE FROM backups WHERE created_at < ? AND {keep}', (cutoff,)).rowcount
+            if max_bytes is not None:
+                total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+                if total > max_bytes:
+                    candidates = conn.execute(f'SELECT id, hash FROM backups WHERE {keep} ORDER BY id').fetchall()
+                    for row in candidates:
+                        if total <= max_bytes:
+                            break
+                        conn.execute('DELETE FROM backups WHERE id = ?', (row['id'],))
+                        removed += 1
+                        # Blobben frigörs först när ingen annan backup refererar till den
+                        if not conn.execute('SELECT 1 FROM backups WHERE hash = ? LIMIT 1', (row['hash'],)).fetchone():
+                            total -= conn.execute('SELECT size FROM blobs WHERE hash = ?', (row['hash'],)).fetchone()[0]
+            orphans = [row['hash'] for row in conn.execute(
+                'SELECT hash FROM blobs WHERE hash NOT IN (SELECT hash FROM backups)'
+            ).fetchall()]
+            conn.executemany('DELETE FROM blobs WHERE hash = ?', [(digest,) for digest in orphans])
+            freed = 0
+            for digest in orphans:
+                blob = self.blob_path(digest)
+                try:
+                    freed += os.path.getsize(blob)
+                    os.remove(blob)
+                except OSError:
+                    pass
+        return {'removed_backups': removed, 'removed_blobs': len(orphans), 'freed_bytes': freed}
+
+    def stats(self) -> Dict:
+        conn = self.pool.connection()
+        backups, logical = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM backups').fetchone()
+        blobs, stored = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+        with self._lock:
+            return {
+                'root': self.root,
+                'backups': backups,
+                'blobs': blobs,
+                'logical_bytes': logical,
+                'stored_bytes': stored,
+                'reflinks': self.reflinks,
+                'copies': self.copies,
+                'deduplicated': self.deduplicated,
+                'max_bytes': self.max_bytes,
+                'max_age_days': self.max_age_days,
+            }
@@ -1,56 +1,226 @@
-import sqlite3
 import json
+from sqlite_pool import get_pool
+from json_stream import iter_cursor
+from name_normalize import ensure_normalized_columns, normalize_name, prefix_range
+
+
+# Händelser ur full_data, en rad per händelse (fylls i av triggers vid varje skrivning)
+_EVENT_ROWS = '''
+    SELECT {person_id}, json_extract(e.value, '$.id'), json_extract(e.value, '$.type'), json_extract(e.value, '$.date'),
+           CAST(COALESCE(NULLIF(json_extract(e.value, '$.placeId'), ''), NULLIF(json_extract(e.value, '$.place_id'), '')) AS TEXT)
+    FROM {source} json_each(CASE WHEN json_valid({full_data}) THEN {full_data} ELSE '{{}}' END, '$.events') e
+    WHERE json_type(e.value) = 'object'
+'''
+# Antal place_id per IN-fråga i get_place_links
+LINK_BATCH_SIZE = 500
+# Antal led för /ancestors och /descendants (standard och tak)
+DEFAULT_GENERATIONS = 4
+MAX_GENERATIONS = 30
+
+
+def ensure_events_table(conn):
+    """
+    Skapar events (person_id, event_id, type, date, place_id) med index på place_id, samt
+    triggers som håller tabellen i synk med individuals.full_data oavsett vem som skriver
+    (migrate_db, skript, Electron). Befintliga personer fylls i första gången.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'individuals'").fetchone():
+        return False
+    created = not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            person_id TEXT NOT NULL,
+            event_id TEXT,
+            type TEXT,
+            date TEXT,
+            place_id TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_place_id ON events(place_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_person_id ON events(person_id)')
+    new_rows = _EVENT_ROWS.format(person_id='new.id', source='', full_data='new.full_data')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS individuals_events_ai AFTER INSERT ON individuals BEGIN
+            DELETE FROM events WHERE person_id = new.id;
+            INSERT INTO events (person_id, event_id, type, date, place_id) {new_rows};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS individuals_events_au AFTER UPDATE OF id, full_data ON individuals BEGIN
+            DELETE FROM events WHERE person_id IN (old.id, new.id);
+            INSERT INTO events (person_id, event_id, type, date, place_id) {new_rows};
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS individuals_events_ad AFTER DELETE ON individuals BEGIN
+            DELETE FROM events WHERE person_id = old.id;
+        END
+    ''')
+    if created:
+        all_rows = _EVENT_ROWS.format(person_id='i.id', source='individuals i,', full_data='i.full_data')
+        conn.execute(f'INSERT INTO events (person_id, event_id, type, date, place_id) {all_rows}')
+    return True
+
 
 class DatabaseManager:
     def get_all_people_with_events(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        return list(self.iter_people_with_events())
+
+    def iter_people_with_events(self):
+        # Generator: en person i taget (fetchmany), för strömmade svar
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute("SELECT id, full_data FROM individuals")
-        people = []
-        for row in c.fetchall():
+        for row in iter_cursor(c, convert=lambda row: row):
             try:
                 data = json.loads(row['full_data'])
                 # Sätt id om det saknas
                 if 'id' not in data:
                     data['id'] = row['id']
-                people.append(data)
+                yield data
             except Exception as e:
                 continue
-        conn.close()
-        return people
 
     def __init__(self, db_path='genealogy.db'):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
+        # Normaliserad namnnyckel (name_norm) för indexerad sökning; saknade nycklar fylls i här vid start
+        with self.pool.transaction() as conn:
+            ensure_normalized_columns(conn, 'individuals', ('name',))
+            # Händelsetabell med index på place_id (platskopplingar utan JSON-avkodning)
+            self._has_events = ensure_events_table(conn)
+            if self._has_events:
+                # Samma index som migrate_db.py skapar (saknas i databaser från init_db.py)
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_father_id ON individuals(father_id)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_mother_id ON individuals(mother_id)')
 
-    def search_person(self, query):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def get_place_links(self, place_ids):
+        """
+        Kopplingar person/händelse -> plats för de angivna plats-id:na via events-indexet.
+        Returnerar {str(place_id): [{'personId', 'personName', 'eventId', 'eventType', 'eventDate', 'placeId'}, ...]}.
+        """
+        links = {}
+        if not self._has_events:
+            return links
+        keys = list(dict.fromkeys(str(pid) for pid in place_ids))
+        conn = self.pool.connection()
+        for start in range(0, len(keys), LINK_BATCH_SIZE):
+            batch = keys[start:start + LINK_BATCH_SIZE]
+            c = conn.execute(f'''
+                SELECT e.person_id, e.event_id, e.type, e.date, e.place_id,
+                       COALESCE(json_extract(i.full_data, '$.firstName'), '') AS first_name,
+                       COALESCE(json_extract(i.full_data, '$.lastName'), '') AS last_name
+                FROM events e
+                LEFT JOIN individuals i ON i.id = e.person_id
+                WHERE e.place_id IN ({','.join('?' * len(batch))})
+            ''', batch)
+            for row in c.fetchall():
+                links.setdefault(row['place_id'], []).append({
+                    'personId': row['person_id'],
+                    'personName': f"{row['first_name']} {row['last_name']}",
+                    'eventId': row['event_id'],
+                    'eventType': row['type'],
+                    'eventDate': row['date'] or '',
+                    'placeId': row['place_id']
+                })
+        return links
+
+    def search_person(self, query, limit=50):
+        # Endast läsning: nycklarna fylls i vid skrivning (migrate_db.py) och vid start
+        conn = self.pool.connection()
         c = conn.cursor()
-        c.execute("SELECT id, name, birth_date FROM individuals WHERE name LIKE ? LIMIT 50", (f'%{query}%',))
+        key = normalize_name(query)
+        # Först indexerad prefixsökning på normaliserat namn, sedan delsträng (utan LOWER per rad)
+        low, high = prefix_range(key)
+        c.execute("SELECT id, name, birth_date FROM individuals WHERE name_norm >= ? AND name_norm < ? ORDER BY name_norm LIMIT ?", (low, high, limit))
         results = [dict(row) for row in c.fetchall()]
+        if key and len(results) < limit:
+            seen = {r['id'] for r in results}
+            c.execute("SELECT id, name, birth_date FROM individuals WHERE name_norm LIKE ? LIMIT ?", (f'%{key}%', limit))
+            for row in c.fetchall():
+                if row['id'] not in seen and len(results) < limit:
+                    results.append(dict(row))
+        if query and len(results) < limit:
+            # Rader som skrivits utanför servern sedan start (t.ex. Electron) saknar nyckel än
+            seen = {r['id'] for r in results}
+            c.execute("SELECT id, name, birth_date FROM individuals WHERE name_norm IS NULL AND name LIKE ? LIMIT ?",
+                      (f'%{query.strip()}%', limit))
+            for row in c.fetchall():
+                if row['id'] not in seen and len(results) < limit:
+                    results.append(dict(row))
         print(f"DEBUG: Sökning på '{query}' gav:", results)
-        conn.close()
         return results
 
     def get_person(self, id):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute("SELECT full_data FROM individuals WHERE id = ?", (id,))
         row = c.fetchone()
-        conn.close()
         return json.loads(row['full_data']) if row else None
 
     def get_parents(self, id):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        # Båda föräldrarna i en fråga (via index på primärnyckeln)
+        conn = self.pool.connection()
         c = conn.cursor()
-        c.execute("SELECT father_id, mother_id FROM individuals WHERE id = ?", (id,))
+        c.execute("""
+            SELECT f.full_data AS father, m.full_data AS mother
+            FROM individuals i
+            LEFT JOIN individuals f ON f.id = i.father_id
+            LEFT JOIN individuals m ON m.id = i.mother_id
+            WHERE i.id = ?
+        """, (id,))
         row = c.fetchone()
-        conn.close()
         if not row:
             return None, None
-        father = self.get_person(row['father_id']) if row['father_id'] else None
-        mother = self.get_person(row['mother_id']) if row['mother_id'] else None
-        return father, mother
\ No newline at end of file
+        father = json.loads(row['father']) if row['father'] else None
+        mother = json.loads(row['mother']) if row['mother'] else None
+        return father, mother
+
+    def get_ancestors(self, id, generations=DEFAULT_GENERATIONS, full=False):
+        """Anor upp till `generations` led (rekursiv CTE över father_id/mother_id)."""
+        return self._get_relatives(id, generations, full, """
+            SELECT p.id, r.depth + 1 FROM relatives r
+            JOIN individuals c ON c.id = r.id
+            JOIN individuals p ON p.id IN (c.father_id, c.mother_id)
+            WHERE r.depth < :generations AND p.id != :root
+        """)
+
+    def get_descendants(self, id, generations=DEFAULT_GENERATIONS, full=False):
+        """Ättlingar ned till `generations` led (rekursiv CTE via indexen på father_id/mother_id)."""
+        return self._get_relatives(id, generations, full, """
+            SELECT ch.id, r.depth + 1 FROM relatives r
+            JOIN individuals ch ON ch.father_id = r.id
+            WHERE r.depth < :generations AND ch.id != :root
+            UNION
+            SELECT ch.id, r.depth + 1 FROM relatives r
+            JOIN individuals ch ON ch.mother_id = r.id
+            WHERE r.depth < :generations AND ch.id != :root
+        """)
+
+    def _get_relatives(self, id, generations, full, step):
+        # UNION (inte UNION ALL) slår ihop samma person på samma djup, och djupgränsen
+        # gör att cykler i datan (t.ex. felaktigt inlagda föräldrar) ändå avslutas
+        generations = max(1, min(int(generations or DEFAULT_GENERATIONS), MAX_GENERATIONS))
+        conn = self.pool.connection()
+        c = conn.cursor()
+        extra = ', i.full_data' if full else ''
+        c.execute(f"""
+            WITH RECURSIVE relatives(id, depth) AS (
+                SELECT id, 0 FROM individuals WHERE id = :root
+                UNION
+                {step}
+            )
+            SELECT i.id, i.name, i.birth_date, i.father_id, i.mother_id, MIN(r.depth) AS generation{extra}
+            FROM relatives r
+            JOIN individuals i ON i.id = r.id
+            WHERE r.depth > 0
+            GROUP BY i.id
+            ORDER BY generation, i.name
+        """, {'root': id, 'generations': generations})
+        people = []
+        for row in c.fetchall():
+            person = {key: row[key] for key in ('id', 'name', 'birth_date', 'father_id', 'mother_id', 'generation')}
+            if full:
+                person['data'] = json.loads(row['full_data']) if row['full_data'] else None
+            people.append(person)
+        return {'root': id, 'generations': generations, 'people': people}
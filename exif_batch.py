@@ -0,0 +1,226 @@
+"""
+EXIF Batch - Parallell batchbearbetning för ExifManager
+
+Ett batchjobb körs i en trådpool med begränsat antal arbetare (exiftool-
+anropen sker i egna processer, så trådarna väntar mest på I/O). Samma fil
+bearbetas aldrig av två trådar samtidigt, även om den finns i flera jobb.
+
+Varje jobb har ett id och en händelselogg:
+  {'type': 'start', ...}, {'type': 'progress', 'path': ..., 'success': ...}, {'type': 'end', ...}
+som kan strömmas (iter_events, NDJSON i API:t) eller pollas (to_dict).
+Jobb kan avbrytas; filer som redan påbörjats körs klart.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+# Antal avslutade jobb som sparas för polling
+MAX_FINISHED_JOBS = 50
+
+
+class FileLocks:
+    """Ett lås per fil (normaliserad sökväg); låset tas bort när ingen använder det."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[str, List] = {}
+
+    def acquire(self, path: str):
+        key = os.path.normcase(os.path.abspath(path))
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        return key
+
+    def release(self, key: str):
+        with self._lock:
+            entry = self._locks[key]
+            entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+
+class BatchJob:
+    """Status och händelselogg för ett batchjobb."""
+
+    def __init__(self, operation: str, image_paths: List[str], max_workers: int):
+        self.id = uuid.uuid4().hex
+        self.operation = operation
+        self.image_paths = list(image_paths)
+        self.max_workers = max_workers
+        self.status = 'running'
+        self.results: Dict[str, object] = {}
+        self.succeeded = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict] = []
+        self._cancel = threading.Event()
+        self._cond = threading.Condition()
+        self._emit({'type': 'start', 'operation': operation, 'total': len(self.image_paths), 'max_workers': max_workers})
+
+    @property
+    def total(self) -> int:
+        return len(self.image_paths)
+
+    @property
+    def done(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def finished(self) -> bool:
+        return self.status != 'running'
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _emit(self, event: Dict):
+        with self._cond:
+            event = dict(event, job_id=self.id)
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def _record(self, path: str, result, include_result: bool):
+        success = bool(result) and not (isinstance(result, dict) and result.get('error'))
+        with self._cond:
+            self.results[path] = result
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            done = self.done
+        event = {'type': 'progress', 'path': path, 'success': success, 'done': done, 'total': self.total}
+        if include_result:
+            event['result'] = result
+        self._emit(event)
+
+    def _finish(self):
+        with self._cond:
+            self.status = 'cancelled' if self.cancelled and self.done < self.total else 'done'
+            self.finished_at = time.time()
+        self._emit({'type': 'end', 'status': self.status, 'succeeded': self.succeeded, 'failed': self.failed,
+                    'skipped': self.total - self.done, 'seconds': round(self.finished_at - self.started_at, 3)})
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.finished and self.events[-1]['type'] == 'end', timeout)
+
+    def iter_events(self, start: int = 0) -> Iterator[Dict]:
+        """Händelser från och med index start; blockerar tills nya kommer och slutar efter 'end'."""
+        index = start
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self.events) > index)
+                pending = self.events[index:]
+            for event in pending:
+                index += 1
+                yield event
+                if event['type'] == 'end':
+                    return
+
+    def to_dict(self, include_results: bool = False) -> Dict:
+        with self._cond:
+            data = {
+                'job_id': self.id,
+                'operation': self.operation,
+                'status': self.status,
+                'total': self.total,
+                'done': self.done,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'max_workers': self.max_workers,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+            if include_results:
+                data['results'] = dict(self.results)
+        return data
+
+
+class BatchRunner:
+    """Kör BatchJob i en delad trådpool och håller reda på jobben för polling."""
+
+    def __init__(self, worker: Callable[[str, str, Dict], object], max_workers: int = DEFAULT_MAX_WORKERS):
+        self.worker = worker
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='exif-batch')
+        self._file_locks = FileLocks()
+        self._jobs: 'OrderedDict[str, BatchJob]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, image_paths: List[str], operation: str, max_workers: Optional[int] = None,
+              include_results: bool = True, **kwargs) -> BatchJob:
+        """Startar ett jobb och returnerar direkt; max_workers begränsar jobbets samtidighet."""
+        workers = max(1, min(int(max_workers or self.max_workers), self.max_workers))
+        job = BatchJob(operation, image_paths, workers)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        # Jobbets egna slots: högst `workers` filer åt gången i den delade poolen
+        slots = threading.Semaphore(workers)
+        remaining = [len(job.image_paths)]
+        remaining_lock = threading.Lock()
+
+        def finish_one():
+            with remaining_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            slots.release()
+            if last:
+                job._finish()
+
+        def run(path):
+            try:
+                if job.cancelled:
+                    return
+                key = self._file_locks.acquire(path)
+                try:
+                    result = self.worker(path, operation, kwargs)
+                except Exception as e:
+                    print(f"Batch error on {path}: {e}")
+                    result = False
+                finally:
+                    self._file_locks.release(key)
+                job._record(path, result, include_results)
+            finally:
+                finish_one()
+
+        if not job.image_paths:
+            job._finish()
+            return job
+
+        def feed():
+            for path in job.image_paths:
+                slots.acquire()
+                self._executor.submit(run, path)
+
+        threading.Thread(target=feed, name=f'exif-batch-feed-{job.id[:8]}', daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[BatchJob]:
+        job = self.get(job_id)
+        if job:
+            job.cancel()
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
@@ -0,0 +1,111 @@
+"""
+EXIF Cache - Beständig cache för ExifManager.read_exif
+
+Resultatet från read_exif (face_tags, keywords, metadata, camera, gps, raw_exif)
+sparas i en SQLite-databas med nyckeln (sökväg, storlek, mtime_ns, inode).
+En cachad post används bara om filens stat() fortfarande stämmer, så att
+öppna ett galleri med oförändrade bilder kostar ett stat-anrop per bild.
+
+ExifManagers skrivmetoder invaliderar posten för filen de ändrar; filer som
+ändras av andra program upptäcks via storlek/mtime/inode.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlite_pool import get_pool
+
+
+DEFAULT_CACHE_PATH = os.path.join('cache', 'exif_read_cache.db')
+
+
+def cache_key(path: str) -> str:
+    """Normaliserad sökväg som cachenyckel (absolut, skiftlägesokänslig på Windows)."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class ExifCache:
+    """SQLite-backad cache för läst EXIF/XMP-data."""
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.pool = get_pool(db_path)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.invalidations = 0
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS exif_cache (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    cached_at REAL NOT NULL
+                )
+            ''')
+
+    def get(self, path: str, st: Optional[os.stat_result] = None) -> Optional[Dict]:
+        """Cachat resultat om filen är oförändrad sedan det sparades, annars None."""
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+        row = self.pool.connection().execute(
+            'SELECT size, mtime_ns, inode, result FROM exif_cache WHERE path = ?', (cache_key(path),)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            if (row['size'], row['mtime_ns'], row['inode']) != (st.st_size, st.st_mtime_ns, st.st_ino):
+                self.stale += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row['result'])
+
+    def put(self, path: str, result: Dict, st: Optional[os.stat_result] = None):
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return
+        with self.pool.transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO exif_cache (path, size, mtime_ns, inode, result, cached_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (cache_key(path), st.st_size, st.st_mtime_ns, st.st_ino,
+                 json.dumps(result, ensure_ascii=False, separators=(',', ':')), time.time())
+            )
+
+    def invalidate(self, path: str):
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM exif_cache WHERE path = ?', (cache_key(path),))
+        with self._lock:
+            self.invalidations += 1
+
+    def clear(self):
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM exif_cache')
+
+    def stats(self) -> Dict:
+        entries = self.pool.connection().execute('SELECT COUNT(*) FROM exif_cache').fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'db_path': self.db_path,
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
@@ -18,19 +18,36 @@ import piexif
 from PIL import Image
 import json
 import os
-from typing import Dict, List, Optional, Tuple
-import shutil
-from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
 import re
-import subprocess
+
+from backup_store import DEFAULT_BACKUP_ROOT, BackupStore
+from exif_batch import DEFAULT_MAX_WORKERS, BatchJob, BatchRunner
+from exif_cache import DEFAULT_CACHE_PATH, ExifCache
+from exiftool_pool import DEFAULT_POOL_SIZE, ExiftoolError, ExiftoolPool, ExiftoolResult
+from xmp_reader import XmpData, decode_xmp_string, parse_xmp, read_xmp_packet
 
 
 class ExifManager:
     """Hanterar EXIF-metadata för bilder"""
     
-    def __init__(self):
-        self.backup_dir = "backups/exif"
-        os.makedirs(self.backup_dir, exist_ok=True)
+    def __init__(self, cache_path: Optional[str] = DEFAULT_CACHE_PATH, exiftool_cmd='exiftool',
+                 exiftool_workers: int = DEFAULT_POOL_SIZE, batch_workers: int = DEFAULT_MAX_WORKERS,
+                 backup_dir: str = DEFAULT_BACKUP_ROOT, backup_max_bytes: Optional[int] = None,
+                 backup_max_age_days: Optional[float] = None, backup_mode: str = 'metadata'):
+        self.backup_dir = backup_dir
+        # 'metadata' = bara metadatasegmenten (JPEG/PNG, annars hel kopia), 'full' = alltid hel kopia
+        self.backup_mode = backup_mode
+        # Innehållsadresserade backuper (samma innehåll lagras en gång) med valfri gallring
+        self.backups = BackupStore(backup_dir, max_bytes=backup_max_bytes, max_age_days=backup_max_age_days)
+        # Beständig läscache (None = avstängd)
+        self.cache = ExifCache(cache_path) if cache_path else None
+        # Långlivade exiftool-processer (exiftool_cmd kan vara en lista, t.ex. [python, fake_exiftool.py])
+        self.exiftool = ExiftoolPool(exiftool_cmd, size=exiftool_workers)
+        # Version/funktioner tas reda på en gång här; läs-/skrivvägarna väljer backend utifrån den
+        self.exiftool.capabilities()
+        # Trådpool för batch_process/start_batch (samma fil bearbetas aldrig samtidigt)
+        self.batch = BatchRunner(self._batch_operation, max_workers=batch_workers)
     
     def read_exif(self, image_path: str) -> Dict:
         """
@@ -39,9 +56,20 @@ class ExifManager:
         Returns:
             Dict med strukturerad EXIF-data
         """
+        # Oförändrad fil (storlek, mtime, inode) -> cachat resultat utan att öppna filen
+        st = None
+        if self.cache is not None:
+            try:
+                st = os.stat(image_path)
+                cached = self.cache.get(image_path, st)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                print(f"EXIF cache lookup failed for {image_path}: {e}")
         try:
             exif_dict = piexif.load(image_path)
-            xmp_data = self._extract_xmp_bytes(image_path)
+            # XMP tolkas en gång och delas av extraktorerna
+            xmp_data = parse_xmp(self._extract_xmp_bytes(image_path))
             exiftool_fields = self._read_exiftool_fields(image_path)
             
             result = {
@@ -53,6 +81,11 @@ class ExifManager:
                 'raw_exif': self._safe_exif_dict(exif_dict)
             }
             
+            if st is not None:
+                try:
+                    self.cache.put(image_path, result, st)
+                except Exception as e:
+                    print(f"EXIF cache store failed for {image_path}: {e}")
             return result
             
         except Exception as e:
@@ -68,35 +101,21 @@ class ExifManager:
     
     def _extract_xmp_bytes(self, image_path: str) -> bytes:
         """Returnerar XMP-sektionen som råbytes (best-effort)."""
-        try:
-            with open(image_path, 'rb') as f:
-                data = f.read()
-            # XMP brukar ligga mellan <x:xmpmeta ...> ... </x:xmpmeta>
-            match = re.search(br"<x:xmpmeta[\s\S]*?</x:xmpmeta>", data, re.IGNORECASE)
-            return match.group(0) if match else b''
-        except Exception:
-            return b''
+        # Läser bara metadatasegmenten (JPEG APP1, PNG iTXt, TIFF-tagg 700), inte hela filen
+        return read_xmp_packet(image_path)
 
     def _decode_xmp_string(self, raw_bytes: bytes) -> str:
         """
         Dekoderar XMP-strängar med robust hantering av olika kodningar.
-        XMP ska vara UTF-8 enligt standard.
+        XMP ska vara UTF-8 enligt standard (fallback: cp1252, latin-1).
         """
-        # XMP är UTF-8 enligt standard
-        try:
-            return raw_bytes.decode('utf-8')
-        except UnicodeDecodeError:
-            pass
-        
-        # Fallback: cp1252 (Windows), sedan latin-1
-        for enc in ('cp1252', 'latin-1'):
-            try:
-                return raw_bytes.decode(enc)
-            except (UnicodeDecodeError, AttributeError):
-                continue
-        
-        # Sista utväg: ersätt ogiltiga tecken
-        return raw_bytes.decode('utf-8', errors='replace')
+        return decode_xmp_string(raw_bytes)
+
+    def _xmp_model(self, xmp_data: Union[XmpData, bytes, None]) -> XmpData:
+        """XmpData från read_exif, eller tolkat här om extraktorn fått råbytes."""
+        if isinstance(xmp_data, XmpData):
+            return xmp_data
+        return parse_xmp(xmp_data or b'')
 
     def _read_exiftool_fields(self, image_path: str) -> Dict:
         """Läser utvalda metadatafält via exiftool (för bättre XMP/IPTC-täckning)."""
@@ -112,12 +131,7 @@ class ExifManager:
         ]
 
         try:
-            result = subprocess.run(
-                ['exiftool', '-j', *tags, image_path],
-                capture_output=True,
-                text=True,
-                check=False
-            )
+            result = self._run_exiftool(['-j', *tags, image_path])
             if result.returncode != 0 or not result.stdout:
                 return {}
 
@@ -128,7 +142,7 @@ class ExifManager:
         except Exception:
             return {}
     
-    def _extract_face_tags(self, exif_dict: Dict, xmp_bytes: bytes = b"") -> List[Dict]:
+    def _extract_face_tags(self, exif_dict: Dict, xmp_data: Union[XmpData, bytes, None] = None) -> List[Dict]:
         """
         Extraherar face tags från XMP-data
         
@@ -144,107 +158,40 @@ class ExifManager:
         """
         face_tags = []
         
-        # Kolla XMP-data
         try:
-            if xmp_bytes:
-                xmp_str = self._decode_xmp_string(xmp_bytes)
-                
-                # 1. MWG Regions: Extract region entries with structure
-                # <mwg-rs:RegionList>
-                #   <rdf:Bag>
-                #     <rdf:li>
-                #       <mwg-rs:Region>
-                #         <mwg-rs:Name>Person Name</mwg-rs:Name>
-                #         <mwg-rs:Type>Face</mwg-rs:Type>
-                #         <mwg-rs:Area stArea:x="0.4" stArea:y="0.3" stArea:w="0.2" stArea:h="0.2" stArea:unit="normalized"/>
-                #       </mwg-rs:Region>
-                #     </rdf:li>
-                #   </rdf:Bag>
-                # </mwg-rs:RegionList>
-                
-                # Find all mwg-rs:Region entries
-                region_pattern = r'<mwg-rs:Region>\s*(.*?)\s*</mwg-rs:Region>'
-                for region_match in re.finditer(region_pattern, xmp_str, re.DOTALL):
-                    region_content = region_match.group(1)
+            xmp = self._xmp_model(xmp_data)
+
+            # 1. MWG Regions (mwg-rs:RegionList/rdf:Bag/rdf:li med mwg-rs:Name, Type, Area)
+            for region in xmp.regions:
+                # Only add if we have a name and it's actually a Face region
+                if region.name and region.type == "Face":
+                    tag = {
+                        'name': region.name.strip(),
+                        'source': 'XMP:MWG-Regions'
+                    }
                     
-                    # Extract Name
-                    name_match = re.search(r'<mwg-rs:Name>([^<]+)</mwg-rs:Name>', region_content)
-                    name = name_match.group(1) if name_match else None
+                    # Add coordinates if available (already normalized 0-1, convert to 0-100)
+                    if region.has_area:
+                        tag['x'] = region.x * 100
+                        tag['y'] = region.y * 100
+                        tag['width'] = region.w * 100
+                        tag['height'] = region.h * 100
                     
-                    # Extract Type (should be "Face")
-                    type_match = re.search(r'<mwg-rs:Type>([^<]+)</mwg-rs:Type>', region_content)
-                    region_type = type_match.group(1) if type_match else ""
-                    
-                    # Extract Area coordinates (normalized 0-1)
-                    area_match = re.search(
-                        r'<mwg-rs:Area\s+stArea:x="([^"]+)"\s+stArea:y="([^"]+)"\s+stArea:w="([^"]+)"\s+stArea:h="([^"]+)"',
-                        region_content
-                    )
-                    
-                    # Also handle different attribute order (more robust)
-                    if not area_match:
-                        # Alternative regex that's more flexible
-                        x_match = re.search(r'stArea:x="([^"]+)"', region_content)
-                        y_match = re.search(r'stArea:y="([^"]+)"', region_content)
-                        w_match = re.search(r'stArea:w="([^"]+)"', region_content)
-                        h_match = re.search(r'stArea:h="([^"]+)"', region_content)
-                        
-                        if x_match and y_match and w_match and h_match:
-                            try:
-                                x_norm = float(x_match.group(1))
-                                y_norm = float(y_match.group(1))
-                                w_norm = float(w_match.group(1))
-                                h_norm = float(h_match.group(1))
-                            except ValueError:
-                                continue
-                        else:
-                            x_norm, y_norm, w_norm, h_norm = None, None, None, None
-                    else:
-                        try:
-                            x_norm = float(area_match.group(1))
-                            y_norm = float(area_match.group(2))
-                            w_norm = float(area_match.group(3))
-                            h_norm = float(area_match.group(4))
-                        except ValueError:
-                            x_norm, y_norm, w_norm, h_norm = None, None, None, None
-                    
-                    # Only add if we have a name and it's actually a Face region
-                    if name and region_type == "Face":
-                        tag = {
-                            'name': name.strip(),
-                            'source': 'XMP:MWG-Regions'
-                        }
-                        
-                        # Add coordinates if available (already normalized 0-1, convert to 0-100)
-                        if x_norm is not None and y_norm is not None and w_norm is not None and h_norm is not None:
-                            tag['x'] = x_norm * 100
-                            tag['y'] = y_norm * 100
-                            tag['width'] = w_norm * 100
-                            tag['height'] = h_norm * 100
-                        
-                        face_tags.append(tag)
-                
-                # 2. Microsoft Photo: MPReg:PersonDisplayName="Person Name" (legacy, without coordinates)
-                for match in re.finditer(br'MPReg:PersonDisplayName="([^"]+)"', xmp_bytes):
-                    name_bytes = match.group(1)
-                    person = self._decode_xmp_string(name_bytes)
-                    face_tags.append({
-                        'name': person.strip(),
-                        'source': 'XMP:Microsoft-RegionInfo'
-                    })
-                
-                # 3. Fallback: XMP PersonInImage <rdf:li>Person Name</rdf:li> (legacy, without coordinates)
-                pi_blocks = re.findall(
-                    r'<rdf:Description[^>]*?PersonInImage[^>]*?>(.*?)</rdf:Description>',
-                    xmp_str,
-                    re.DOTALL
-                )
-                for block in pi_blocks:
-                    for name_match in re.findall(r'<rdf:li>([^<]+)</rdf:li>', block):
-                        face_tags.append({
-                            'name': name_match.strip(),
-                            'source': 'XMP:PersonInImage'
-                        })
+                    face_tags.append(tag)
+            
+            # 2. Microsoft Photo: MPReg:PersonDisplayName="Person Name" (legacy, without coordinates)
+            for person in xmp.ms_region_names:
+                face_tags.append({
+                    'name': person.strip(),
+                    'source': 'XMP:Microsoft-RegionInfo'
+                })
+            
+            # 3. Fallback: XMP PersonInImage <rdf:li>Person Name</rdf:li> (legacy, without coordinates)
+            for name in xmp.persons_in_image:
+                face_tags.append({
+                    'name': name.strip(),
+                    'source': 'XMP:PersonInImage'
+                })
 
             # Normalisera: ta bort dubbletter och tagg/kategori-prefix
             normalized = []
@@ -264,7 +211,7 @@ class ExifManager:
         
         return face_tags
     
-    def _extract_keywords(self, exif_dict: Dict, xmp_bytes: bytes = b"", exiftool_fields: Dict = None) -> List[str]:
+    def _extract_keywords(self, exif_dict: Dict, xmp_data: Union[XmpData, bytes, None] = None, exiftool_fields: Dict = None) -> List[str]:
         """Extraherar keywords/taggar från EXIF/XMP."""
         keywords: List[str] = []
         try:
@@ -285,20 +232,10 @@ class ExifManager:
                 user_str = user_comment.decode('utf-8', errors='ignore')
                 keywords.extend(re.findall(r'<rdf:li>([^<]+)</rdf:li>', user_str))
 
-            # XMP i filen
-            if xmp_bytes:
-                blocks = re.findall(br'<dc:subject>\s*<rdf:Bag>(.*?)</rdf:Bag>', xmp_bytes, re.DOTALL)
-                for block in blocks:
-                    for raw_kw in re.findall(br'<rdf:li>([^<]+)</rdf:li>', block):
-                        kw = self._decode_xmp_string(raw_kw)
-                        keywords.append(kw)
-
-                # Lightroom/DigiKam hierarkiska etiketter
-                hierarchical_blocks = re.findall(br'<lr:hierarchicalSubject>\s*<rdf:Bag>(.*?)</rdf:Bag>', xmp_bytes, re.DOTALL)
-                for block in hierarchical_blocks:
-                    for raw_kw in re.findall(br'<rdf:li>([^<]+)</rdf:li>', block):
-                        kw = self._decode_xmp_string(raw_kw)
-                        keywords.append(kw)
+            # XMP i filen (dc:subject och Lightroom/DigiKam hierarkiska etiketter)
+            xmp = self._xmp_model(xmp_data)
+            keywords.extend(xmp.subjects)
+            keywords.extend(xmp.hierarchical_subjects)
 
             # ExifTool-fält som fallback/komplement
             exiftool_fields = exiftool_fields or {}
@@ -321,10 +258,11 @@ class ExifManager:
                 cleaned.append(nk)
         return cleaned
     
-    def _extract_metadata(self, exif_dict: Dict, xmp_bytes: bytes = b"", exiftool_fields: Dict = None) -> Dict:
+    def _extract_metadata(self, exif_dict: Dict, xmp_data: Union[XmpData, bytes, None] = None, exiftool_fields: Dict = None) -> Dict:
         """Extraherar generell metadata"""
         metadata = {}
         try:
+            xmp = self._xmp_model(xmp_data)
             zeroth = exif_dict.get("0th", {})
             exif = exif_dict.get("Exif", {})
             
@@ -339,14 +277,9 @@ class ExifManager:
                 metadata['description'] = desc.decode('utf-8', errors='ignore')
 
             # XMP Titel/Beskrivning
-            if xmp_bytes:
-                for raw, key in (
-                    (re.search(br'<dc:title>\s*<rdf:Alt>\s*<rdf:li[^>]*>([^<]+)</rdf:li>', xmp_bytes, re.DOTALL), 'title'),
-                    (re.search(br'<dc:description>\s*<rdf:Alt>\s*<rdf:li[^>]*>([^<]+)</rdf:li>', xmp_bytes, re.DOTALL), 'description'),
-                ):
-                    if raw:
-                        val = self._decode_xmp_string(raw.group(1))
-                        metadata[key] = val.strip()
+            for value, key in ((xmp.title, 'title'), (xmp.description, 'description')):
+                if value:
+                    metadata[key] = value.strip()
             
             # Artist/Copyright
             if piexif.ImageIFD.Artist in zeroth:
@@ -364,13 +297,10 @@ class ExifManager:
                 title = zeroth[piexif.ImageIFD.DocumentName]
                 metadata['title'] = title.decode('utf-8', errors='ignore')
 
-            if xmp_bytes:
-                xmp_creator_match = re.search(br'<dc:creator>\s*<rdf:Seq>\s*<rdf:li>([^<]+)</rdf:li>', xmp_bytes, re.DOTALL)
-                if xmp_creator_match:
-                    creator_value = self._decode_xmp_string(xmp_creator_match.group(1)).strip()
-                    if creator_value:
-                        metadata['creator'] = creator_value
-                        metadata['photographer'] = creator_value
+            creator_value = (xmp.creator or '').strip()
+            if creator_value:
+                metadata['creator'] = creator_value
+                metadata['photographer'] = creator_value
 
             exiftool_fields = exiftool_fields or {}
             creator_value = exiftool_fields.get('Creator') or exiftool_fields.get('XMP:Creator')
@@ -539,7 +469,7 @@ class ExifManager:
         """
         try:
             if backup:
-                self._create_backup(image_path)
+                self._create_backup(image_path, 'write_metadata')
 
             if self._has_exiftool():
                 return self._write_metadata_exiftool(image_path, metadata)
@@ -550,6 +480,8 @@ class ExifManager:
         except Exception as e:
             print(f'Error writing metadata to {image_path}: {e}')
             return False
+        finally:
+            self.invalidate_cache(image_path)
 
     def _write_metadata_exiftool(self, image_path: str, metadata: Dict) -> bool:
         """Write metadata using exiftool (better XMP support)."""
@@ -573,7 +505,7 @@ class ExifManager:
             description_value = str((metadata or {}).get('description', '')).strip()
             date_value = self._normalize_metadata_date((metadata or {}).get('date', ''))
 
-            cmd = ['exiftool', '-overwrite_original']
+            cmd = ['-overwrite_original']
 
             if normalized_keywords:
                 if keywords_present:
@@ -619,7 +551,7 @@ class ExifManager:
 
             cmd.append(image_path)
 
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self._run_exiftool(cmd)
             if result.returncode != 0:
                 print(f'exiftool metadata write failed: {result.stderr or result.stdout}')
             return result.returncode == 0
@@ -687,7 +619,7 @@ class ExifManager:
         """
         try:
             if backup:
-                self._create_backup(image_path)
+                self._create_backup(image_path, 'write_face_tags')
             
             # Kolla om exiftool finns
             if not self._has_exiftool():
@@ -720,7 +652,7 @@ class ExifManager:
                 })
             
             # Build exiftool command to write MWG-Regions
-            cmd = ['exiftool', '-overwrite_original']
+            cmd = ['-overwrite_original']
             
             # 1. Clear old regions first
             cmd.append('-Xmp.mwg-rs.Regions=')
@@ -752,7 +684,7 @@ class ExifManager:
             cmd.append(image_path)
             
             # Execute exiftool
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self._run_exiftool(cmd)
             
             if result.returncode == 0:
                 return True
@@ -763,6 +695,8 @@ class ExifManager:
         except Exception as e:
             print(f"Error writing face tags to {image_path}: {e}")
             return False
+        finally:
+            self.invalidate_cache(image_path)
     
     def _write_face_tags_piexif_fallback(self, image_path: str, face_tags: List[Dict], backup: bool = True) -> bool:
         """
@@ -771,7 +705,7 @@ class ExifManager:
         """
         try:
             if backup:
-                self._create_backup(image_path)
+                self._create_backup(image_path, 'write_face_tags')
             
             exif_dict = piexif.load(image_path)
             
@@ -796,14 +730,25 @@ class ExifManager:
         except Exception as e:
             print(f"Error in piexif fallback: {e}")
             return False
+        finally:
+            self.invalidate_cache(image_path)
     
     def _has_exiftool(self) -> bool:
-        """Check if exiftool is available in PATH"""
+        """Check if exiftool is available (cached capability record, refreshed after failures)"""
+        return self.exiftool.available()
+
+    def capabilities(self, reload: bool = False) -> Dict:
+        """Sparad exiftool-kontroll (version, funktioner); reload=True kontrollerar igen."""
+        if reload:
+            return self.exiftool.refresh_capabilities()
+        return self.exiftool.capabilities()
+
+    def _run_exiftool(self, args: List[str]) -> ExiftoolResult:
+        """Run exiftool in a pooled -stay_open process; crash/timeout gives returncode 1."""
         try:
-            subprocess.run(['exiftool', '-ver'], capture_output=True, timeout=2)
-            return True
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            return False
+            return self.exiftool.execute(args)
+        except ExiftoolError as e:
+            return ExiftoolResult('', f'Error: {e}')
     
     def remove_all_metadata(self, image_path: str, backup: bool = True) -> bool:
         """
@@ -815,7 +760,7 @@ class ExifManager:
         """
         try:
             if backup:
-                self._create_backup(image_path)
+                self._create_backup(image_path, 'remove_metadata')
             
             piexif.remove(image_path)
             return True
@@ -823,6 +768,8 @@ class ExifManager:
         except Exception as e:
             print(f"Error removing metadata from {image_path}: {e}")
             return False
+        finally:
+            self.invalidate_cache(image_path)
     
     def copy_metadata(self, source_path: str, target_path: str) -> bool:
         """
@@ -841,60 +788,115 @@ class ExifManager:
         except Exception as e:
             print(f"Error copying metadata: {e}")
             return False
+        finally:
+            self.invalidate_cache(target_path)
     
-    def _create_backup(self, image_path: str) -> str:
-        """Skapar backup av originalbild"""
-        filename = os.path.basename(image_path)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"{timestamp}_{filename}"
-        backup_path = os.path.join(self.backup_dir, backup_filename)
-        
-        shutil.copy2(image_path, backup_path)
-        return backup_path
+    def invalidate_cache(self, image_path: str):
+        """Tar bort läscachen för en fil som skrivits (även vid fel, filen kan vara delvis ändrad) eller ändrats utifrån."""
+        if self.cache is None:
+            return
+        try:
+            self.cache.invalidate(image_path)
+        except Exception as e:
+            print(f"EXIF cache invalidation failed for {image_path}: {e}")
+
+    def cache_stats(self) -> Dict:
+        """Träffstatistik för läscachen."""
+        if self.cache is None:
+            return {'enabled': False}
+        return dict(self.cache.stats(), enabled=True)
+
+    def _create_backup(self, image_path: str, operation: str = '') -> Dict:
+        """Skapar backup före skrivning (i BackupStore); returnerar manifestraden"""
+        if self.backup_mode == 'metadata':
+            try:
+                record = self.backups.backup_metadata(image_path, operation)
+                if record is not None:
+                    return record
+            except ValueError as e:
+                # Trasig/ovanlig segmentstruktur: ta hel backup i stället
+                print(f"Metadata backup failed for {image_path}, using full copy: {e}")
+        return self.backups.backup(image_path, operation)
+    
+    def list_backups(self, image_path: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Backuper, nyaste först (för en bild om image_path anges)"""
+        return self.backups.list_backups(image_path, limit)
+    
+    def restore_backup(self, backup_id: int, target_path: Optional[str] = None) -> Dict:
+        """
+        Återställer en backup. Nuvarande innehåll säkerhetskopieras först,
+        så att återställningen i sin tur kan ångras.
+        """
+        record = self.backups.get(backup_id)
+        if record is None:
+            raise KeyError(f'Unknown backup id {backup_id}')
+        target = target_path or record['path']
+        if os.path.exists(target):
+            self._create_backup(target, 'restore')
+        try:
+            return self.backups.restore(backup_id, target)
+        finally:
+            self.invalidate_cache(target)
+    
+    def undo(self, image_path: str) -> Optional[Dict]:
+        """
+        Ångrar senaste skrivningen: återställer senaste backupen som inte själv gjordes av undo.
+        Tillståndet före ångrandet sparas (operation 'undo'), så att det kan återställas via restore_backup.
+        Returnerar None om bilden saknar backup.
+        """
+        for record in self.backups.list_backups(image_path, limit=50):
+            if record['operation'] not in ('undo', 'restore'):
+                break
+        else:
+            return None
+        self._create_backup(image_path, 'undo')
+        try:
+            return self.backups.restore(record['id'], image_path)
+        finally:
+            self.invalidate_cache(image_path)
     
-    def batch_process(self, image_paths: List[str], operation: str, **kwargs) -> Dict[str, bool]:
+    def batch_process(self, image_paths: List[str], operation: str, max_workers: Optional[int] = None,
+                      **kwargs) -> Dict[str, bool]:
         """
-        Batch-process flera bilder
+        Batch-process flera bilder (parallellt, högst max_workers filer åt gången)
         
         Args:
             image_paths: Lista med bildvägar
             operation: 'read', 'write_keywords', 'write_face_tags', 'remove_metadata', etc.
+            max_workers: Max antal samtidiga filer (None = batch-poolens storlek)
             **kwargs: Parametrar för operationen
         
         Returns:
             Dict med {image_path: success_bool}
         """
-        results = {}
-        
-        for image_path in image_paths:
-            try:
-                if operation == 'read':
-                    results[image_path] = self.read_exif(image_path)
-                elif operation == 'write_keywords':
-                    results[image_path] = self.write_keywords(
-                        image_path,
-                        kwargs.get('keywords', []),
-                        kwargs.get('backup', True),
-                        kwargs.get('photographer', '')
-                    )
-                elif operation == 'write_metadata':
-                    results[image_path] = self.write_keywords(
-                        image_path,
-                        kwargs.get('keywords', []),
-                        kwargs.get('backup', True),
-                        kwargs.get('photographer', '')
-                    )
-                elif operation == 'write_face_tags':
-                    results[image_path] = self.write_face_tags(image_path, kwargs.get('face_tags', []))
-                elif operation == 'remove_metadata':
-                    results[image_path] = self.remove_all_metadata(image_path)
-                else:
-                    results[image_path] = False
-            except Exception as e:
-                print(f"Batch error on {image_path}: {e}")
-                results[image_path] = False
-        
-        return results
+        job = self.start_batch(image_paths, operation, max_workers=max_workers, **kwargs)
+        job.wait()
+        return {image_path: job.results.get(image_path, False) for image_path in image_paths}
+    
+    def start_batch(self, image_paths: List[str], operation: str, max_workers: Optional[int] = None,
+                    **kwargs) -> BatchJob:
+        """
+        Startar ett batchjobb i bakgrunden och returnerar direkt.
+        Jobbet kan pollas (job.to_dict()), strömmas (job.iter_events()) eller avbrytas (job.cancel()).
+        """
+        return self.batch.start(image_paths, operation, max_workers=max_workers, **kwargs)
+    
+    def _batch_operation(self, image_path: str, operation: str, kwargs: Dict):
+        """Kör en batchoperation på en fil (anropas från batch-poolen)."""
+        if operation == 'read':
+            return self.read_exif(image_path)
+        elif operation in ('write_keywords', 'write_metadata'):
+            return self.write_keywords(
+                image_path,
+                kwargs.get('keywords', []),
+                kwargs.get('backup', True),
+                kwargs.get('photographer', '')
+            )
+        elif operation == 'write_face_tags':
+            return self.write_face_tags(image_path, kwargs.get('face_tags', []))
+        elif operation == 'remove_metadata':
+            return self.remove_all_metadata(image_path)
+        return False
     
     def verify_mwg_regions(self, image_path: str) -> Dict:
         """
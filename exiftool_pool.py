@@ -0,0 +1,283 @@
+"""
+Exiftool Pool - Långlivade exiftool-processer (-stay_open)
+
+Att starta exiftool (Perl) tar längre tid än själva läsningen/skrivningen av
+en bild. Poolen håller i stället ett antal processer igång:
+
+    exiftool -stay_open True -@ -
+
+Varje kommando skrivs som ett argument per rad på stdin, följt av
+-echo4 {readyN} och -execute{N}. Svaret på stdout avslutas av exiftool med
+{readyN} och stderr av vår -echo4-markör, så att anropet vet när det är klart.
+
+  - En process används av ett anrop i taget (utcheckning ur en kö + lås per arbetare)
+  - Kraschad process eller timeout: processen avslutas och startas om vid nästa anrop
+  - Antal processer och timeout är konfigurerbara
+
+Vilken exiftool som finns (version och funktioner) tas reda på en gång
+(capabilities()) och sparas; kontrollen görs om först efter ett fel eller vid
+refresh_capabilities(). Utan -stay_open-stöd körs varje kommando i en egen process.
+
+För tester kan command pekas på scripts/fake_exiftool.py, som talar samma protokoll.
+"""
+
+import atexit
+import itertools
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Union
+
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_TIMEOUT = 30.0
+PROBE_TIMEOUT = 5.0
+# Funktioner och lägsta exiftool-version som stöder dem
+FEATURE_VERSIONS = {
+    'stay_open': 8.42,         # -stay_open True -@ -
+    'charset_filename': 9.79,  # -charset filename=utf8
+}
+
+
+class ExiftoolError(Exception):
+    """Fel i kommunikationen med en exiftool-process (krasch, timeout)."""
+
+
+class ExiftoolResult:
+    """Svar från ett kommando, med samma fält som subprocess.CompletedProcess."""
+
+    def __init__(self, stdout: str, stderr: str):
+        self.stdout = stdout
+        self.stderr = stderr
+        # -stay_open ger ingen returkod per kommando; fel rapporteras som "Error: ..." på stderr
+        self.returncode = 1 if any(line.startswith('Error') for line in stderr.splitlines()) else 0
+
+
+class ExiftoolWorker:
+    """En exiftool-process i -stay_open-läge."""
+
+    _counter = itertools.count(1)
+
+    def __init__(self, command: Sequence[str], utf8_filenames: bool = True):
+        self.command = list(command)
+        self.utf8_filenames = utf8_filenames
+        self.lock = threading.Lock()
+        self.process: Optional[subprocess.Popen] = None
+        self._stdout: 'queue.Queue[Optional[bytes]]' = queue.Queue()
+        self._stderr: 'queue.Queue[Optional[bytes]]' = queue.Queue()
+        self.restarts = 0
+
+    def _start(self):
+        creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+        self.process = subprocess.Popen(
+            self.command + ['-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=creationflags,
+        )
+        self._stdout = queue.Queue()
+        self._stderr = queue.Queue()
+        # Läsartrådar per ström (fungerar även på Windows där select() inte stöder pipes)
+        for stream, target in ((self.process.stdout, self._stdout), (self.process.stderr, self._stderr)):
+            threading.Thread(target=self._pump, args=(stream, target), daemon=True).start()
+
+    @staticmethod
+    def _pump(stream, target):
+        try:
+            for line in iter(stream.readline, b''):
+                target.put(line)
+        except (OSError, ValueError):
+            pass
+        target.put(None)
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def execute(self, args: Sequence[str], timeout: float) -> ExiftoolResult:
+        """Kör ett kommando; anroparen ska hålla self.lock."""
+        if not self.alive():
+            if self.process is not None:
+                self.restarts += 1
+            self._start()
+        n = next(self._counter)
+        marker = f'{{ready{n}}}'
+        # Filnamn skickas som UTF-8 (krävs för icke-ASCII-sökvägar på Windows)
+        prefix = ['-charset', 'filename=utf8'] if self.utf8_filenames else []
+        payload = '\n'.join(prefix + list(args) + ['-echo4', marker, f'-execute{n}']) + '\n'
+        try:
+            self.process.stdin.write(payload.encode('utf-8'))
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.kill()
+            raise ExiftoolError(f'exiftool process died: {e}')
+        deadline = time.monotonic() + timeout
+        stdout = self._collect(self._stdout, marker, deadline)
+        stderr = self._collect(self._stderr, marker, deadline)
+        return ExiftoolResult(stdout, stderr)
+
+    def _collect(self, source: 'queue.Queue', marker: str, deadline: float) -> str:
+        lines: List[bytes] = []
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                line = source.get(timeout=max(remaining, 0.001)) if remaining > 0 else source.get_nowait()
+            except queue.Empty:
+                self.kill()
+                raise ExiftoolError('exiftool timed out')
+            if line is None:
+                self.kill()
+                raise ExiftoolError('exiftool process exited')
+            if line.rstrip(b'\r\n').decode('utf-8', errors='replace') == marker:
+                return b''.join(lines).decode('utf-8', errors='replace')
+            lines.append(line)
+
+    def stop(self, timeout: float = 2.0):
+        if not self.alive():
+            return
+        try:
+            self.process.stdin.write(b'-stay_open\nFalse\n')
+            self.process.stdin.flush()
+            self.process.wait(timeout=timeout)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self.kill()
+
+    def kill(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+            self.process.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+
+class ExiftoolPool:
+    """Pool med size långlivade exiftool-processer."""
+
+    def __init__(self, command: Union[str, Sequence[str]] = 'exiftool', size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.command = [command] if isinstance(command, str) else list(command)
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._workers = [ExiftoolWorker(self.command) for _ in range(self.size)]
+        self._idle: 'queue.Queue[ExiftoolWorker]' = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        self._capabilities: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.probes = 0
+        atexit.register(self.close)
+
+    def capabilities(self) -> Dict:
+        """
+        Sparad beskrivning av exiftool: {'available', 'version', 'features', 'path', 'checked_at', 'error'}.
+        Kontrolleras vid första anropet och sedan bara efter fel eller refresh_capabilities().
+        """
+        with self._lock:
+            if self._capabilities is None:
+                self._capabilities = self._probe()
+                for worker in self._workers:
+                    worker.utf8_filenames = 'charset_filename' in self._capabilities['features']
+            return dict(self._capabilities)
+
+    def refresh_capabilities(self) -> Dict:
+        self.reset_availability()
+        return self.capabilities()
+
+    def has_feature(self, feature: str) -> bool:
+        return feature in self.capabilities()['features']
+
+    def available(self) -> bool:
+        """Om exiftool finns (enligt den sparade kontrollen)."""
+        return self.capabilities()['available']
+
+    def reset_availability(self):
+        """Gör om kontrollen vid nästa anrop (t.ex. efter att exiftool installerats)."""
+        with self._lock:
+            self._capabilities = None
+
+    def _probe(self) -> Dict:
+        self.probes += 1
+        record = {'available': False, 'version': None, 'features': [], 'path': shutil.which(self.command[0]),
+                  'checked_at': time.time(), 'error': None}
+        if record['path'] is None:
+            record['error'] = f'{self.command[0]} not found in PATH'
+            return record
+        try:
+            result = subprocess.run(self.command + ['-ver'], capture_output=True, timeout=PROBE_TIMEOUT,
+                                    creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        except (OSError, subprocess.TimeoutExpired) as e:
+            record['error'] = str(e)
+            return record
+        text = result.stdout.decode('utf-8', errors='replace').strip()
+        try:
+            version = float(text.split()[0])
+        except (IndexError, ValueError):
+            record['error'] = f'unexpected -ver output: {text[:80]!r}'
+            return record
+        record['available'] = result.returncode == 0
+        record['version'] = text.split()[0]
+        record['features'] = [name for name, minimum in FEATURE_VERSIONS.items() if version >= minimum]
+        return record
+
+    def execute(self, args: Sequence[str], timeout: Optional[float] = None) -> ExiftoolResult:
+        """
+        Kör exiftool med args (utan programnamn) i en ledig process.
+        Kastar ExiftoolError vid krasch/timeout; processen startas då om vid nästa anrop.
+        """
+        if any('\n' in str(arg) for arg in args) or not self.has_feature('stay_open'):
+            # Argumentfilen har ett argument per rad; värden med radbrytning (och gamla
+            # exiftool utan -stay_open) körs i en egen process
+            return self._run_once(args, timeout)
+        worker = self._idle.get()
+        try:
+            with worker.lock:
+                with self._lock:
+                    self.calls += 1
+                return worker.execute([str(arg) for arg in args], timeout or self.timeout)
+        except (ExiftoolError, OSError) as e:
+            # Fel kan betyda att exiftool bytts ut eller tagits bort: kontrollera igen vid nästa anrop
+            self._failed()
+            if isinstance(e, ExiftoolError):
+                raise
+            raise ExiftoolError(f'could not start exiftool: {e}')
+        finally:
+            self._idle.put(worker)
+
+    def _failed(self):
+        with self._lock:
+            self.failures += 1
+            self._capabilities = None
+
+    def _run_once(self, args: Sequence[str], timeout: Optional[float]) -> ExiftoolResult:
+        try:
+            result = subprocess.run(self.command + [str(arg) for arg in args], capture_output=True,
+                                    timeout=timeout or self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self._failed()
+            raise ExiftoolError(f'exiftool failed: {e}')
+        out = ExiftoolResult(result.stdout.decode('utf-8', errors='replace'), result.stderr.decode('utf-8', errors='replace'))
+        out.returncode = result.returncode
+        return out
+
+    def close(self):
+        for worker in self._workers:
+            with worker.lock:
+                worker.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'command': self.command,
+                'size': self.size,
+                'running': sum(1 for worker in self._workers if worker.alive()),
+                'calls': self.calls,
+                'failures': self.failures,
+                'restarts': sum(worker.restarts for worker in self._workers),
+                'probes': self.probes,
+            }
@@ -1,6 +1,36 @@
-import json
-import sqlite3
+"""
+Importerar Lantmäteriets ortnamn (GeoJSON) till official_places.db.
+
+Filen läses strömmat (ett feature i taget via json_stream.iter_array_items),
+så minnesåtgången är konstant oavsett filstorlek. Raderna skrivs med
+executemany i block om BATCH_SIZE. Under laddningen är journal och fsync
+avstängda (journal_mode=OFF, synchronous=OFF) och tabellens index och
+triggers borttagna; de återskapas i ett svep efteråt. Kör därför inte
+importen mot en databas som servern använder samtidigt, och ta en kopia
+först: ett avbrott mitt i laddningen kan lämna filen trasig.
+
+Dubbletter (samma ortnamn+sockenstadnamn+kommunkod+lanskod) filtreras mot en
+temporär nyckeltabell på disk i stället för ett set i minnet.
+
+Med --sync läses filen på samma sätt men synkas mot befintliga rader
+(place_sync, nyckel fid): id:n behålls och bara ändringar skrivs, och
+databasen kan användas under tiden.
+"""
+
+import argparse
+import functools
+import io
 import os
+import sqlite3
+import time
+
+from json_stream import iter_array_items
+from name_normalize import normalize_name, normalize_place_name
+from official_place_database import (
+    KEY_NORMALIZERS, NORMALIZED_COLUMNS, bump_data_version, drop_search_index, ensure_normalized_keys,
+    ensure_search_index,
+)
+from place_sync import remap_matched_place_ids, sync_places
 
 
 # KOMMUNER: kod -> namn (alla svenska kommuner 2024)
@@ -34,26 +64,86 @@ EXCLUDE_TYPES = set([
     'VATTDRTX','SJÖ','HAV','KÄLLA','BERG','SKOG','Ö','DAL','MARK','VÄG','BRO','JÄRNVÄG','HAMN','KVARTSRUTA','SAMISK','KULTUR','FORS'
 ])
 
+BATCH_SIZE = 5000
+# Antal parametrar per IN-fråga mot nyckeltabellen (under SQLites gräns 999)
+KEY_LOOKUP_CHUNK = 500
+PROGRESS_INTERVAL = 50000
+# Socken-, kommun- och länsnamn upprepas hela tiden; deras nycklar cachas
+NORMALIZE_CACHE_SIZE = 65536
+
+PLACE_COLUMNS = (
+    'ortnamn', 'sockenstadnamn', 'sockenstadkod', 'kommunkod', 'kommunnamn', 'lanskod', 'lansnamn',
+    'detaljtyp', 'sprak', 'kvartsruta', 'nkoordinat', 'ekoordinat', 'lopnummer', 'fid', 'latitude', 'longitude',
+)
+# Källnyckel vid --sync: (SYNC_SOURCE, fid); äldre rader utan nyckel tas över på fid+ortnamn
+SYNC_SOURCE = 'lantmateriet'
+ADOPT_KEYS = (('fid', 'ortnamn'),)
+INSERT_COLUMNS = PLACE_COLUMNS + tuple(f'{column}_norm' for column in NORMALIZED_COLUMNS)
+_FID_POSITION = PLACE_COLUMNS.index('fid')
+_cached_normalize_name = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(normalize_name)
+_cached_normalize_place_name = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(normalize_place_name)
+# (position, nyckelfunktion) per normaliserad kolumn; ortnamn är nästan alltid unika och cachas inte
+_NORM_KEYS = tuple(
+    (PLACE_COLUMNS.index(column),
+     normalize_place_name if column == 'ortnamn'
+     else _cached_normalize_place_name if column in KEY_NORMALIZERS
+     else _cached_normalize_name)
+    for column in NORMALIZED_COLUMNS
+)
+
+
 def normalize(val):
     if not isinstance(val, str):
         return ''
     return val.strip().lower()
 
-def main():
-    geojson_path = 'map.geojson'
-    db_path = 'official_places.db'
-    
-    # Läs in geojson
-    with open(geojson_path, encoding='utf-8') as f:
-        data = json.load(f)
-    
-    features = data['features']
-    print(f"Läser {len(features)} features...")
-
-    # Skapa databas och tabell
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''
+
+def place_key(prop):
+    """Unik-nyckel: ortnamn+sockenstadnamn+kommunkod+lanskod"""
+    return '\x1f'.join((
+        normalize(prop.get('ortnamn', '')),
+        normalize(prop.get('sockenstadnamn', '')),
+        normalize(prop.get('kommunkod', '')),
+        normalize(prop.get('lanskod', '')),
+    ))
+
+
+def place_row(feat):
+    """(nyckel, radvärden i PLACE_COLUMNS-ordning), eller None för typer som inte importeras."""
+    prop = feat.get('properties') or {}
+    typ = (prop.get('detaljtyp') or '').upper()
+    if typ in EXCLUDE_TYPES:
+        return None
+    # Koordinater
+    coords = (feat.get('geometry') or {}).get('coordinates') or (None, None)
+    lon, lat = coords[0], coords[1]
+    # Kommun/län namn
+    kommunkod = prop.get('kommunkod', '')
+    lanskod = prop.get('lanskod', '')
+    values = {
+        'kommunkod': kommunkod,
+        'kommunnamn': KOMMUNER.get(kommunkod, ''),
+        'lanskod': lanskod,
+        'lansnamn': LÄN.get(lanskod, ''),
+        'latitude': lat,
+        'longitude': lon,
+    }
+    # Spara ALLA fält + lookup
+    row = tuple(values[column] if column in values else prop.get(column) for column in PLACE_COLUMNS)
+    return place_key(prop), row
+
+
+def with_search_keys(rows):
+    """
+    Lägger till normaliserade söknycklar (NORMALIZED_COLUMNS) direkt vid insättningen,
+    så att ingen extra uppdateringsrunda över hela tabellen behövs efteråt.
+    """
+    for row in rows:
+        yield row + tuple(function(row[position]) for position, function in _NORM_KEYS)
+
+
+def create_table(conn):
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS official_places (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             ortnamn TEXT,
@@ -74,62 +164,160 @@ def main():
             longitude REAL
         )
     ''')
+    # *_norm-kolumnerna skapas innan laddningen så att nycklarna kan skrivas direkt
+    ensure_normalized_keys(conn)
+
+
+def drop_indexes_and_triggers(conn):
+    """
+    Tar bort official_places index och triggers; returnerar deras SQL för återskapande.
+    Även versionstriggerna tas bort, så anroparen måste räkna upp data_version efter laddningen.
+    """
+    rows = conn.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = 'official_places' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''').fetchall()
+    for type_, name, _ in rows:
+        conn.execute(f'DROP {type_.upper()} IF EXISTS "{name}"')
+    return [sql for _, _, sql in rows]
+
+
+def filter_new(conn, batch):
+    """Rader i batch vars nyckel inte setts tidigare (första förekomsten vinner); nycklarna registreras."""
+    unique = {}
+    for key, row in batch:
+        unique.setdefault(key, row)
+    keys = list(unique)
+    for start in range(0, len(keys), KEY_LOOKUP_CHUNK):
+        chunk = keys[start:start + KEY_LOOKUP_CHUNK]
+        placeholders = ', '.join('?' * len(chunk))
+        for (key,) in conn.execute(f'SELECT key FROM import_keys WHERE key IN ({placeholders})', chunk):
+            del unique[key]
+    conn.executemany('INSERT INTO import_keys (key) VALUES (?)', [(key,) for key in unique])
+    return list(unique.items())
+
+
+def iter_new_places(conn, geojson_path, batch_size, stats):
+    """
+    Läser GeoJSON-filen strömmat och ger listor med (nyckel, rad) för platser vars
+    nyckel inte setts tidigare; skriver ut förlopp. Kräver temptabellen import_keys.
+    """
+    total_bytes = os.path.getsize(geojson_path)
+    next_report = PROGRESS_INTERVAL
+    batch = []
+    with open(geojson_path, 'rb') as raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8')
+        for feat in iter_array_items(text, 'features'):
+            stats['read'] += 1
+            entry = place_row(feat)
+            if entry is not None:
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    yield filter_new(conn, batch)
+                    batch = []
+            if stats['read'] >= next_report:
+                next_report += PROGRESS_INTERVAL
+                elapsed = time.monotonic() - stats['started']
+                print(f"Läst {stats['read']} features ({raw.tell() * 100 // max(total_bytes, 1)} %), "
+                      f"importerat {stats['count']} platser, {stats['read'] / elapsed:.0f} features/s")
+        if batch:
+            yield filter_new(conn, batch)
+
+
+def _create_key_table(conn):
+    # Nyckeltabellen ligger i en temporärfil på disk, inte i minnet
+    conn.execute('PRAGMA temp_store=FILE')
+    conn.execute('CREATE TEMP TABLE import_keys (key TEXT PRIMARY KEY) WITHOUT ROWID')
+
+
+def main(geojson_path='map.geojson', db_path='official_places.db', batch_size=BATCH_SIZE):
+    conn = sqlite3.connect(db_path)
+    create_table(conn)
+    # Sökindexet byggs om i ett svep efter importen istället för via triggers per rad
+    drop_search_index(conn)
+    saved_sql = drop_indexes_and_triggers(conn)
     conn.commit()
 
-    seen = set()
-    count = 0
-    for feat in features:
-        prop = feat['properties']
-        typ = prop.get('detaljtyp','').upper()
-        if typ in EXCLUDE_TYPES:
-            continue
-        # Unik-nyckel: ortnamn+sockenstadnamn+kommunkod+lanskod
-        key = (
-            normalize(prop.get('ortnamn','')),
-            normalize(prop.get('sockenstadnamn','')),
-            normalize(prop.get('kommunkod','')),
-            normalize(prop.get('lanskod','')),
-        )
-        if key in seen:
-            continue
-        seen.add(key)
-        # Koordinater
-        coords = feat['geometry']['coordinates']
-        lon, lat = coords[0], coords[1]
-        # Kommun/län namn
-        kommunkod = prop.get('kommunkod','')
-        kommunnamn = KOMMUNER.get(kommunkod, '')
-        lanskod = prop.get('lanskod','')
-        lansnamn = LÄN.get(lanskod, '')
-        # Spara ALLA fält + lookup
-        c.execute('''
-            INSERT INTO official_places (
-                ortnamn, sockenstadnamn, sockenstadkod, kommunkod, kommunnamn, lanskod, lansnamn, detaljtyp, sprak, kvartsruta, nkoordinat, ekoordinat, lopnummer, fid, latitude, longitude
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            prop.get('ortnamn'),
-            prop.get('sockenstadnamn'),
-            prop.get('sockenstadkod'),
-            kommunkod,
-            kommunnamn,
-            lanskod,
-            lansnamn,
-            prop.get('detaljtyp'),
-            prop.get('sprak'),
-            prop.get('kvartsruta'),
-            prop.get('nkoordinat'),
-            prop.get('ekoordinat'),
-            prop.get('lopnummer'),
-            prop.get('fid'),
-            lat,
-            lon
-        ))
-        count += 1
-        if count % 10000 == 0:
-            print(f"Importerade {count} platser...")
+    previous_journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-65536')
+    _create_key_table(conn)
+
+    insert_sql = (f"INSERT INTO official_places ({', '.join(INSERT_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(INSERT_COLUMNS))})")
+    stats = {'read': 0, 'count': 0, 'started': time.monotonic()}
+    for rows in iter_new_places(conn, geojson_path, batch_size, stats):
+        conn.executemany(insert_sql, with_search_keys(row for _, row in rows))
+        conn.commit()
+        stats['count'] += len(rows)
+
+    read, count, started = stats['read'], stats['count'], stats['started']
+    elapsed = time.monotonic() - started
+    print(f"Laddat {count} unika platser av {read} features på {elapsed:.1f} s ({read / max(elapsed, 1e-9):.0f} features/s)")
+    conn.execute('DROP TABLE import_keys')
+    conn.execute(f'PRAGMA journal_mode={previous_journal_mode}')
+    conn.execute('PRAGMA synchronous=FULL')
+
+    print("Bygger index, sökindex (FTS5) och normaliserade namnnycklar...")
+    for sql in saved_sql:
+        conn.execute(sql)
+    # Versionstriggerna var borta under laddningen; en uppräkning gör trädcachen m.m. inaktuella
+    bump_data_version(conn)
+    ensure_search_index(conn)
+    ensure_normalized_keys(conn)
+    conn.commit()
+    print(f"KLART! {count} unika platser importerade till {db_path} på {time.monotonic() - started:.1f} s.")
+    conn.close()
+
+
+def sync(geojson_path='map.geojson', db_path='official_places.db', batch_size=BATCH_SIZE, places_db_path=None):
+    """
+    Synkar filen mot en befintlig databas (place_sync): bara nya, ändrade och
+    borttagna platser skrivs och befintliga id:n behålls. Nyckeln är fid.
+    matched_place_id i places_db_path (standard: places.db bredvid db_path) pekas
+    om för äldre dubbletter som ersatts.
+    """
+    conn = sqlite3.connect(db_path)
+    create_table(conn)
+    _create_key_table(conn)
+    stats = {'read': 0, 'count': 0, 'started': time.monotonic()}
+
+    def entries():
+        for rows in iter_new_places(conn, geojson_path, batch_size, stats):
+            stats['count'] += len(rows)
+            for key, row in rows:
+                fid = row[_FID_POSITION]
+                yield (fid if fid is not None else key), row
+
+    with conn:
+        result = sync_places(conn, SYNC_SOURCE, PLACE_COLUMNS, entries(), adopt_keys=ADOPT_KEYS)
+        conn.execute('DROP TABLE import_keys')
+    print(f"Nya: {result['inserted']}, ändrade: {result['updated']}, oförändrade: {result['unchanged']}, "
+          f"borttagna: {result['removed']}, övertagna äldre rader: {result['adopted']}")
+    places_db_path = places_db_path or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'places.db')
+    remapped = remap_matched_place_ids(places_db_path, result['replaced_ids'])
+    if result['replaced']:
+        print(f"Äldre dubbletter ersatta: {result['replaced']} (matched_place_id ompekade: {remapped})")
+    print("Uppdaterar sökindex (FTS5) och normaliserade namnnycklar...")
+    ensure_search_index(conn)
+    ensure_normalized_keys(conn)
     conn.commit()
-    print(f"KLART! {count} unika platser importerade till {db_path}.")
+    print(f"KLART! {stats['count']} unika platser synkade mot {db_path} på {time.monotonic() - stats['started']:.1f} s.")
     conn.close()
 
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Importera ortnamn (GeoJSON) till official_places.db')
+    parser.add_argument('--geojson', default='map.geojson', help='GeoJSON-fil (standard: map.geojson)')
+    parser.add_argument('--db', default='official_places.db', help='Måldatabas (standard: official_places.db)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rader per executemany/commit')
+    parser.add_argument('--sync', action='store_true',
+                        help='Synka mot befintliga rader (behåller id:n) i stället för att bulkladda')
+    parser.add_argument('--places-db', default=None,
+                        help='Platsdatabas vars matched_place_id pekas om vid --sync (standard: places.db bredvid --db)')
+    args = parser.parse_args()
+    if args.sync:
+        sync(args.geojson, args.db, args.batch_size, args.places_db)
+    else:
+        main(args.geojson, args.db, args.batch_size)
@@ -0,0 +1,169 @@
+"""
+JSON Stream - Strömmad serialisering och läsning av stora listor
+
+Istället för att bygga hela listan i minnet och serialisera den på en gång
+(jsonify) serialiseras en rad i taget från en generator. Raderna samlas i
+block om ungefär CHUNK_SIZE byte innan de skickas, så att klienten får
+första byten direkt medan serverns minne hålls konstant.
+
+Två format:
+  - iter_json_array(): en vanlig JSON-array, skickad i bitar
+  - iter_ndjson():     en rad JSON per post (application/x-ndjson)
+
+Åt andra hållet läser iter_array_items() elementen i en array i ett stort
+JSON-dokument (t.ex. "features" i en GeoJSON-fil) ett i taget, så att bara
+det aktuella elementet och ett läsblock ligger i minnet.
+"""
+
+import json
+from typing import IO, Iterable, Iterator
+
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Ungefärlig storlek på varje skickat block
+CHUNK_SIZE = 64 * 1024
+# Antal rader som hämtas per fetchmany() i databasgeneratorerna
+FETCH_SIZE = 500
+# Antal tecken som läses åt gången i iter_array_items()
+READ_SIZE = 1024 * 1024
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_json_array(items: Iterable) -> Iterator[bytes]:
+    """Serialiserar items som en JSON-array i block."""
+    buffer = ['[']
+    size = 1
+    first = True
+    for item in items:
+        text = _dumps(item)
+        if not first:
+            text = ',' + text
+        first = False
+        buffer.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    buffer.append(']')
+    yield ''.join(buffer).encode('utf-8')
+
+
+def iter_ndjson(items: Iterable) -> Iterator[bytes]:
+    """Serialiserar items som NDJSON (en post per rad) i block."""
+    buffer = []
+    size = 0
+    for item in items:
+        text = _dumps(item) + '\n'
+        buffer.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def iter_cursor(cursor, convert=dict, fetch_size: int = FETCH_SIZE) -> Iterator:
+    """Går igenom ett utfört cursor-resultat med fetchmany() och konverterar varje rad."""
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield convert(row)
+
+
+class _StreamReader:
+    """Textbuffert över en fil som fylls på när ett värde sträcker sig förbi slutet."""
+
+    _decoder = json.JSONDecoder()
+    _whitespace = ' \t\n\r'
+
+    def __init__(self, f: IO[str], read_size: int):
+        self.f = f
+        self.read_size = read_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        # Släpp det som redan tolkats innan bufferten växer
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def peek(self) -> str:
+        """Nästa tecken som inte är blanksteg ('' vid filslut)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self._whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if not found:
+            raise ValueError(f'Unexpected end of JSON document (expected {char!r})')
+        if found != char:
+            raise ValueError(f'Expected {char!r} at character {self.pos} of the current block')
+        self.pos += 1
+
+    def value(self):
+        """Nästa kompletta JSON-värde."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Ett tal i slutet av bufferten kan fortsätta i nästa block
+            if end >= len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_array_items(f: IO[str], key: str, read_size: int = READ_SIZE) -> Iterator:
+    """
+    Elementen i arrayen under toppnivånyckeln key ({"key": [...]}) ett i taget.
+    Övriga toppnivåvärden (t.ex. "crs") tolkas och kastas. ValueError om
+    dokumentet inte är ett objekt eller nyckeln saknas.
+    """
+    reader = _StreamReader(f, read_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        raise ValueError(f'Key {key!r} not found')
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name != key:
+            reader.value()
+        else:
+            reader.expect('[')
+            if reader.peek() == ']':
+                return
+            while True:
+                yield reader.value()
+                if reader.peek() == ']':
+                    return
+                reader.expect(',')
+        if reader.peek() == '}':
+            raise ValueError(f'Key {key!r} not found')
+        reader.expect(',')
@@ -0,0 +1,457 @@
+"""
+Media Index - Sökbart metadataindex över bildmappar
+
+Bildmappar (media roots) genomsöks med os.scandir i en bakgrundstråd.
+Nya och ändrade bilder (storlek/mtime_ns skiljer sig från indexet) läses med
+ExifManager.read_exif i parallella arbetare; borttagna filer tas bort ur indexet.
+Resultatet sparas i SQLite:
+
+  media_files     en rad per bild (datum, titel, fotograf, GPS, fel)
+  media_keywords  nyckelord per bild
+  media_faces     personer/ansiktsregioner per bild
+  media_fts       FTS5 över nyckelord, personer och titel/beskrivning
+
+search() svarar helt från indexet och öppnar aldrig bildfilerna.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from official_place_database import decode_cursor, encode_cursor
+from sqlite_pool import get_pool
+
+
+DEFAULT_INDEX_PATH = os.path.join('cache', 'media_index.db')
+# Rötter kan även anges i miljövariabeln (separerade med os.pathsep)
+MEDIA_ROOTS_ENV = 'MEDIA_ROOTS'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.jpe', '.tif', '.tiff', '.png', '.webp', '.dng', '.heic'}
+DEFAULT_WORKERS = 4
+# Antal indexerade filer per skrivtransaktion
+WRITE_BATCH_SIZE = 200
+DEFAULT_SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 1000
+
+
+def is_image(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def walk_images(root: str, cancel: Optional[threading.Event] = None):
+    """(sökväg, stat) för alla bildfiler under root; stat kommer från katalogposten där det går."""
+    stack = [root]
+    while stack and not (cancel is not None and cancel.is_set()):
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.'):
+                                stack.append(entry.path)
+                        elif entry.is_file() and is_image(entry.name):
+                            yield os.path.abspath(entry.path), entry.stat()
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Media scan: cannot read {directory}: {e}")
+
+
+def fts_phrase(text: str) -> str:
+    """Sökterm som FTS5-fras (citattecken dubblas)."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def parse_bbox(value: str) -> tuple:
+    """'min_lon,min_lat,max_lon,max_lat' (GeoJSON-ordning) -> tuple; ValueError vid fel."""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must be min_lon,min_lat,max_lon,max_lat')
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError('bbox min values must be <= max values')
+    return min_lon, min_lat, max_lon, max_lat
+
+
+class MediaIndex:
+    """Metadataindex över bildfiler, byggt med ExifManager.read_exif."""
+
+    def __init__(self, exif_manager, db_path: str = DEFAULT_INDEX_PATH, workers: int = DEFAULT_WORKERS):
+        self.exif_manager = exif_manager
+        self.db_path = db_path
+        self.workers = max(1, int(workers))
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.pool = get_pool(db_path)
+        # Långlivad pool: arbetartrådarnas anslutningar (t.ex. EXIF-cachen) återanvänds mellan genomsökningar
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='media-index')
+        self._scan_lock = threading.Lock()
+        self._scan_thread: Optional[threading.Thread] = None
+        self._cancel = threading.Event()
+        self.status: Dict = {'state': 'idle'}
+        with self.pool.transaction() as conn:
+            self._ensure_schema(conn)
+        for root in filter(None, os.environ.get(MEDIA_ROOTS_ENV, '').split(os.pathsep)):
+            self.add_root(root)
+
+    def _ensure_schema(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS media_roots (
+                path TEXT PRIMARY KEY,
+                added_at REAL NOT NULL,
+                last_scan_at REAL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS media_files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                root TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                indexed_at REAL NOT NULL,
+                date_taken TEXT,
+                title TEXT,
+                description TEXT,
+                photographer TEXT,
+                latitude REAL,
+                longitude REAL,
+                error TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_media_files_root ON media_files(root)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_media_files_date ON media_files(date_taken)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_media_files_geo ON media_files(latitude, longitude)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS media_keywords (
+                file_id INTEGER NOT NULL REFERENCES media_files(id),
+                keyword TEXT NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_media_keywords_file ON media_keywords(file_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_media_keywords_keyword ON media_keywords(keyword)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS media_faces (
+                file_id INTEGER NOT NULL REFERENCES media_files(id),
+                name TEXT NOT NULL,
+                x REAL, y REAL, width REAL, height REAL,
+                source TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_media_faces_file ON media_faces(file_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_media_faces_name ON media_faces(name)')
+        # unicode61 utan diakritborttagning: å/ä/ö är egna bokstäver i svenska
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5(
+                keywords, persons, text, tokenize='unicode61 remove_diacritics 0'
+            )
+        ''')
+
+    # --- Rötter ---
+
+    def add_root(self, path: str) -> str:
+        path = os.path.abspath(path)
+        with self.pool.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO media_roots (path, added_at) VALUES (?, ?)', (path, time.time()))
+        return path
+
+    def remove_root(self, path: str) -> int:
+        """Tar bort roten och dess filer ur indexet; returnerar antal borttagna filer."""
+        path = os.path.abspath(path)
+        with self.pool.transaction() as conn:
+            ids = [row[0] for row in conn.execute('SELECT id FROM media_files WHERE root = ?', (path,)).fetchall()]
+            self._delete_ids(conn, ids)
+            conn.execute('DELETE FROM media_roots WHERE path = ?', (path,))
+        return len(ids)
+
+    def roots(self) -> List[Dict]:
+        rows = self.pool.connection().execute('''
+            SELECT r.path, r.added_at, r.last_scan_at, COUNT(f.id) AS files
+            FROM media_roots r LEFT JOIN media_files f ON f.root = r.path
+            GROUP BY r.path ORDER BY r.path
+        ''').fetchall()
+        return [dict(row) for row in rows]
+
+    def root_for(self, path: str, roots: Optional[List[str]] = None) -> Optional[str]:
+        """Den indexerade rot som path ligger under, eller None."""
+        path = os.path.abspath(path)
+        if roots is None:
+            roots = [row[0] for row in self.pool.connection().execute('SELECT path FROM media_roots').fetchall()]
+        for root in roots:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    # --- Genomsökning ---
+
+    def start_scan(self, roots: Optional[List[str]] = None) -> Dict:
+        """Startar en bakgrundsgenomsökning (om ingen redan pågår); returnerar status."""
+        with self._scan_lock:
+            if self._scan_thread is not None and self._scan_thread.is_alive():
+                return dict(self.status)
+            self._cancel.clear()
+            self.status = self._new_status()
+            self._scan_thread = threading.Thread(target=self._scan_worker, args=(roots,), name='media-index-scan',
+                                                 daemon=True)
+            self._scan_thread.start()
+            return dict(self.status)
+
+    @staticmethod
+    def _new_status() -> Dict:
+        return {'state': 'scanning', 'started_at': time.time(), 'seen': 0, 'indexed': 0,
+                'removed': 0, 'errors': 0, 'unchanged': 0}
+
+    def cancel_scan(self):
+        self._cancel.set()
+
+    def scan_status(self) -> Dict:
+        return dict(self.status)
+
+    def _scan_worker(self, roots):
+        try:
+            self.scan(roots)
+            self.status['state'] = 'cancelled' if self._cancel.is_set() else 'done'
+        except Exception as e:
+            print(f"Media scan failed: {e}")
+            self.status.update(state='failed', error=str(e))
+        finally:
+            self.status['finished_at'] = time.time()
+            self.pool.release()
+
+    def scan(self, roots: Optional[List[str]] = None) -> Dict:
+        """Inkrementell genomsökning av rötterna (alla om roots är None) i anropande tråd."""
+        in_background = threading.current_thread() is self._scan_thread
+        if not in_background:
+            self._cancel.clear()
+            self.status = self._new_status()
+        if roots is None:
+            roots = [row['path'] for row in self.roots()]
+        else:
+            roots = [self.add_root(root) for root in roots]
+        for root in roots:
+            if self._cancel.is_set():
+                break
+            self._scan_root(root)
+        if not in_background:
+            self.status.update(state='done', finished_at=time.time())
+        return dict(self.status)
+
+    def _scan_root(self, root: str):
+        conn = self.pool.connection()
+        known = {row['path']: (row['size'], row['mtime_ns'])
+                 for row in conn.execute('SELECT path, size, mtime_ns FROM media_files WHERE root = ?', (root,))}
+        seen = set()
+        changed = []
+        for path, st in walk_images(root, self._cancel):
+            seen.add(path)
+            self.status['seen'] = self.status.get('seen', 0) + 1
+            if known.get(path) == (st.st_size, st.st_mtime_ns):
+                self.status['unchanged'] = self.status.get('unchanged', 0) + 1
+                continue
+            changed.append(path)
+        self._index([(path, root) for path in changed], scanning=True)
+        if not self._cancel.is_set():
+            # Filer som inte längre finns (bara efter en fullständig genomgång)
+            removed = self.remove_files([path for path in known if path not in seen])
+            self.status['removed'] = self.status.get('removed', 0) + removed
+            with self.pool.transaction() as conn:
+                conn.execute('UPDATE media_roots SET last_scan_at = ? WHERE path = ?', (time.time(), root))
+
+    def index_files(self, paths: Iterable[str], root: Optional[str] = None) -> int:
+        """
+        Läser metadata för paths parallellt och skriver in dem i indexet.
+        Filer utanför de indexerade rötterna hoppas över (om root inte anges).
+        """
+        if root is None:
+            roots = [row['path'] for row in self.roots()]
+            jobs = [(path, self.root_for(path, roots)) for path in map(os.path.abspath, paths)]
+            jobs = [(path, path_root) for path, path_root in jobs if path_root]
+        else:
+            jobs = [(os.path.abspath(path), root) for path in paths]
+        return self._index(jobs)
+
+    def _index(self, jobs: List[tuple], scanning: bool = False) -> int:
+        """Läser och skriver (sökväg, rot)-par; bara genomsökningar kan avbrytas och räknas i status."""
+        if not jobs:
+            return 0
+        cancel = self._cancel if scanning else threading.Event()
+        count = 0
+        batch = []
+        for record in self._executor.map(lambda job: self._read(job[0], job[1], cancel), jobs):
+            if cancel.is_set():
+                break
+            if record is None:
+                continue
+            batch.append(record)
+            if len(batch) >= WRITE_BATCH_SIZE:
+                count += self._write(batch, scanning)
+                batch = []
+        if batch:
+            count += self._write(batch, scanning)
+        return count
+
+    def _read(self, path: str, root: str, cancel: threading.Event) -> Optional[Dict]:
+        if cancel.is_set():
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        try:
+            exif = self.exif_manager.read_exif(path)
+        except Exception as e:
+            exif = {'error': str(e)}
+        return {'path': path, 'root': root, 'st': st, 'exif': exif}
+
+    def _write(self, records: List[Dict], scanning: bool) -> int:
+        with self.pool.transaction() as conn:
+            for record in records:
+                self._write_one(conn, record)
+        if not scanning:
+            return len(records)
+        self.status['indexed'] = self.status.get('indexed', 0) + len(records)
+        self.status['errors'] = self.status.get('errors', 0) + sum(1 for r in records if r['exif'].get('error'))
+        return len(records)
+
+    def _write_one(self, conn, record: Dict):
+        exif = record['exif']
+        st = record['st']
+        metadata = exif.get('metadata') or {}
+        gps = exif.get('gps') or {}
+        keywords = [k for k in exif.get('keywords') or [] if k]
+        faces = [f for f in exif.get('face_tags') or [] if f.get('name')]
+        row = conn.execute('SELECT id FROM media_files WHERE path = ?', (record['path'],)).fetchone()
+        values = (record['root'], st.st_size, st.st_mtime_ns, time.time(), metadata.get('date_taken'),
+                  metadata.get('title'), metadata.get('description'), metadata.get('photographer'),
+                  gps.get('latitude'), gps.get('longitude'), exif.get('error'))
+        if row:
+            file_id = row[0]
+            conn.execute('''
+                UPDATE media_files SET root = ?, size = ?, mtime_ns = ?, indexed_at = ?, date_taken = ?, title = ?,
+                    description = ?, photographer = ?, latitude = ?, longitude = ?, error = ?
+                WHERE id = ?
+            ''', values + (file_id,))
+            conn.execute('DELETE FROM media_keywords WHERE file_id = ?', (file_id,))
+            conn.execute('DELETE FROM media_faces WHERE file_id = ?', (file_id,))
+            conn.execute('DELETE FROM media_fts WHERE rowid = ?', (file_id,))
+        else:
+            file_id = conn.execute('''
+                INSERT INTO media_files (path, root, size, mtime_ns, indexed_at, date_taken, title, description,
+                    photographer, latitude, longitude, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (record['path'],) + values).lastrowid
+        conn.executemany('INSERT INTO media_keywords (file_id, keyword) VALUES (?, ?)',
+                         [(file_id, keyword) for keyword in keywords])
+        conn.executemany('''
+            INSERT INTO media_faces (file_id, name, x, y, width, height, source) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(file_id, f['name'], f.get('x'), f.get('y'), f.get('width'), f.get('height'), f.get('source'))
+              for f in faces])
+        text = ' '.join(filter(None, (metadata.get('title'), metadata.get('description'), metadata.get('photographer'))))
+        conn.execute('INSERT INTO media_fts (rowid, keywords, persons, text) VALUES (?, ?, ?, ?)',
+                     (file_id, '\n'.join(keywords), '\n'.join(f['name'] for f in faces), text))
+
+    def remove_files(self, paths: Iterable[str]) -> int:
+        paths = [os.path.abspath(path) for path in paths]
+        if not paths:
+            return 0
+        with self.pool.transaction() as conn:
+            ids = []
+            for path in paths:
+                row = conn.execute('SELECT id FROM media_files WHERE path = ?', (path,)).fetchone()
+                if row:
+                    ids.append(row[0])
+            self._delete_ids(conn, ids)
+        return len(ids)
+
+    def indexed_paths_under(self, directory: str) -> List[str]:
+        """Indexerade filer under directory (t.ex. när en hel mapp tagits bort eller flyttats)."""
+        prefix = os.path.abspath(directory).rstrip(os.sep) + os.sep
+        # substr i stället för LIKE: sökvägar kan innehålla % och _
+        rows = self.pool.connection().execute(
+            'SELECT path FROM media_files WHERE substr(path, 1, ?) = ?', (len(prefix), prefix)).fetchall()
+        return [row[0] for row in rows]
+
+    def _delete_ids(self, conn, ids: List[int]):
+        params = [(file_id,) for file_id in ids]
+        conn.executemany('DELETE FROM media_keywords WHERE file_id = ?', params)
+        conn.executemany('DELETE FROM media_faces WHERE file_id = ?', params)
+        conn.executemany('DELETE FROM media_fts WHERE rowid = ?', params)
+        conn.executemany('DELETE FROM media_files WHERE id = ?', params)
+
+    # --- Sökning ---
+
+    def search(self, keyword: Optional[str] = None, person: Optional[str] = None, bbox: Optional[tuple] = None,
+               q: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+               after: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+        """
+        Söker i indexet. keyword/person matchar ord i nyckelord resp. personnamn (FTS),
+        q i alla textfält, bbox = (min_lon, min_lat, max_lon, max_lat). Alla villkor måste gälla.
+        Returnerar {'items': [...], 'next_cursor': ...}; sorterat på id (keyset-paginering).
+        """
+        limit = max(1, min(int(limit or DEFAULT_SEARCH_LIMIT), MAX_SEARCH_LIMIT))
+        where, params = [], []
+        fts = []
+        if keyword:
+            fts.append(f'keywords : {fts_phrase(keyword)}')
+        if person:
+            fts.append(f'persons : {fts_phrase(person)}')
+        if q:
+            fts.append(fts_phrase(q))
+        if fts:
+            where.append('f.id IN (SELECT rowid FROM media_fts WHERE media_fts MATCH ?)')
+            params.append(' AND '.join(fts))
+        if bbox:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            where.append('f.latitude BETWEEN ? AND ? AND f.longitude BETWEEN ? AND ?')
+            params.extend([min_lat, max_lat, min_lon, max_lon])
+        if date_from:
+            where.append('f.date_taken >= ?')
+            params.append(date_from)
+        if date_to:
+            where.append('f.date_taken <= ?')
+            params.append(date_to)
+        cursor = decode_cursor(after)
+        if cursor:
+            where.append('f.id > ?')
+            params.append(int(cursor[0]))
+        sql = 'SELECT f.* FROM media_files f'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY f.id LIMIT ?'
+        params.append(limit + 1)
+        conn = self.pool.connection()
+        rows = conn.execute(sql, params).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        self._attach_details(conn, items)
+        next_cursor = encode_cursor([items[-1]['id']]) if len(rows) > limit else None
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def _attach_details(self, conn, items: List[Dict]):
+        if not items:
+            return
+        by_id = {item['id']: item for item in items}
+        for item in items:
+            item['keywords'] = []
+            item['faces'] = []
+        marks = ','.join('?' * len(by_id))
+        ids = list(by_id)
+        for row in conn.execute(f'SELECT file_id, keyword FROM media_keywords WHERE file_id IN ({marks})', ids):
+            by_id[row['file_id']]['keywords'].append(row['keyword'])
+        for row in conn.execute(
+            f'SELECT file_id, name, x, y, width, height, source FROM media_faces WHERE file_id IN ({marks})', ids
+        ):
+            face = dict(row)
+            by_id[face.pop('file_id')]['faces'].append(face)
+
+    def stats(self) -> Dict:
+        conn = self.pool.connection()
+        return {
+            'db_path': self.db_path,
+            'files': conn.execute('SELECT COUNT(*) FROM media_files').fetchone()[0],
+            'with_errors': conn.execute('SELECT COUNT(*) FROM media_files WHERE error IS NOT NULL').fetchone()[0],
+            'keywords': conn.execute('SELECT COUNT(DISTINCT keyword) FROM media_keywords').fetchone()[0],
+            'people': conn.execute('SELECT COUNT(DISTINCT name) FROM media_faces').fetchone()[0],
+            'roots': len(self.roots()),
+            'scan': self.scan_status(),
+        }
@@ -0,0 +1,477 @@
+"""
+Media Watcher - Håller medieindexet aktuellt utan fullständiga omsökningar
+
+Bevakar medieindexets rötter och matar skapade, ändrade, flyttade och
+borttagna bilder till MediaIndex (index_files/remove_files) och
+ExifManager.invalidate_cache.
+
+  - Linux: inotify (via ctypes, ingen extra dependency), en bevakning per mapp
+  - Övriga system, eller om inotify inte går att använda (t.ex. när
+    fs.inotify.max_user_watches tar slut): polling med os.scandir/stat
+
+Händelser samlas per sökväg och behandlas först när filen varit tyst i
+`debounce` sekunder (högst MAX_DELAY efter första händelsen), så att en
+skrivning i många steg (kopiering, exiftool med temporärfil + rename) ger
+en enda omläsning. Vid behandlingen avgör filens aktuella tillstånd vad som
+görs: finns den indexeras den om, annars tas den bort ur indexet.
+Om kernelns händelsekö svämmar över startas en vanlig inkrementell genomsökning.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from media_index import is_image, walk_images
+
+
+DEFAULT_DEBOUNCE = 1.0
+# Längsta väntan för en fil som ändras hela tiden
+MAX_DELAY = 10.0
+DEFAULT_POLL_INTERVAL = 30.0
+# 'auto' (inotify om möjligt), 'inotify' eller 'poll'; tomt/0 = startas inte automatiskt
+MEDIA_WATCH_ENV = 'MEDIA_WATCH'
+
+# inotify (linux/inotify.h)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+# Hur ofta bevakningstrådar kontrollerar om de ska avslutas
+STOP_CHECK_INTERVAL = 0.5
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def inotify_available() -> bool:
+    return _load_libc() is not None
+
+
+def _watch_dirs(root: str):
+    """root och alla undermappar (punktmappar hoppas över, som vid genomsökningen)."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        yield directory
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                            stack.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+class InotifyBackend:
+    """En inotify-bevakning per mapp under rötterna; nya mappar bevakas när de dyker upp."""
+
+    name = 'inotify'
+
+    def __init__(self, watcher: 'MediaWatcher'):
+        self.watcher = watcher
+        self.libc = _load_libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._lock = threading.Lock()
+        self.roots: Set[str] = set()
+        self._paths: Dict[int, str] = {}
+        self._wds: Dict[str, int] = {}
+
+    def watch_count(self) -> int:
+        return len(self._wds)
+
+    def add_root(self, root: str):
+        """Bevakar root rekursivt; OSError om bevakningen inte går att sätta upp (t.ex. ENOSPC)."""
+        with self._lock:
+            self.roots.add(root)
+        self._add_tree(root, strict=True)
+
+    def remove_root(self, root: str):
+        with self._lock:
+            self.roots.discard(root)
+        self._remove_tree(root)
+
+    def _add_watch(self, directory: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), directory)
+        with self._lock:
+            # Samma inod (t.ex. flyttad mapp) ger samma wd; sökvägen uppdateras
+            old = self._paths.get(wd)
+            if old is not None and self._wds.get(old) == wd:
+                del self._wds[old]
+            self._paths[wd] = directory
+            self._wds[directory] = wd
+
+    def _add_tree(self, directory: str, strict: bool = False):
+        for path in _watch_dirs(directory):
+            try:
+                self._add_watch(path)
+            except OSError as e:
+                if strict and e.errno == errno.ENOSPC:
+                    self._remove_tree(directory)
+                    raise
+                if e.errno != errno.ENOENT:
+                    self.watcher._error(f"cannot watch {path}: {e}")
+
+    def _remove_tree(self, directory: str):
+        prefix = directory.rstrip(os.sep) + os.sep
+        with self._lock:
+            wds = [(path, wd) for path, wd in self._wds.items() if path == directory or path.startswith(prefix)]
+            for path, wd in wds:
+                del self._wds[path]
+                self._paths.pop(wd, None)
+        for _, wd in wds:
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def run(self, stop: threading.Event):
+        try:
+            while not stop.is_set():
+                ready, _, _ = select.select([self.fd], [], [], STOP_CHECK_INTERVAL)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(self.fd, READ_SIZE)
+                except BlockingIOError:
+                    continue
+                self._dispatch(data)
+        finally:
+            os.close(self.fd)
+
+    def _dispatch(self, data: bytes):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.watcher._overflow()
+                continue
+            with self._lock:
+                directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                with self._lock:
+                    if self._paths.get(wd) == directory:
+                        del self._paths[wd]
+                        self._wds.pop(directory, None)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Bevakad mapp (t.ex. en rot) försvann; undermappar rapporteras via föräldern
+                if directory in self.roots:
+                    self.watcher._dir_event(directory)
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if name.startswith('.'):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+                elif mask & IN_MOVED_FROM:
+                    self._remove_tree(path)
+                self.watcher._dir_event(path)
+            elif is_image(name):
+                self.watcher._file_event(path)
+
+
+class PollingBackend:
+    """Jämför storlek/mtime för alla bilder under rötterna med jämna mellanrum."""
+
+    name = 'poll'
+
+    def __init__(self, watcher: 'MediaWatcher', interval: float = DEFAULT_POLL_INTERVAL):
+        self.watcher = watcher
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, Dict[str, tuple]] = {}
+
+    @property
+    def roots(self) -> Set[str]:
+        with self._lock:
+            return set(self._snapshots)
+
+    def watch_count(self) -> int:
+        return len(self._snapshots)
+
+    @staticmethod
+    def _snapshot(root: str) -> Dict[str, tuple]:
+        return {path: (st.st_size, st.st_mtime_ns) for path, st in walk_images(root)}
+
+    def add_root(self, root: str):
+        snapshot = self._snapshot(root)
+        with self._lock:
+            self._snapshots[root] = snapshot
+
+    def remove_root(self, root: str):
+        with self._lock:
+            self._snapshots.pop(root, None)
+
+    def run(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            for root in self.roots:
+                if stop.is_set():
+                    return
+                current = self._snapshot(root)
+                with self._lock:
+                    if root not in self._snapshots:
+                        continue
+                    previous = self._snapshots[root]
+                    self._snapshots[root] = current
+                for path, signature in current.items():
+                    if previous.get(path) != signature:
+                        self.watcher._file_event(path)
+                for path in previous.keys() - current.keys():
+                    self.watcher._file_event(path)
+
+
+class MediaWatcher:
+    """Bevakar medieindexets rötter och håller indexet och EXIF-cachen aktuella."""
+
+    def __init__(self, media_index, exif_manager=None, debounce: float = DEFAULT_DEBOUNCE,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.media_index = media_index
+        self.exif_manager = exif_manager if exif_manager is not None else media_index.exif_manager
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # sökväg -> (första, senaste händelse)
+        self._pending_files: Dict[str, tuple] = {}
+        self._pending_dirs: Dict[str, tuple] = {}
+        self.counters = {'events': 0, 'indexed': 0, 'removed': 0, 'overflows': 0, 'errors': 0}
+        self.last_error: Optional[str] = None
+        self.last_flush_at: Optional[float] = None
+
+    # --- Start/stopp ---
+
+    def start(self, backend: str = 'auto') -> Dict:
+        """Startar bevakningen ('auto', 'inotify' eller 'poll'); gör inget om den redan körs."""
+        if self.running:
+            return self.status()
+        self._stop.clear()
+        self.backend = self._create_backend(backend)
+        if self.backend is None:
+            self.backend = PollingBackend(self, self.poll_interval)
+            self._sync_roots()
+        self._threads = [
+            threading.Thread(target=self._run_backend, name=f'media-watch-{self.backend.name}', daemon=True),
+            threading.Thread(target=self._flush_loop, name='media-watch-flush', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self.status()
+
+    def _create_backend(self, backend: str):
+        """inotify-backend med alla rötter bevakade, eller None om polling ska användas."""
+        if backend == 'poll':
+            return None
+        try:
+            inotify = InotifyBackend(self)
+        except OSError:
+            if backend == 'inotify':
+                raise
+            return None
+        self.backend = inotify
+        try:
+            self._sync_roots()
+        except OSError as e:
+            self._error(f"inotify setup failed, falling back to polling: {e}")
+            os.close(inotify.fd)
+            return None
+        return inotify
+
+    def stop(self):
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def sync_roots(self):
+        """Bevakar exakt medieindexets rötter (anropas när rötter lagts till eller tagits bort)."""
+        if not self.running:
+            return
+        try:
+            self._sync_roots()
+        except OSError as e:
+            self._error(f"cannot watch new root: {e}")
+
+    def _sync_roots(self):
+        backend = self.backend
+        wanted = {row['path'] for row in self.media_index.roots()}
+        current = set(backend.roots)
+        for root in current - wanted:
+            backend.remove_root(root)
+        for root in sorted(wanted - current):
+            if os.path.isdir(root):
+                backend.add_root(root)
+
+    def _run_backend(self):
+        try:
+            self.backend.run(self._stop)
+        except Exception as e:
+            self._error(f"watcher stopped: {e}")
+            self._stop.set()
+            with self._wakeup:
+                self._wakeup.notify_all()
+        finally:
+            self.media_index.pool.release()
+
+    # --- Händelser (anropas från backend-tråden) ---
+
+    def _file_event(self, path: str):
+        self._enqueue(self._pending_files, path)
+
+    def _dir_event(self, path: str):
+        self._enqueue(self._pending_dirs, path)
+
+    def _enqueue(self, pending: Dict[str, tuple], path: str):
+        now = time.monotonic()
+        with self._wakeup:
+            first = pending.get(path, (now,))[0]
+            pending[path] = (first, now)
+            self.counters['events'] += 1
+            self._wakeup.notify()
+
+    def _overflow(self):
+        with self._lock:
+            self.counters['overflows'] += 1
+        self._error('inotify event queue overflowed, starting full rescan')
+        self.media_index.start_scan()
+
+    def _error(self, message: str):
+        print(f"Media watcher: {message}")
+        with self._lock:
+            self.counters['errors'] += 1
+            self.last_error = message
+
+    # --- Debounce och behandling ---
+
+    def _due(self, pending: Dict[str, tuple], now: float) -> List[str]:
+        due = [path for path, (first, last) in pending.items()
+               if now - last >= self.debounce or now - first >= MAX_DELAY]
+        for path in due:
+            del pending[path]
+        return due
+
+    def _next_deadline(self) -> Optional[float]:
+        deadlines = [min(last + self.debounce, first + MAX_DELAY)
+                     for pending in (self._pending_files, self._pending_dirs)
+                     for first, last in pending.values()]
+        return min(deadlines) if deadlines else None
+
+    def _flush_loop(self):
+        try:
+            while not self._stop.is_set():
+                with self._wakeup:
+                    deadline = self._next_deadline()
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    if timeout is None or timeout > 0:
+                        self._wakeup.wait(timeout)
+                        continue
+                    now = time.monotonic()
+                    files = self._due(self._pending_files, now)
+                    dirs = self._due(self._pending_dirs, now)
+                try:
+                    self._process(files, dirs)
+                except Exception as e:
+                    self._error(f"update failed: {e}")
+        finally:
+            self.media_index.pool.release()
+
+    def flush(self):
+        """Behandlar alla väntande händelser direkt (utan att vänta ut debounce)."""
+        with self._wakeup:
+            files = list(self._pending_files)
+            dirs = list(self._pending_dirs)
+            self._pending_files.clear()
+            self._pending_dirs.clear()
+        self._process(files, dirs)
+
+    def _process(self, files: List[str], dirs: List[str]):
+        paths = set(files)
+        for directory in dirs:
+            # Ny/inflyttad mapp: dess bilder; borttagen/utflyttad: det som fanns indexerat under den
+            if os.path.isdir(directory):
+                paths.update(path for path, _ in walk_images(directory))
+            paths.update(self.media_index.indexed_paths_under(directory))
+        if not paths:
+            return
+        changed = []
+        removed = []
+        for path in paths:
+            (changed if os.path.isfile(path) else removed).append(path)
+            if self.exif_manager is not None:
+                self.exif_manager.invalidate_cache(path)
+        indexed = self.media_index.index_files(changed)
+        deleted = self.media_index.remove_files(removed)
+        with self._lock:
+            self.counters['indexed'] += indexed
+            self.counters['removed'] += deleted
+            self.last_flush_at = time.time()
+
+    def status(self) -> Dict:
+        with self._lock:
+            backend = self.backend
+            return {
+                'running': self.running,
+                'backend': backend.name if backend else None,
+                'roots': sorted(backend.roots) if backend else [],
+                'watches': backend.watch_count() if backend else 0,
+                'pending': len(self._pending_files) + len(self._pending_dirs),
+                'debounce': self.debounce,
+                'poll_interval': self.poll_interval if isinstance(backend, PollingBackend) else None,
+                'last_flush_at': self.last_flush_at,
+                'last_error': self.last_error,
+                **self.counters,
+            }
@@ -0,0 +1,226 @@
+"""
+Metadata Segments - Läs och återinsätt en bilds metadatasegment
+
+Används för metadata-backuper: i stället för att kopiera hela bilden sparas
+bara de delar som EXIF-skrivningarna ändrar, och vid ångra sätts de tillbaka
+medan bilddatan lämnas orörd.
+
+  - JPEG: APP1 (Exif, XMP, utökad XMP) och APP13 (Photoshop/IPTC) före SOS
+  - PNG:  eXIf samt tEXt/zTXt/iTXt med XMP ("XML:com.adobe.xmp") eller
+          "Raw profile type ..." (exif/iptc/xmp enligt ImageMagick/exiftool)
+
+Segmenten lagras byte för byte (inklusive markör/längd resp. CRC), så att
+återställningen blir exakt. Andra format (t.ex. TIFF, där metadata ligger i
+IFD:erna tillsammans med bilddatan) stöds inte; där används hel backup.
+"""
+
+import base64
+import json
+import os
+import shutil
+import struct
+import uuid
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+
+SIDECAR_VERSION = 1
+# APP1 (Exif, XMP, utökad XMP) och APP13 (Photoshop/IPTC)
+JPEG_METADATA_MARKERS = {0xE1, 0xED}
+PNG_TEXT_CHUNKS = {b'tEXt', b'zTXt', b'iTXt'}
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def detect_format(path: str) -> Optional[str]:
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(b'\xff\xd8'):
+        return 'jpeg'
+    if head == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    return None
+
+
+def supports_metadata_backup(path: str) -> bool:
+    try:
+        return detect_format(path) is not None
+    except OSError:
+        return False
+
+
+# --- JPEG ---
+
+def _jpeg_header_segments(f: BinaryIO) -> Tuple[List[Tuple[int, bytes]], int]:
+    """
+    Segmenten före SOS som (markör, råa bytes) samt filpositionen där SOS börjar.
+    Markörer utan längdfält (TEM/RSTn) sparas som bara markören.
+    """
+    f.seek(0)
+    if f.read(2) != b'\xff\xd8':
+        raise ValueError('Not a JPEG file')
+    segments = []
+    while True:
+        start = f.tell()
+        prefix = f.read(1)
+        if not prefix:
+            raise ValueError('Unexpected end of JPEG header')
+        if prefix != b'\xff':
+            raise ValueError('Invalid JPEG marker')
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            raise ValueError('Unexpected end of JPEG header')
+        code = marker[0]
+        if code in (0xDA, 0xD9):
+            return segments, start
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            segments.append((code, b'\xff' + marker))
+            continue
+        length_bytes = f.read(2)
+        length = struct.unpack('>H', length_bytes)[0]
+        body = f.read(length - 2)
+        if len(body) != length - 2:
+            raise ValueError('Truncated JPEG segment')
+        segments.append((code, b'\xff' + marker + length_bytes + body))
+
+
+def _jpeg_extract(path: str) -> List[bytes]:
+    with open(path, 'rb') as f:
+        segments, _ = _jpeg_header_segments(f)
+    return [raw for code, raw in segments if code in JPEG_METADATA_MARKERS]
+
+
+def _jpeg_apply(path: str, saved: List[bytes], tmp: str):
+    with open(path, 'rb') as src:
+        segments, scan_start = _jpeg_header_segments(src)
+        with open(tmp, 'wb') as dst:
+            dst.write(b'\xff\xd8')
+            # JFIF/JFXX (APP0) ska ligga först; metadata sätts in direkt efter
+            index = 0
+            while index < len(segments) and segments[index][0] == 0xE0:
+                dst.write(segments[index][1])
+                index += 1
+            for raw in saved:
+                dst.write(raw)
+            for code, raw in segments[index:]:
+                if code not in JPEG_METADATA_MARKERS:
+                    dst.write(raw)
+            src.seek(scan_start)
+            shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+
+
+# --- PNG ---
+
+def _png_is_metadata(chunk_type: bytes, data: bytes) -> bool:
+    if chunk_type == b'eXIf':
+        return True
+    if chunk_type in PNG_TEXT_CHUNKS:
+        keyword = data.split(b'\x00', 1)[0]
+        return keyword == b'XML:com.adobe.xmp' or keyword.startswith(b'Raw profile type')
+    return False
+
+
+def _png_chunks(f: BinaryIO):
+    """(typ, råa bytes eller None för stora icke-metadata-chunkar, position, längd) per chunk."""
+    f.seek(0)
+    if f.read(8) != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('Not a PNG file')
+    while True:
+        position = f.tell()
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type in PNG_TEXT_CHUNKS or chunk_type == b'eXIf':
+            data = f.read(length)
+            crc = f.read(4)
+            yield chunk_type, header + data + crc, _png_is_metadata(chunk_type, data), position, length
+        else:
+            f.seek(length + 4, 1)
+            yield chunk_type, None, False, position, length
+        if chunk_type == b'IEND':
+            return
+
+
+def _png_extract(path: str) -> List[bytes]:
+    with open(path, 'rb') as f:
+        return [raw for _, raw, is_meta, _, _ in _png_chunks(f) if is_meta]
+
+
+def _png_apply(path: str, saved: List[bytes], tmp: str):
+    with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+        dst.write(b'\x89PNG\r\n\x1a\n')
+        inserted = False
+        chunks = list(_png_chunks(src))
+        for chunk_type, raw, is_meta, position, length in chunks:
+            if is_meta:
+                continue
+            # eXIf måste ligga före bilddatan; all sparad metadata sätts in före första IDAT
+            if not inserted and chunk_type in (b'IDAT', b'IEND'):
+                for saved_raw in saved:
+                    dst.write(saved_raw)
+                inserted = True
+            if raw is not None:
+                dst.write(raw)
+            else:
+                src.seek(position)
+                remaining = length + 12
+                while remaining:
+                    block = src.read(min(COPY_BUFFER_SIZE, remaining))
+                    if not block:
+                        raise ValueError('Truncated PNG chunk')
+                    dst.write(block)
+                    remaining -= len(block)
+
+
+_HANDLERS = {
+    'jpeg': (_jpeg_extract, _jpeg_apply),
+    'png': (_png_extract, _png_apply),
+}
+
+
+def extract_metadata(path: str) -> Optional[Dict]:
+    """Bildens metadatasegment ({'format', 'segments'}), eller None för format som inte stöds."""
+    fmt = detect_format(path)
+    if fmt is None:
+        return None
+    extract, _ = _HANDLERS[fmt]
+    return {'format': fmt, 'segments': extract(path)}
+
+
+def apply_metadata(path: str, snapshot: Dict):
+    """
+    Ersätter bildens metadatasegment med dem i snapshot. Skrivs till en
+    temporär fil som sedan ersätter bilden, så att den aldrig blir halvskriven.
+    """
+    fmt = detect_format(path)
+    if fmt != snapshot['format']:
+        raise ValueError(f"Image format {fmt} does not match backup format {snapshot['format']}")
+    _, apply = _HANDLERS[fmt]
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        apply(path, snapshot['segments'], tmp)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def dump_sidecar(snapshot: Dict) -> bytes:
+    """Kompakt sidofil (JSON, segmenten base64-kodade)."""
+    return json.dumps({
+        'version': SIDECAR_VERSION,
+        'format': snapshot['format'],
+        'segments': [base64.b64encode(raw).decode('ascii') for raw in snapshot['segments']],
+    }, separators=(',', ':')).encode('utf-8')
+
+
+def load_sidecar(data: bytes) -> Dict:
+    payload = json.loads(data.decode('utf-8'))
+    if payload.get('version') != SIDECAR_VERSION:
+        raise ValueError(f"Unsupported metadata backup version {payload.get('version')}")
+    return {
+        'format': payload['format'],
+        'segments': [base64.b64decode(raw) for raw in payload['segments']],
+    }
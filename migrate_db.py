@@ -1,6 +1,9 @@
 import json
 import sqlite3
 
+from database_manager import ensure_events_table
+from name_normalize import ensure_normalized_columns
+
 # Läs in JSON-data
 with open('data.json', 'r', encoding='utf-8') as f:
     individuals = json.load(f)
@@ -21,6 +24,8 @@ CREATE TABLE IF NOT EXISTS individuals (
 c.execute('CREATE INDEX IF NOT EXISTS idx_name ON individuals(name)')
 c.execute('CREATE INDEX IF NOT EXISTS idx_father_id ON individuals(father_id)')
 c.execute('CREATE INDEX IF NOT EXISTS idx_mother_id ON individuals(mother_id)')
+# Händelsetabell (person_id, event_id, type, date, place_id); fylls i av triggers vid varje insert
+ensure_events_table(conn)
 
 # Lägg in poster
 for person in individuals:
@@ -35,6 +40,8 @@ for person in individuals:
         person.get('mother_id'),
         json.dumps(person, ensure_ascii=False)
     ))
+# Normaliserade namnnycklar (name_norm) för sökningen fylls i direkt, inte vid första sökningen
+ensure_normalized_columns(conn, 'individuals', ('name',))
 conn.commit()
 conn.close()
 print('Migration klar: data.json → genealogy.db')
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+Name Normalize - Normaliserade söknycklar för svenska orts- och personnamn
+
+normalize_name() ger en nyckel som är:
+  - casefoldad och Unicode-normaliserad (NFKD, diakritiska tecken borttagna: å/ä -> a, ö -> o, é -> e)
+  - fri från gamla stavningsvarianter (w -> v, qv -> kv, ph -> f, dubbelteckning ff -> f, ss -> s)
+  - fri från skiljetecken och extra mellanslag
+
+Nycklarna sparas i egna kolumner (<kolumn>_norm) med index, så att sökningar
+blir indexerade likhets- eller prefixsökningar utan funktionsanrop per rad.
+Triggers nollställer nyckeln (NULL) när källkolumnen ändras, och
+refresh_normalized_columns() fyller i alla NULL-nycklar igen.
+
+normalize_place_name() är nyckeln för ortnamn: som normalize_name() men utan
+länsbokstäverna som Lantmäteriet sätter efter namnet ("Ekby (R)" -> "ekby").
+"""
+
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+# Gamla stavningar -> modern form (körs efter casefold och borttagna diakriter)
+_SPELLING_RULES = (
+    ('qv', 'kv'),
+    ('w', 'v'),
+    ('ph', 'f'),
+)
+_SPECIAL_LETTERS = str.maketrans({'æ': 'a', 'ø': 'o', 'đ': 'd', 'ł': 'l', 'þ': 'th'})
+_NON_WORD = re.compile(r'[^\w\s]+')
+_DOUBLE_LETTERS = re.compile(r'([^\W\d_])\1+')
+# Länsbokstav efter ortnamn: "Ekby (R)", "Skånela (AB)"
+_COUNTY_QUALIFIER = re.compile(r'\s*\([A-Z]{1,2}\)\s*$')
+
+
+def normalize_name(value) -> str:
+    """Returnerar sökbar nyckel för ett namn ('' för tomt värde)."""
+    if value is None:
+        return ''
+    text = str(value).casefold()
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.translate(_SPECIAL_LETTERS)
+    for old, new in _SPELLING_RULES:
+        text = text.replace(old, new)
+    text = _NON_WORD.sub(' ', text)
+    text = _DOUBLE_LETTERS.sub(r'\1', text)
+    return ' '.join(text.split())
+
+
+def normalize_place_name(value) -> str:
+    """Som normalize_name(), men en avslutande länsbokstav ("(R)", "(AB)") ingår inte i nyckeln."""
+    if value is None:
+        return ''
+    return normalize_name(_COUNTY_QUALIFIER.sub('', str(value)))
+
+
+def prefix_range(key: str) -> Tuple[str, str]:
+    """Gränser för indexerad prefixsökning: key_norm >= low AND key_norm < high."""
+    return key, key + '\U0010ffff'
+
+
+def _norm_column(column: str) -> str:
+    return f'{column}_norm'
+
+
+def public_row(row) -> Dict:
+    """Raden som dict utan de interna <kolumn>_norm-nycklarna (för API-svar)."""
+    return {key: value for key, value in dict(row).items() if not key.endswith('_norm')}
+
+
+def ensure_normalized_columns(conn, table: str, columns: Iterable[str],
+                              normalizers: Optional[Dict[str, Callable]] = None) -> int:
+    """
+    Lägger till <kolumn>_norm, index och invaliderings-triggers för tabellen
+    (om de saknas) och fyller i saknade nycklar. normalizers anger nyckelfunktion
+    per kolumn (standard normalize_name). Returnerar antal uppdaterade rader.
+    """
+    columns = tuple(columns)
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()}
+    if not existing:
+        return 0
+    for column in columns:
+        norm = _norm_column(column)
+        if norm not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {norm} TEXT')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{norm} ON {table}({norm})')
+        # Skrivningar som inte går via managers (skript, Electron) markerar nyckeln som inaktuell
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_{norm}_au AFTER UPDATE OF {column} ON {table} BEGIN
+                UPDATE {table} SET {norm} = NULL WHERE rowid = new.rowid;
+            END
+        ''')
+    return refresh_normalized_columns(conn, table, columns, normalizers)
+
+
+def refresh_normalized_columns(conn, table: str, columns: Iterable[str],
+                               normalizers: Optional[Dict[str, Callable]] = None) -> int:
+    """Beräknar nycklar för rader där någon <kolumn>_norm är NULL (indexerad sökning)."""
+    columns = tuple(columns)
+    norms = [_norm_column(column) for column in columns]
+    functions = [(normalizers or {}).get(column, normalize_name) for column in columns]
+    where = ' OR '.join(f'{norm} IS NULL' for norm in norms)
+    rows = conn.execute(f'SELECT rowid, {", ".join(columns)} FROM {table} WHERE {where}').fetchall()
+    if not rows:
+        return 0
+    assignments = ', '.join(f'{norm} = ?' for norm in norms)
+    conn.executemany(
+        f'UPDATE {table} SET {assignments} WHERE rowid = ?',
+        [tuple(function(value) for function, value in zip(functions, row[1:])) + (row[0],) for row in rows]
+    )
+    return len(rows)
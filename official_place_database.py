@@ -1,25 +1,275 @@
 
-import sqlite3
+import base64
+import json
+
+from sqlite_pool import get_pool
+from json_stream import iter_cursor
+from name_normalize import (
+    ensure_normalized_columns, normalize_place_name, prefix_range, public_row, refresh_normalized_columns
+)
+
+
+# FTS5-index över namnkolumnerna i official_places (external content, hålls i synk med triggers)
+SEARCH_INDEX_TABLE = 'official_places_fts'
+SEARCH_INDEX_COLUMNS = ('ortnamn', 'sockenstadnamn', 'kommunnamn', 'lansnamn')
+# bm25-vikter per kolumn: träff på ortnamn väger tyngst, län lättast
+SEARCH_INDEX_WEIGHTS = '10.0, 5.0, 2.0, 1.0'
+# Kolumner med normaliserade söknycklar (<kolumn>_norm, se name_normalize)
+NORMALIZED_COLUMNS = ('ortnamn', 'sockenstadnamn', 'kommunnamn', 'lansnamn')
+# Ortnamn har ofta länsbokstav ("Ekby (R)") som inte ska ingå i match- och söknyckeln
+KEY_NORMALIZERS = {'ortnamn': normalize_place_name, 'sockenstadnamn': normalize_place_name}
+# Prefixsökning i search_places görs i denna ordning
+PREFIX_SEARCH_COLUMNS = ('ortnamn', 'sockenstadnamn', 'kommunnamn')
+
+
+# Visningsnamn för tomma nivåer i registerträdet
+UNKNOWN_REGION = 'Okänt län'
+UNKNOWN_MUNICIPALITY = 'Okänd kommun'
+UNKNOWN_PARISH = 'Okänd församling'
+UNKNOWN_VILLAGE = 'Okänd ort'
+# Nivåer i registerträdet: nivå -> (kodkolumn, namnkolumn); 'ort' är lövnivån
+HIERARCHY_LEVELS = {
+    'lan': ('lanskod', 'lansnamn'),
+    'kommun': ('kommunkod', 'kommunnamn'),
+    'forsamling': ('sockenstadkod', 'sockenstadnamn'),
+}
+HIERARCHY_PARENTS = ('lanskod', 'kommunkod', 'sockenstadkod')
+DEFAULT_PAGE_SIZE = 100
+# Metadata för official_places (data_version räknas upp av triggers vid varje ändring)
+META_TABLE = 'official_places_meta'
+
+
+def tree_place(row):
+    """Rad från official_places med defaultvärden och unika id:n för frontendens trädlogik."""
+    d = public_row(row)
+    d['region'] = d.get('lansnamn') or UNKNOWN_REGION
+    d['municipality'] = d.get('kommunnamn') or UNKNOWN_MUNICIPALITY
+    d['parish'] = d.get('sockenstadnamn') or UNKNOWN_PARISH
+    d['village'] = d.get('ortnamn') or UNKNOWN_VILLAGE
+    # Unika id:n för varje nivå (använd kod eller namn eller id)
+    d['region_id'] = d.get('lanskod') or d['region'] or str(d.get('id'))
+    d['municipality_id'] = d.get('kommunkod') or d['municipality'] or str(d.get('id'))
+    d['parish_id'] = d.get('sockenstadkod') or d['parish'] or str(d.get('id'))
+    d['village_id'] = d.get('id')
+    return d
+
+
+def ensure_version_tracking(conn):
+    """Skapar metatabellen och triggers som räknar upp data_version vid ändringar i official_places."""
+    if not _table_exists(conn, 'official_places'):
+        return False
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {META_TABLE} (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+    conn.execute(f"INSERT OR IGNORE INTO {META_TABLE} (name, value) VALUES ('data_version', 0)")
+    # Uppdateringar av *_norm-nycklar räknas inte som ändringar
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(official_places)').fetchall()
+               if row[1] != 'id' and not row[1].endswith('_norm')]
+    bump = f"UPDATE {META_TABLE} SET value = value + 1 WHERE name = 'data_version';"
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS official_places_version_ai AFTER INSERT ON official_places BEGIN {bump} END')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS official_places_version_ad AFTER DELETE ON official_places BEGIN {bump} END')
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS official_places_version_au AFTER UPDATE OF {', '.join(columns)} ON official_places BEGIN {bump} END")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_official_places_lan_kommun ON official_places(lansnamn, kommunnamn)')
+    return True
+
+
+def bump_data_version(conn):
+    """Räknar upp data_version en gång, t.ex. efter en bulkladdning som gjorts utan versionstriggers."""
+    if ensure_version_tracking(conn):
+        conn.execute(f"UPDATE {META_TABLE} SET value = value + 1 WHERE name = 'data_version'")
+
+
+def ensure_hierarchy_indexes(conn):
+    """Index för lat, sidindelad trädnavigering (Län > Kommun > Församling > Ort)."""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_official_places_hierarchy ON official_places(lanskod, kommunkod, sockenstadkod, ortnamn)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_official_places_kommun_socken ON official_places(kommunkod, sockenstadkod, ortnamn)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_official_places_socken_ort ON official_places(sockenstadkod, ortnamn)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_official_places_ortnamn ON official_places(ortnamn)')
+
+
+def encode_cursor(values):
+    """Opak markör för keyset-paginering (sista radens sorteringsnyckel)."""
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def _table_exists(conn, name):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def ensure_normalized_keys(conn):
+    """
+    ensure_normalized_columns för official_places med KEY_NORMALIZERS. Nycklar som
+    beräknats innan länsbokstaven togs bort ("ekby r" för "Ekby (R)") nollställs
+    och beräknas om. Returnerar antal uppdaterade rader.
+    """
+    updated = ensure_normalized_columns(conn, 'official_places', NORMALIZED_COLUMNS, KEY_NORMALIZERS)
+    stale = set()
+    for column, function in KEY_NORMALIZERS.items():
+        rows = conn.execute(f'''
+            SELECT rowid, {column}, {column}_norm FROM official_places
+            WHERE {column} GLOB '*([A-Z])' OR {column} GLOB '*([A-Z][A-Z])'
+        ''').fetchall()
+        stale.update(row[0] for row in rows if row[2] != function(row[1]))
+    if stale:
+        conn.executemany(
+            f"UPDATE official_places SET {', '.join(f'{c}_norm = NULL' for c in KEY_NORMALIZERS)} WHERE rowid = ?",
+            [(rowid,) for rowid in stale]
+        )
+        updated += refresh_normalized_keys(conn)
+    return updated
+
+
+def refresh_normalized_keys(conn):
+    """refresh_normalized_columns för official_places med KEY_NORMALIZERS."""
+    return refresh_normalized_columns(conn, 'official_places', NORMALIZED_COLUMNS, KEY_NORMALIZERS)
+
+
+def ensure_search_index(conn):
+    """
+    Skapar FTS5-tabellen och synk-triggers om de saknas.
+    Returnerar False om official_places inte finns eller om SQLite saknar FTS5.
+    """
+    if not _table_exists(conn, 'official_places'):
+        return False
+    if _table_exists(conn, SEARCH_INDEX_TABLE):
+        return True
+    cols = ', '.join(SEARCH_INDEX_COLUMNS)
+    new_cols = ', '.join(f'new.{col}' for col in SEARCH_INDEX_COLUMNS)
+    old_cols = ', '.join(f'old.{col}' for col in SEARCH_INDEX_COLUMNS)
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE {SEARCH_INDEX_TABLE} USING fts5(
+                {cols}, content='official_places', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except Exception:
+        # Äldre SQLite utan FTS5/trigram: search_places använder LIKE-fallback
+        return False
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_INDEX_TABLE}_ai AFTER INSERT ON official_places BEGIN
+            INSERT INTO {SEARCH_INDEX_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_INDEX_TABLE}_ad AFTER DELETE ON official_places BEGIN
+            INSERT INTO {SEARCH_INDEX_TABLE}({SEARCH_INDEX_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_INDEX_TABLE}_au AFTER UPDATE OF {cols} ON official_places BEGIN
+            INSERT INTO {SEARCH_INDEX_TABLE}({SEARCH_INDEX_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {SEARCH_INDEX_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    ''')
+    # Befintliga rader indexeras direkt när tabellen skapas
+    rebuild_search_index(conn)
+    return True
+
+
+def rebuild_search_index(conn):
+    """Läser om hela official_places in i FTS5-indexet."""
+    conn.execute(f"INSERT INTO {SEARCH_INDEX_TABLE}({SEARCH_INDEX_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(conn):
+    """Tar bort FTS5-tabellen och triggers (snabbare bulkimport; skapa om med ensure_search_index)."""
+    for suffix in ('_ai', '_ad', '_au'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {SEARCH_INDEX_TABLE}{suffix}')
+    conn.execute(f'DROP TABLE IF EXISTS {SEARCH_INDEX_TABLE}')
 
 
 class OfficialPlaceDatabase:
     def __init__(self, db_path='official_places.db'):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
         self._ensure_table_exists()
+        with self.pool.transaction() as conn:
+            self._ensure_official_places_schema(conn)
 
-    def search_places(self, query):
-        # Sök i tabellen official_places istället för places
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def _ensure_official_places_schema(self, conn):
+        # Sökindex, normaliserade nycklar, versionsräknare och hierarkiindex (om official_places finns)
+        self._has_search_index = ensure_search_index(conn)
+        self._has_normalized_columns = _table_exists(conn, 'official_places')
+        if self._has_normalized_columns:
+            ensure_normalized_keys(conn)
+            ensure_version_tracking(conn)
+            ensure_hierarchy_indexes(conn)
+
+    def search_places(self, query, limit=50):
+        # Sök i tabellen official_places: först indexerad prefixsökning på
+        # normaliserade nycklar, sedan FTS5-indexet (rankat med bm25)
+        conn = self.pool.connection()
         c = conn.cursor()
-        q = f"%{query.strip().lower()}%"
-        c.execute('''
-            SELECT * FROM official_places
-            WHERE LOWER(ortnamn) LIKE ? OR LOWER(sockenstadnamn) LIKE ? OR LOWER(kommunnamn) LIKE ? OR LOWER(lansnamn) LIKE ?
-        ''', (q, q, q, q))
+        q = (query or '').strip()
+        key = normalize_place_name(q)
+        max_rows = limit if limit else -1
+        rows = []
+        seen = set()
+
+        def collect(found):
+            for row in found:
+                if limit and len(rows) >= limit:
+                    break
+                if row['id'] not in seen:
+                    seen.add(row['id'])
+                    rows.append(row)
+
+        if key and self._has_normalized_columns:
+            low, high = prefix_range(key)
+            for column in PREFIX_SEARCH_COLUMNS:
+                if limit and len(rows) >= limit:
+                    break
+                c.execute(f'''
+                    SELECT * FROM official_places
+                    WHERE {column}_norm >= ? AND {column}_norm < ?
+                    ORDER BY {column}_norm
+                    LIMIT ?
+                ''', (low, high, max_rows))
+                collect(c.fetchall())
+        if not limit or len(rows) < limit:
+            if self._has_search_index and len(q) >= 3:
+                # Trigram-tokenizern ger delsträngsmatchning; frasen citeras så att
+                # specialtecken i sökningen inte tolkas som FTS-syntax
+                phrase = '"' + q.replace('"', '""') + '"'
+                c.execute(f'''
+                    SELECT p.* FROM {SEARCH_INDEX_TABLE} f
+                    JOIN official_places p ON p.id = f.rowid
+                    WHERE {SEARCH_INDEX_TABLE} MATCH ?
+                    ORDER BY bm25({SEARCH_INDEX_TABLE}, {SEARCH_INDEX_WEIGHTS})
+                    LIMIT ?
+                ''', (phrase, max_rows))
+                collect(c.fetchall())
+            elif self._has_normalized_columns:
+                # Fallback: korta söksträngar (trigram kräver minst 3 tecken) eller SQLite utan FTS5
+                like = f"%{key}%"
+                c.execute('''
+                    SELECT * FROM official_places
+                    WHERE ortnamn_norm LIKE ? OR sockenstadnamn_norm LIKE ? OR kommunnamn_norm LIKE ? OR lansnamn_norm LIKE ?
+                    LIMIT ?
+                ''', (like, like, like, like, max_rows))
+                collect(c.fetchall())
+            else:
+                like = f"%{q.lower()}%"
+                c.execute('''
+                    SELECT * FROM official_places
+                    WHERE LOWER(ortnamn) LIKE ? OR LOWER(sockenstadnamn) LIKE ? OR LOWER(kommunnamn) LIKE ? OR LOWER(lansnamn) LIKE ?
+                    LIMIT ?
+                ''', (like, like, like, like, max_rows))
+                collect(c.fetchall())
         results = []
-        for row in c.fetchall():
-            place = dict(row)
+        for row in rows:
+            place = public_row(row)
             # Sätt typ baserat på fält
             if place.get('village'):
                 place['type'] = 'Village'
@@ -34,11 +284,26 @@ class OfficialPlaceDatabase:
             else:
                 place['type'] = 'Unknown'
             results.append(place)
-        conn.close()
         return results
 
+    def refresh_normalized_columns(self):
+        """Fyller i normaliserade nycklar för nya/ändrade rader (anropas efter skrivningar)."""
+        if not self._has_normalized_columns:
+            return 0
+        with self.pool.transaction() as conn:
+            return refresh_normalized_keys(conn)
+
+    def rebuild_search_index(self):
+        """Bygger om FTS5-indexet och normaliserade nycklar från official_places (t.ex. efter bulkimport)."""
+        with self.pool.transaction() as conn:
+            existed = _table_exists(conn, SEARCH_INDEX_TABLE)
+            self._ensure_official_places_schema(conn)
+            # En nyskapad tabell har redan indexerats av ensure_search_index
+            if self._has_search_index and existed:
+                rebuild_search_index(conn)
+
     def _ensure_table_exists(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute('''
             CREATE TABLE IF NOT EXISTS places (
@@ -65,10 +330,9 @@ class OfficialPlaceDatabase:
                 conn.commit()
         except Exception:
             pass
-        conn.close()
 
     def get_all_lan(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute('''
             SELECT DISTINCT country, region FROM places
@@ -76,11 +340,10 @@ class OfficialPlaceDatabase:
             ORDER BY country
         ''')
         result = [{'country': row[0], 'region': row[1]} for row in c.fetchall()]
-        conn.close()
         return result
 
     def get_kommuner_for_lan(self, lanskod):
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute('''
             SELECT DISTINCT municipality FROM places
@@ -88,11 +351,10 @@ class OfficialPlaceDatabase:
             ORDER BY municipality
         ''', (lanskod,))
         result = [{'municipality': row[0]} for row in c.fetchall()]
-        conn.close()
         return result
 
     def get_forsamlingar_for_kommun(self, kommunkod):
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute('''
             SELECT DISTINCT parish FROM places
@@ -100,11 +362,10 @@ class OfficialPlaceDatabase:
             ORDER BY parish
         ''', (kommunkod,))
         result = [{'parish': row[0]} for row in c.fetchall()]
-        conn.close()
         return result
 
     def get_orter_for_forsamling(self, sockenstadkod):
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute('''
             SELECT id, name FROM places
@@ -112,9 +373,84 @@ class OfficialPlaceDatabase:
             ORDER BY name
         ''', (sockenstadkod,))
         result = [{'id': row[0], 'name': row[1]} for row in c.fetchall()]
-        conn.close()
         return result
 
+    def get_place_children(self, level, lanskod=None, kommunkod=None, sockenstadkod=None, after=None, limit=None):
+        """
+        En sida barn till en nod i registerträdet, sorterade på namn (keyset-paginering).
+
+        level: 'lan', 'kommun', 'forsamling' eller 'ort'. Angivna föräldrakoder filtrerar.
+        after: markör från föregående sidas next_cursor.
+        Returnerar {'items': [...], 'next_cursor': str|None}; grupper har code/name/count,
+        orter har id/name.
+        """
+        if level != 'ort' and level not in HIERARCHY_LEVELS:
+            raise ValueError(f'Unknown level: {level}')
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), 1000))
+        cursor_values = decode_cursor(after)
+        filters = []
+        params = []
+        for column, value in zip(HIERARCHY_PARENTS, (lanskod, kommunkod, sockenstadkod)):
+            if value is not None:
+                filters.append(f'{column} = ?')
+                params.append(value)
+        conn = self.pool.connection()
+        c = conn.cursor()
+        if level == 'ort':
+            where = filters + ["ortnamn IS NOT NULL AND ortnamn != ''"]
+            if cursor_values:
+                where.append('(ortnamn, id) > (?, ?)')
+                params.extend(cursor_values[:2])
+            c.execute(f"""
+                SELECT id, ortnamn FROM official_places
+                WHERE {' AND '.join(where)}
+                ORDER BY ortnamn, id
+                LIMIT ?
+            """, params + [limit + 1])
+            rows = c.fetchall()
+            items = [{'id': row[0], 'name': row[1], 'ortnamn': row[1]} for row in rows[:limit]]
+            next_cursor = encode_cursor([rows[limit - 1][1], rows[limit - 1][0]]) if len(rows) > limit else None
+            return {'items': items, 'next_cursor': next_cursor}
+
+        code_col, name_col = HIERARCHY_LEVELS[level]
+        where = filters + [f"{code_col} IS NOT NULL AND {code_col} != ''"]
+        name_where = [f'n.{f}' for f in filters] + [f'n.{code_col} = g.code', f"n.{name_col} IS NOT NULL AND n.{name_col} != ''"]
+        # Antal per grupp räknas via hierarkiindexet; namnet hämtas med en indexerad uppslagning per grupp
+        sql = f"""
+            SELECT code, name, count FROM (
+                SELECT g.code AS code, g.count AS count,
+                       COALESCE((SELECT n.{name_col} FROM official_places n WHERE {' AND '.join(name_where)} LIMIT 1), g.code) AS name
+                FROM (
+                    SELECT {code_col} AS code, COUNT(*) AS count FROM official_places
+                    WHERE {' AND '.join(where)}
+                    GROUP BY {code_col}
+                ) g
+            )
+        """
+        all_params = params + params
+        if cursor_values:
+            sql += ' WHERE (name, code) > (?, ?)'
+            all_params.extend(cursor_values[:2])
+        sql += ' ORDER BY name, code LIMIT ?'
+        c.execute(sql, all_params + [limit + 1])
+        rows = c.fetchall()
+        items = [{'code': row[0], 'name': row[1], 'count': row[2], code_col: row[0], name_col: row[1]} for row in rows[:limit]]
+        next_cursor = encode_cursor([rows[limit - 1][1], rows[limit - 1][0]]) if len(rows) > limit else None
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def get_places_page(self, after=None, limit=None):
+        """En sida av official_places sorterad på id (keyset-paginering), i samma format som get_all_places."""
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), 5000))
+        cursor_values = decode_cursor(after)
+        after_id = cursor_values[0] if cursor_values else 0
+        conn = self.pool.connection()
+        c = conn.cursor()
+        c.execute('SELECT * FROM official_places WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit + 1))
+        rows = c.fetchall()
+        items = [tree_place(row) for row in rows[:limit]]
+        next_cursor = encode_cursor([rows[limit - 1]['id']]) if len(rows) > limit else None
+        return {'items': items, 'next_cursor': next_cursor}
+
     def update_official_place(self, place_id, data):
         allowed = [
             'name', 'country', 'region', 'municipality', 'parish', 'village', 'specific', 'coordinates', 'note', 'matched_place_id'
@@ -128,38 +464,57 @@ class OfficialPlaceDatabase:
         if not fields:
             raise Exception('No valid fields to update')
         values.append(place_id)
-        conn = sqlite3.connect(self.db_path)
+        with self.pool.transaction() as conn:
+            conn.execute(f"UPDATE places SET {', '.join(fields)} WHERE id = ?", values)
         c = conn.cursor()
-        c.execute(f"UPDATE places SET {', '.join(fields)} WHERE id = ?", values)
-        conn.commit()
         c.execute('SELECT * FROM places WHERE id = ?', (place_id,))
         row = c.fetchone()
-        conn.close()
         if row:
-            return dict(zip([col[0] for col in c.description], row))
+            return public_row(zip([col[0] for col in c.description], row))
         else:
             raise Exception('Place not found after update')
 
     def get_all_places(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        return list(self.iter_all_places())
+
+    def iter_all_places(self):
+        """Som get_all_places men som generator (fetchmany), för strömmade svar."""
+        conn = self.pool.connection()
         c = conn.cursor()
         # Anpassa SELECT till alla kolumner i official_places
         c.execute('SELECT * FROM official_places')
-        results = []
-        for row in c.fetchall():
-            d = dict(row)
-            # Sätt defaultvärden och unika id:n för frontendens trädlogik
-            d['region'] = d.get('lansnamn') or 'Okänt län'
-            d['municipality'] = d.get('kommunnamn') or 'Okänd kommun'
-            d['parish'] = d.get('sockenstadnamn') or 'Okänd församling'
-            d['village'] = d.get('ortnamn') or 'Okänd ort'
-            # Unika id:n för varje nivå (använd kod eller namn eller id)
-            d['region_id'] = d.get('lanskod') or d['region'] or str(d.get('id'))
-            d['municipality_id'] = d.get('kommunkod') or d['municipality'] or str(d.get('id'))
-            d['parish_id'] = d.get('sockenstadkod') or d['parish'] or str(d.get('id'))
-            d['village_id'] = d.get('id')
-            results.append(d)
-        conn.close()
-        return results
+        yield from iter_cursor(c, convert=tree_place)
+
+    def get_places_in_municipality(self, region, municipality):
+        """
+        Alla platser under en (län, kommun)-nod i registerträdet.
+        region/municipality är trädets visningsnamn, dvs 'Okänt län'/'Okänd kommun' för tomma värden.
+        """
+        where = []
+        params = []
+        for column, value, unknown in (('lansnamn', region, UNKNOWN_REGION), ('kommunnamn', municipality, UNKNOWN_MUNICIPALITY)):
+            if value == unknown:
+                where.append(f"({column} IS NULL OR {column} = '' OR {column} = ?)")
+            else:
+                where.append(f'{column} = ?')
+            params.append(value)
+        conn = self.pool.connection()
+        c = conn.cursor()
+        c.execute(f"SELECT * FROM official_places WHERE {' AND '.join(where)}", params)
+        return [tree_place(row) for row in c.fetchall()]
 
+    def get_official_place(self, place_id):
+        conn = self.pool.connection()
+        c = conn.cursor()
+        c.execute('SELECT * FROM official_places WHERE id = ?', (place_id,))
+        row = c.fetchone()
+        return public_row(row) if row else None
+
+    def get_data_version(self):
+        """Räknare som ökar vid varje ändring i official_places (även från skript)."""
+        conn = self.pool.connection()
+        try:
+            row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE name = 'data_version'").fetchone()
+        except Exception:
+            return 0
+        return row[0] if row else 0
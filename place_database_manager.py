@@ -1,46 +1,45 @@
-import sqlite3
+from sqlite_pool import get_pool
+from json_stream import iter_cursor
+from name_normalize import ensure_normalized_columns, normalize_name, public_row, refresh_normalized_columns
+
+
+# Kolumner med normaliserade söknycklar (<kolumn>_norm, se name_normalize)
+NORMALIZED_COLUMNS = ('name', 'parish', 'village')
 
 
 class PlaceDatabaseManager:
     def __init__(self, db_path='places.db'):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
 
     def delete_place(self, place_id):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('DELETE FROM places WHERE id = ?', (place_id,))
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM places WHERE id = ?', (place_id,))
 
     def create_table(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS places (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                country TEXT,
-                region TEXT,
-                municipality TEXT,
-                parish TEXT,
-                village TEXT,
-                specific TEXT,
-                coordinates TEXT,
-                note TEXT,
-                matched_place_id INTEGER,
-                hidden INTEGER DEFAULT 0
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS places (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    country TEXT,
+                    region TEXT,
+                    municipality TEXT,
+                    parish TEXT,
+                    village TEXT,
+                    specific TEXT,
+                    coordinates TEXT,
+                    note TEXT,
+                    matched_place_id INTEGER,
+                    hidden INTEGER DEFAULT 0
+                )
+            ''')
+            ensure_normalized_columns(conn, 'places', NORMALIZED_COLUMNS)
 
     def hide_place(self, place_id):
         """Mark a place as hidden (used in official_places.db when user overrides a place)."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('UPDATE places SET hidden = 1 WHERE id = ?', (place_id,))
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            conn.execute('UPDATE places SET hidden = 1 WHERE id = ?', (place_id,))
 
     def copy_place_to_user_db(self, place_id, user_db_path):
         """Copy a place from this db to a user db (used when user edits an official place)."""
@@ -61,12 +60,10 @@ class PlaceDatabaseManager:
         user_db = PlaceDatabaseManager(user_db_path)
         user_places = user_db.get_all_places()
         # Get official places (not hidden)
-        conn = sqlite3.connect(official_db_path)
-        conn.row_factory = sqlite3.Row
+        conn = get_pool(official_db_path).connection()
         c = conn.cursor()
         c.execute('SELECT * FROM places WHERE hidden = 0')
-        official_places = [dict(row) for row in c.fetchall()]
-        conn.close()
+        official_places = [public_row(row) for row in c.fetchall()]
         # Merge: user places first, then official places not overridden
         user_place_names = set((p['name'], p.get('country'), p.get('region'), p.get('parish')) for p in user_places)
         merged = list(user_places)
@@ -76,28 +73,26 @@ class PlaceDatabaseManager:
                 merged.append(op)
         return merged
     def update_matched_place_id(self, place_id, matched_place_id):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('UPDATE places SET matched_place_id = ? WHERE id = ?', (matched_place_id, place_id))
-        conn.commit()
-        conn.close()
-    def get_unmatched_places(self, person_event_data=None):
-        import sys
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        # Visa endast platser där matched_place_id är NULL eller tom sträng (inte 'user' eller annan markerad som användarskapad)
-        c.execute("SELECT * FROM places WHERE matched_place_id IS NULL OR matched_place_id = ''")
-        results = [dict(row) for row in c.fetchall()]
-        conn.close()
-        # Om person_event_data ges, lägg till kopplingar
-        if person_event_data:
-            print("[DEBUG] Alla platser (id, namn):", [(p['id'], p.get('name')) for p in results], file=sys.stderr)
-            all_events = []
+        with self.pool.transaction() as conn:
+            conn.execute('UPDATE places SET matched_place_id = ? WHERE id = ?', (matched_place_id, place_id))
+    def get_unmatched_places(self, person_event_data=None, link_lookup=None):
+        return list(self.iter_unmatched_places(person_event_data, link_lookup))
+
+    def iter_unmatched_places(self, person_event_data=None, link_lookup=None, batch_size=500):
+        """
+        Generator över omatchade platser (fetchmany).
+        link_lookup(place_ids) -> {str(place_id): [länkar]} (t.ex. DatabaseManager.get_place_links)
+        hämtar kopplingarna per sida via events-indexet; person_event_data (personer med
+        events) stöds fortfarande men kräver att alla personer gås igenom.
+        """
+        if link_lookup is None and person_event_data is not None:
+            place_id_to_links = {}
             for person in person_event_data:
                 for event in person.get('events', []):
                     pid = event.get('placeId') or event.get('place_id')
-                    all_events.append({
+                    if not pid:
+                        continue
+                    place_id_to_links.setdefault(str(pid), []).append({
                         'personId': person.get('id'),
                         'personName': f"{person.get('firstName','')} {person.get('lastName','')}",
                         'eventId': event.get('id'),
@@ -105,26 +100,49 @@ class PlaceDatabaseManager:
                         'eventDate': event.get('date',''),
                         'placeId': pid
                     })
-            print("[DEBUG] Alla events med placeId:", [ (e['eventId'], e['placeId'], e['personName']) for e in all_events if e['placeId'] ], file=sys.stderr)
-            place_id_to_links = {}
-            for e in all_events:
-                pid = e['placeId']
-                if pid:
-                    if pid not in place_id_to_links:
-                        place_id_to_links[pid] = []
-                    place_id_to_links[pid].append(e)
-            for place in results:
-                place['links'] = place_id_to_links.get(str(place['id']), []) + place_id_to_links.get(int(place['id']), [])
-                place['linkCount'] = len(place['links'])
-        return results
+            link_lookup = lambda place_ids: place_id_to_links
+        conn = self.pool.connection()
+        c = conn.cursor()
+        # Visa endast platser där matched_place_id är NULL eller tom sträng (inte 'user' eller annan markerad som användarskapad)
+        c.execute("SELECT * FROM places WHERE matched_place_id IS NULL OR matched_place_id = ''")
+        while True:
+            rows = c.fetchmany(batch_size)
+            if not rows:
+                return
+            places = [public_row(row) for row in rows]
+            links = link_lookup([place['id'] for place in places]) if link_lookup else None
+            for place in places:
+                if links is not None:
+                    place['links'] = links.get(str(place['id']), [])
+                    place['linkCount'] = len(place['links'])
+                yield place
 
     def add_place(self, place):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO places (name, country, region, municipality, parish, village, specific, coordinates, note, matched_place_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        with self.pool.transaction() as conn:
+            c = conn.execute('''
+                INSERT INTO places (name, country, region, municipality, parish, village, specific, coordinates, note, matched_place_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                place.get('name', ''),
+                place.get('country', ''),
+                place.get('region', ''),
+                place.get('municipality', ''),
+                place.get('parish', ''),
+                place.get('village', ''),
+                place.get('specific', ''),
+                place.get('coordinates', ''),
+                place.get('note', ''),
+                place.get('matched_place_id', None)
+            ))
+            new_id = c.lastrowid
+            refresh_normalized_columns(conn, 'places', NORMALIZED_COLUMNS)
+        return new_id
+
+    def add_places(self, places):
+        """Lägger till många platser i en transaktion (executemany). Returnerar de nya id:na i samma ordning."""
+        if not places:
+            return []
+        rows = [(
             place.get('name', ''),
             place.get('country', ''),
             place.get('region', ''),
@@ -135,26 +153,40 @@ class PlaceDatabaseManager:
             place.get('coordinates', ''),
             place.get('note', ''),
             place.get('matched_place_id', None)
-        ))
-        new_id = c.lastrowid
-        conn.commit()
-        conn.close()
-        return new_id
+        ) for place in places]
+        with self.pool.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO places (name, country, region, municipality, parish, village, specific, coordinates, note, matched_place_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            # Raderna fick löpande id:n över tidigare max under transaktionens skrivlås
+            last_id = conn.execute('SELECT MAX(id) FROM places').fetchone()[0]
+            refresh_normalized_columns(conn, 'places', NORMALIZED_COLUMNS)
+        return list(range(last_id - len(rows) + 1, last_id + 1))
 
     def get_place_by_id(self, place_id):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute('SELECT * FROM places WHERE id = ?', (place_id,))
         row = c.fetchone()
-        conn.close()
-        return dict(row) if row else None
+        return public_row(row) if row else None
+
+    def find_places_by_name(self, name):
+        """Indexerad likhetssökning på normaliserat namn (skiftläge, diakriter och gamla stavningar ignoreras)."""
+        key = normalize_name(name)
+        if not key:
+            return []
+        conn = self.pool.connection()
+        c = conn.cursor()
+        c.execute('SELECT * FROM places WHERE name_norm = ?', (key,))
+        return [public_row(row) for row in c.fetchall()]
 
     def get_all_places(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        return list(self.iter_all_places())
+
+    def iter_all_places(self):
+        # Generator (fetchmany) för strömmade svar
+        conn = self.pool.connection()
         c = conn.cursor()
         c.execute('SELECT * FROM places')
-        results = [dict(row) for row in c.fetchall()]
-        conn.close()
-        return results
+        yield from iter_cursor(c, convert=public_row)
@@ -0,0 +1,116 @@
+"""
+Place Hierarchy - Härledning av kommun/län via förälderkedjan
+
+Platsimporter (Disgen-XML i scripts/import_places_from_xml.py och Genney-XML
+via /official_places/import_xml) behöver för varje plats veta vilken kommun
+och vilket län den ligger i. Att gå hela förälderkedjan för varje plats blir
+O(n·djup); HierarchyResolver löser i stället varje nod en gång och återanvänder
+förälderns resultat (memoisering uppifrån och ned). Cykler i förälderreferenserna
+bryts och räknas i statistiken.
+
+Vad som ska härledas beskrivs med AncestryField:
+  - matches(node):  noden är av rätt sort (t.ex. kommun)
+  - value(node):    värdet noden bidrar med (t.ex. (namn, kod))
+  - complete(v):    värdet är fullständigt; närmaste nod med fullständigt
+                    värde vinner, annars används den översta matchande noden
+  - topmost=True:   den översta matchande noden vinner alltid
+"""
+
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Mapping, Optional, Sequence
+
+
+_MISSING = object()
+
+
+class AncestryField:
+    """Ett fält som härleds från närmaste (eller översta) matchande nod i kedjan."""
+
+    def __init__(self, name: str, matches: Callable[[Any], bool], value: Callable[[Any], Any],
+                 default: Any = '', complete: Callable[[Any], bool] = bool, topmost: bool = False):
+        self.name = name
+        self.matches = matches
+        self.value = value
+        self.default = default
+        self.complete = complete
+        self.topmost = topmost
+
+
+class HierarchyResolver:
+    """
+    Memoiserad härledning av AncestryField-värden för noder i en förälderhierarki.
+    nodes: nyckel -> nod; parent_key(nod) ger förälderns nyckel (eller None).
+    """
+
+    def __init__(self, nodes: Mapping[Hashable, Any], parent_key: Callable[[Any], Optional[Hashable]],
+                 fields: Sequence[AncestryField]):
+        self.nodes = nodes
+        self.parent_key = parent_key
+        self.fields = tuple(fields)
+        # nyckel -> per fält: (närmaste fullständiga värde, översta matchande värde), _MISSING om inget
+        self._memo: Dict[Hashable, tuple] = {}
+        self._empty = tuple((_MISSING, _MISSING) for _ in self.fields)
+        self.cycles = 0
+        self.seconds = 0.0
+
+    def _state(self, key: Hashable) -> tuple:
+        """Tillståndet för kedjan som börjar i key (noden själv inräknad)."""
+        if key is None or key not in self.nodes:
+            return self._empty
+        state = self._memo.get(key)
+        if state is not None:
+            return state
+        started = time.perf_counter()
+        # Klättra uppåt tills en löst nod, en rot eller en cykel nås
+        chain = []
+        on_chain = set()
+        current = key
+        while current is not None and current in self.nodes and current not in self._memo:
+            if current in on_chain:
+                self.cycles += 1
+                break
+            chain.append(current)
+            on_chain.add(current)
+            current = self.parent_key(self.nodes[current])
+        above = self._memo.get(current, self._empty) if current not in on_chain else self._empty
+        # Lös nedåt från toppen
+        for node_key in reversed(chain):
+            node = self.nodes[node_key]
+            state = []
+            for field, (nearest, top) in zip(self.fields, above):
+                if field.matches(node):
+                    value = field.value(node)
+                    if field.complete(value):
+                        nearest = value
+                    if top is _MISSING:
+                        top = value
+                state.append((nearest, top))
+            above = tuple(state)
+            self._memo[node_key] = above
+        self.seconds += time.perf_counter() - started
+        return above
+
+    def _values(self, state: tuple) -> Dict[str, Any]:
+        values = {}
+        for field, (nearest, top) in zip(self.fields, state):
+            if not field.topmost and nearest is not _MISSING:
+                values[field.name] = nearest
+            elif top is not _MISSING:
+                values[field.name] = top
+            else:
+                values[field.name] = field.default
+        return values
+
+    def resolve(self, key: Hashable) -> Dict[str, Any]:
+        """Fältvärden för noden key, där noden själv räknas in i kedjan."""
+        return self._values(self._state(key))
+
+    def resolve_parent(self, node: Any) -> Dict[str, Any]:
+        """Fältvärden från nodens förfäder (noden själv räknas inte)."""
+        return self._values(self._state(self.parent_key(node)))
+
+    def resolve_all(self, keys: Optional[Iterable[Hashable]] = None) -> Dict[Hashable, Dict[str, Any]]:
+        return {key: self.resolve(key) for key in (self.nodes if keys is None else keys)}
+
+    def stats(self) -> Dict:
+        return {'nodes_resolved': len(self._memo), 'cycles': self.cycles, 'resolve_ms': round(self.seconds * 1000, 2)}
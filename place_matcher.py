@@ -0,0 +1,364 @@
+"""
+Place Matcher - Automatisk matchning av platssträngar mot official_places
+
+Flöde per platssträng (t.ex. från GEDCOM: "Ekby, Kalmar län, Sverige"):
+  1. parse_place_string() delar upp strängen i ort/församling/kommun/län.
+  2. Kandidater blockas fram via index istället för att hela registret gås igenom:
+       - likhet på normaliserade nycklar (ortnamn_norm/sockenstadnamn_norm, se
+         name_normalize; stavningsvarianter som w/v, qv/kv ger samma nyckel och
+         länsbokstaven i "Ekby (R)" ingår inte)
+       - annars fuzzy-blockning på unika ortnamn med samma början (indexerat
+         intervall) eller samma slut (trigram-frås i FTS5-indexet)
+  3. Alla kandidater poängsätts i ett svep per komponent med en bitparallell
+     LCS-kärna (samma mått som difflib/rapidfuzz ratio, 0.0-1.0).
+  4. Resultatet är en rankad lista med poäng; identiska frågor cachas tills
+     official_places ändras (data_version).
+"""
+
+import heapq
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from name_normalize import normalize_name, normalize_place_name, prefix_range
+from official_place_database import SEARCH_INDEX_TABLE
+
+try:
+    from rapidfuzz import fuzz, process
+    HAS_RAPIDFUZZ = True
+except ImportError:
+    HAS_RAPIDFUZZ = False
+
+
+# Lägsta poäng för att en plats ska räknas som matchad
+MATCH_THRESHOLD = 0.85
+# Max antal kandidater som poängsätts per platssträng
+CANDIDATE_LIMIT = 200
+# Fuzzy-blockning: max antal unika ortnamn att jämföra, lägsta likhet och max antal namn som går vidare
+NAME_BLOCK_LIMIT = 5000
+NAME_BLOCK_THRESHOLD = 0.75
+NAME_BLOCK_MAX = 20
+# Antal rankade träffar som sparas per platssträng
+MAX_RESULTS = 20
+# Antal cachade matchningar (LRU)
+CACHE_SIZE = 20000
+# Vikter per komponent; bara komponenter som finns i platssträngen räknas
+WEIGHTS = {'village': 0.6, 'name': 0.6, 'parish': 0.2, 'municipality': 0.1, 'region': 0.1, 'context': 0.2}
+CANDIDATE_COLUMNS = ('id', 'ortnamn', 'sockenstadnamn', 'kommunnamn', 'lansnamn',
+                     'ortnamn_norm', 'sockenstadnamn_norm', 'kommunnamn_norm', 'lansnamn_norm')
+
+COUNTRY_KEYWORDS = ('sverige', 'sweden', 'swe', 'usa', 'united states', 'amerika', 'america')
+
+
+# --- Platssträngsparser enligt svensk/amerikansk logik ---
+def parse_place_string(plac_string):
+    if not plac_string or not isinstance(plac_string, str):
+        return {}
+    parts = [p.strip() for p in plac_string.split(',') if p.strip()]
+    if not parts:
+        return {}
+    country = parts[-1].lower()
+    sweden_keywords = ['sverige', 'sweden', 'swe']
+    usa_keywords = ['usa', 'united states', 'amerika', 'america']
+    sweden_lan_suffix = 'län'
+    us_state_regex = re.compile(r'^[A-Z]{2}$')
+    result = {}
+    # Landstyp
+    if country in sweden_keywords:
+        result['type'] = 'sweden'
+    elif country in usa_keywords:
+        result['type'] = 'usa'
+    elif country.endswith(sweden_lan_suffix):
+        result['type'] = 'sweden'
+    elif us_state_regex.match(parts[-1]):
+        result['type'] = 'usa'
+    # Fältmappning
+    if result.get('type') == 'sweden':
+        # Gård/Torp, By, Socken, Län, Land
+        result['country'] = parts[-1] if len(parts) > 0 else ''
+        result['region'] = parts[-2] if len(parts) > 1 else ''
+        result['parish'] = parts[-3] if len(parts) > 2 else ''
+        result['village'] = parts[-4] if len(parts) > 3 else ''
+        result['specific'] = parts[-5] if len(parts) > 4 else ''
+    elif result.get('type') == 'usa':
+        # Stad, County, Stat, Land
+        result['country'] = parts[-1] if len(parts) > 0 else ''
+        result['region'] = parts[-2] if len(parts) > 1 else ''
+        result['municipality'] = parts[-3] if len(parts) > 2 else ''
+        result['village'] = parts[-4] if len(parts) > 3 else ''
+        result['specific'] = parts[-5] if len(parts) > 4 else ''
+    return result
+
+
+# --- Likhetskärna ---
+def _char_masks(text: str) -> Dict[str, int]:
+    masks: Dict[str, int] = {}
+    for i, ch in enumerate(text):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    return masks
+
+
+def ratio_batch(query: str, choices: Sequence[str]) -> List[float]:
+    """
+    Likhet 2*LCS/(len(a)+len(b)) mellan query och varje sträng i choices.
+    Masker för query byggs en gång; varje jämförelse är O(len(choice)) heltalsoperationer.
+    """
+    if not choices:
+        return []
+    # Kandidaterna delar ofta värden (samma län/församling); varje unikt värde räknas en gång
+    unique = list(dict.fromkeys(choices))
+    if HAS_RAPIDFUZZ:
+        computed = [score / 100.0 for score in process.cdist([query], unique, scorer=fuzz.ratio)[0]]
+    else:
+        m = len(query)
+        masks = _char_masks(query)
+        full = (1 << m) - 1
+        computed = []
+        for choice in unique:
+            if not choice or not m or choice == query:
+                computed.append(1.0 if choice == query else 0.0)
+                continue
+            v = full
+            for ch in choice:
+                u = v & masks.get(ch, 0)
+                v = ((v + u) | (v - u)) & full
+            lcs = m - bin(v).count('1')
+            computed.append(2.0 * lcs / (m + len(choice)))
+    by_value = dict(zip(unique, computed))
+    return [by_value[choice] for choice in choices]
+
+
+def _region_key(value) -> str:
+    # "Kalmar län" och "Kalmar" ska ge samma nyckel
+    key = normalize_name(value)
+    if key.endswith(' lan'):
+        key = key[:-4]
+    return key
+
+
+def place_components(place) -> Dict[str, str]:
+    """
+    Normaliserade komponenter för en platssträng eller platsdict (name + ev. nivåer).
+    village jämförs med ortnamn; name är ett namn som kan vara ort eller församling;
+    context är övriga delar när strängen inte gick att tolka; raw är det onormaliserade
+    namnet (för trigram-sökningen, eftersom FTS-indexet innehåller originaltexten).
+    """
+    if isinstance(place, str):
+        place = {'name': place}
+    name = place.get('name') or ''
+    parsed = parse_place_string(name)
+    values = {key: place.get(key) or parsed.get(key) or '' for key in ('village', 'parish', 'municipality', 'region')}
+    components = {}
+    if values['village']:
+        components['raw'] = values['village']
+        components['village'] = normalize_place_name(values['village'])
+        if values['parish']:
+            components['parish'] = normalize_place_name(values['parish'])
+    elif values['parish']:
+        components['raw'] = values['parish']
+        components['name'] = normalize_place_name(values['parish'])
+    if values['municipality']:
+        components['municipality'] = normalize_name(values['municipality'])
+    if values['region']:
+        components['region'] = _region_key(values['region'])
+    if 'village' not in components and 'name' not in components:
+        parts = [p.strip() for p in name.split(',') if p.strip() and p.strip().lower() not in COUNTRY_KEYWORDS]
+        if parts:
+            components['raw'] = parts[0]
+            components['name'] = normalize_place_name(parts[0])
+            # "Ort, Sverige" tolkas av parsern som ett län; namnet ska inte räknas två gånger
+            if components.get('region') == _region_key(parts[0]):
+                del components['region']
+            context = ' '.join(normalize_name(p) for p in parts[1:])
+            if context:
+                components['context'] = context
+    components = {key: value for key, value in components.items() if value}
+    if 'village' not in components and 'name' not in components:
+        return {}
+    return components
+
+
+class PlaceMatcher:
+    """Rankad matchning av platssträngar mot official_places."""
+
+    def __init__(self, place_db, candidate_limit: int = CANDIDATE_LIMIT, cache_size: int = CACHE_SIZE):
+        self.place_db = place_db
+        self.candidate_limit = candidate_limit
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[tuple, List[Dict]]' = OrderedDict()
+        self._cache_version = None
+        self._lock = threading.Lock()
+        self.stats = {'queries': 0, 'cache_hits': 0, 'exact_blocks': 0, 'fuzzy_blocks': 0, 'candidates_scored': 0}
+
+    def match(self, place, limit: int = 5) -> List[Dict]:
+        """Rankade kandidater [{'id', 'score', 'reason', ortnamn, ...}] för en platssträng eller platsdict."""
+        return self.match_many([place], limit=limit)[0]
+
+    def best_match(self, place, threshold: float = MATCH_THRESHOLD) -> Optional[Dict]:
+        matches = self.match(place, limit=1)
+        if matches and matches[0]['score'] >= threshold:
+            return matches[0]
+        return None
+
+    def match_many(self, places: Iterable, limit: int = 5) -> List[List[Dict]]:
+        """Matchar många platser; identiska (normaliserade) frågor poängsätts bara en gång."""
+        if not getattr(self.place_db, '_has_normalized_columns', False):
+            return [[] for _ in places]
+        self._check_version()
+        conn = self.place_db.pool.connection()
+        results = []
+        for place in places:
+            components = place_components(place)
+            key = tuple(sorted(components.items()))
+            with self._lock:
+                self.stats['queries'] += 1
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self.stats['cache_hits'] += 1
+            if cached is None:
+                cached = self._score(conn, components) if components else []
+                with self._lock:
+                    self._cache[key] = cached
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            results.append([dict(m) for m in cached[:limit]])
+        return results
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _count(self, name: str, amount: int = 1):
+        # Räknarna uppdateras från flera request-trådar
+        with self._lock:
+            self.stats[name] += amount
+
+    def _check_version(self):
+        version = self.place_db.get_data_version()
+        with self._lock:
+            if version != self._cache_version:
+                self._cache.clear()
+                self._cache_version = version
+
+    def _candidates(self, conn, components) -> List:
+        # En ort blockas på ortnamn; ett tvetydigt namn även på församlingsnamn
+        if 'village' in components:
+            where, keys = 'ortnamn_norm = ?', [components['village']]
+        else:
+            where, keys = 'ortnamn_norm = ? OR sockenstadnamn_norm = ?', [components['name']] * 2
+        region = components.get('region', '')
+        rows = self._rows(conn, where, keys, region)
+        if rows:
+            self._count('exact_blocks')
+            return rows
+        self._count('fuzzy_blocks')
+        # Inget exakt namn: välj bland unika ortnamn som delar början (indexerat intervall)
+        # eller slutet (trigram-frås i FTS5), så att stavfel mitt i namnet också hittas
+        name = components.get('village') or components.get('name')
+        names = {row[0] for row in conn.execute('''
+            SELECT DISTINCT ortnamn_norm FROM official_places
+            WHERE ortnamn_norm >= ? AND ortnamn_norm < ?
+            LIMIT ?
+        ''', prefix_range(name[:2]) + (NAME_BLOCK_LIMIT,))}
+        close = _closest_names(name, names)
+        raw = ' '.join((components.get('raw') or name).replace('"', ' ').split())
+        if not close and getattr(self.place_db, '_has_search_index', False) and len(raw) >= 6:
+            names = {row[0] for row in conn.execute(f'''
+                SELECT DISTINCT p.ortnamn_norm FROM {SEARCH_INDEX_TABLE} f
+                JOIN official_places p ON p.id = f.rowid
+                WHERE {SEARCH_INDEX_TABLE} MATCH ?
+                LIMIT ?
+            ''', ('{ortnamn} : "' + raw[-4:] + '"', NAME_BLOCK_LIMIT))}
+            close = _closest_names(name, names)
+        if not close:
+            return []
+        marks = ','.join('?' * len(close))
+        return self._rows(conn, f'ortnamn_norm IN ({marks})', [n for _, n in close], region)
+
+    def _rows(self, conn, where, params, region) -> List:
+        columns = ', '.join(CANDIDATE_COLUMNS)
+        # Vanliga namn (t.ex. "Berg") finns i många län: med känt län räcker oftast länets rader
+        if region:
+            rows = conn.execute(f'''
+                SELECT {columns} FROM official_places
+                WHERE ({where}) AND lansnamn_norm IN (?, ?)
+                LIMIT ?
+            ''', list(params) + [region, region + ' lan', self.candidate_limit]).fetchall()
+            if rows:
+                return rows
+        return conn.execute(f'''
+            SELECT {columns} FROM official_places
+            WHERE {where}
+            LIMIT ?
+        ''', list(params) + [self.candidate_limit]).fetchall()
+
+    def _score(self, conn, components) -> List[Dict]:
+        rows = self._candidates(conn, components)
+        if not rows:
+            return []
+        self._count('candidates_scored', len(rows))
+
+        def column(name):
+            return [row[name] or '' for row in rows]
+
+        ort = column('ortnamn_norm')
+        socken = column('sockenstadnamn_norm')
+        kommun = column('kommunnamn_norm')
+        lan = [_strip_lan(value) for value in column('lansnamn_norm')]
+        scores = {}
+        if 'village' in components:
+            scores['village'] = ratio_batch(components['village'], ort)
+        if 'name' in components:
+            # Bara ett namn: det kan vara en ort eller en församling
+            scores['name'] = [
+                max(a, b) for a, b in zip(ratio_batch(components['name'], ort), ratio_batch(components['name'], socken))
+            ]
+        if 'parish' in components:
+            scores['parish'] = ratio_batch(components['parish'], socken)
+        if 'municipality' in components:
+            scores['municipality'] = ratio_batch(components['municipality'], kommun)
+        if 'region' in components:
+            scores['region'] = ratio_batch(components['region'], lan)
+        if 'context' in components:
+            context = components['context']
+            scores['context'] = [
+                max(_contains(context, s), _contains(context, k), _contains(context, l))
+                for s, k, l in zip(socken, kommun, lan)
+            ]
+        # Viktad summa per kandidat, kolumnvis över komponenterna
+        total_weight = sum(WEIGHTS[key] for key in scores)
+        columns = list(scores.values())
+        weights = [WEIGHTS[key] / total_weight for key in scores]
+        totals = [sum(w * v for w, v in zip(weights, values)) for values in zip(*columns)]
+        exact = [all(v == 1.0 for v in values) for values in zip(*columns)]
+        best = heapq.nsmallest(MAX_RESULTS, range(len(rows)), key=lambda i: (-totals[i], rows[i]['id']))
+        return [{
+            'id': rows[i]['id'],
+            'score': round(totals[i], 4),
+            'reason': 'EXACT' if exact[i] else 'FUZZY',
+            'ortnamn': rows[i]['ortnamn'],
+            'sockenstadnamn': rows[i]['sockenstadnamn'],
+            'kommunnamn': rows[i]['kommunnamn'],
+            'lansnamn': rows[i]['lansnamn'],
+        } for i in best]
+
+
+def _closest_names(name: str, names) -> List[tuple]:
+    names = [n for n in names if n]
+    return sorted(
+        (pair for pair in zip(ratio_batch(name, names), names) if pair[0] >= NAME_BLOCK_THRESHOLD),
+        reverse=True
+    )[:NAME_BLOCK_MAX]
+
+
+def _strip_lan(key: str) -> str:
+    return key[:-4] if key.endswith(' lan') else key
+
+
+def _contains(context: str, value: str) -> float:
+    # Kontextdelar (okänd nivå) räknas som träff om registrets namn finns bland dem
+    if not value:
+        return 0.0
+    return 1.0 if f' {value} ' in f' {context} ' else 0.0
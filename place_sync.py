@@ -0,0 +1,210 @@
+"""
+Place Sync - Inkrementell, idempotent synk av platsregister till official_places
+
+Istället för att tömma tabellen och läsa in allt igen (nya id:n, brutna
+matched_place_id) identifieras varje rad med sin källa och ett stabilt id
+från källan: (source, source_id), t.ex. ('disgen', 'K-5347') eller
+('lantmateriet', '123456'). Paret har ett UNIQUE-index.
+
+sync_places() lägger inkommande rader i en temporär tabell och räknar ut
+skillnaden mot official_places med mängdoperationer i SQL:
+  - inserted:  source_id som inte finns -> nya rader
+  - updated:   finns men något fält skiljer sig -> bara de raderna skrivs
+  - unchanged: identiska rader rörs inte (id, FTS och versionsräknare oförändrade)
+  - removed:   källans rader som inte längre finns med (om remove_missing)
+
+Rader från tidigare importer saknar nyckel. Med adopt_keys tar synken över
+sådana rader (samma nyckel, t.ex. ortnamn + typ) i stället för att lägga in
+dubbletter, så att deras id behålls. Nycklarna prövas från striktast till
+lösast. Nyckellösa rader som ändå blir över men motsvarar en av källans rader
+tas bort; deras id returneras med ersättande id så att matched_place_id kan
+pekas om. Övriga nyckellösa rader (manuella, andra källor) lämnas orörda.
+"""
+
+import itertools
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+
+STAGING_TABLE = 'place_sync_staging'
+STAGING_BATCH_SIZE = 5000
+
+
+def ensure_sync_schema(conn):
+    """Lägger till source/source_id och UNIQUE-indexet på official_places (om de saknas)."""
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(official_places)').fetchall()}
+    for column in ('source', 'source_id'):
+        if column not in existing:
+            conn.execute(f'ALTER TABLE official_places ADD COLUMN {column} TEXT')
+    # Rader utan källa (äldre importer, manuella) omfattas inte av unikhetskravet
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_official_places_source
+        ON official_places(source, source_id) WHERE source IS NOT NULL
+    ''')
+
+
+def _column_types(conn, columns: Sequence[str]) -> Dict[str, str]:
+    types = {row[1]: row[2] for row in conn.execute('PRAGMA table_info(official_places)').fetchall()}
+    missing = [column for column in columns if column not in types]
+    if missing:
+        raise ValueError(f"Unknown official_places columns: {', '.join(missing)}")
+    return types
+
+
+def _stage(conn, columns: Sequence[str], rows: Iterable[Tuple[str, tuple]]) -> int:
+    """Lägger raderna i den temporära tabellen (första förekomsten av ett source_id vinner)."""
+    # Samma deklarerade typer som official_places, så att jämförelserna görs med samma typaffinitet
+    types = _column_types(conn, columns)
+    definitions = ', '.join(f'{column} {types[column]}' for column in columns)
+    conn.execute(f'DROP TABLE IF EXISTS temp.{STAGING_TABLE}')
+    conn.execute(f'CREATE TEMP TABLE {STAGING_TABLE} (source_id TEXT PRIMARY KEY, {definitions})')
+    placeholders = ', '.join('?' * (len(columns) + 1))
+    sql = f"INSERT OR IGNORE INTO {STAGING_TABLE} (source_id, {', '.join(columns)}) VALUES ({placeholders})"
+    received = 0
+    rows = iter(rows)
+    while True:
+        batch = [(str(source_id),) + tuple(values)
+                 for source_id, values in itertools.islice(rows, STAGING_BATCH_SIZE)]
+        if not batch:
+            return received
+        conn.executemany(sql, batch)
+        received += len(batch)
+
+
+def _key_columns(key: Sequence[str]) -> Tuple[str, str]:
+    """(SELECT-lista med k0, k1, ..., PARTITION BY-lista) för en nyckel av SQL-uttryck."""
+    select = ', '.join(f'{expression} AS k{i}' for i, expression in enumerate(key))
+    partition = ', '.join(f'k{i}' for i in range(len(key)))
+    return select, partition
+
+
+def _adopt(conn, source: str, key: Sequence[str]) -> int:
+    """
+    Ger nyckellösa rader källans source_id när nyckeln (SQL-uttryck över kolumnerna) stämmer.
+    Inom en grupp med samma nyckel paras raderna ihop i ordning (lägsta id med
+    första källraden osv.), så att dubbletter inte pekar ut samma äldre rad.
+    """
+    select, partition = _key_columns(key)
+    match = ' AND '.join(f'incoming.k{i} IS legacy.k{i}' for i in range(len(key)))
+    conn.execute('DROP TABLE IF EXISTS temp.place_sync_adopt')
+    conn.execute(f'''
+        CREATE TEMP TABLE place_sync_adopt AS
+        WITH incoming AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY position) AS n FROM (
+                SELECT rowid AS position, source_id, {select} FROM {STAGING_TABLE}
+                WHERE source_id NOT IN (SELECT source_id FROM official_places WHERE source = ?)
+            )
+        ), legacy AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY id) AS n FROM (
+                SELECT id, {select} FROM official_places WHERE source IS NULL
+            )
+        )
+        SELECT incoming.source_id AS source_id, legacy.id AS id
+        FROM incoming JOIN legacy ON incoming.n = legacy.n AND {match}
+    ''', (source,))
+    conn.execute('CREATE INDEX temp.idx_place_sync_adopt ON place_sync_adopt(id)')
+    adopted = conn.execute('''
+        UPDATE official_places
+        SET source = ?, source_id = (SELECT a.source_id FROM place_sync_adopt a WHERE a.id = official_places.id)
+        WHERE id IN (SELECT id FROM place_sync_adopt)
+    ''', (source,)).rowcount
+    conn.execute('DROP TABLE temp.place_sync_adopt')
+    return adopted
+
+
+def _replace_leftovers(conn, source: str, key: Sequence[str]) -> Dict[int, int]:
+    """
+    Nyckellösa rader som inte togs över men har samma nyckel som någon av källans
+    rader är dubbletter av den: de tas bort. Returnerar {borttaget id: källradens id}
+    (lägsta id i gruppen) så att referenser (matched_place_id) kan pekas om.
+    """
+    select, partition = _key_columns(key)
+    match = ' AND '.join(f'keyed.k{i} IS legacy.k{i}' for i in range(len(key)))
+    replaced = dict(conn.execute(f'''
+        WITH keyed AS (
+            SELECT MIN(id) AS id, {select} FROM official_places WHERE source = ? GROUP BY {partition}
+        ), legacy AS (
+            SELECT id, {select} FROM official_places WHERE source IS NULL
+        )
+        SELECT legacy.id, keyed.id FROM legacy JOIN keyed ON {match}
+    ''', (source,)).fetchall())
+    conn.executemany('DELETE FROM official_places WHERE id = ?', [(old_id,) for old_id in replaced])
+    return replaced
+
+
+def sync_places(conn, source: str, columns: Sequence[str], rows: Iterable[Tuple[str, tuple]],
+                remove_missing: bool = True, adopt_keys: Optional[Sequence[Sequence[str]]] = None) -> Dict:
+    """
+    Synkar rows ((source_id, värden i columns-ordning)) för källan source mot official_places.
+    adopt_keys: nycklar (SQL-uttryck över kolumnerna) för att ta över nyckellösa rader,
+    från striktast till lösast; kvarvarande dubbletter enligt den sista tas bort.
+    Körs i anroparens transaktion; returnerar statistik över ändringarna, med
+    replaced_ids = {borttaget id: ersättande id} för referenser som ska pekas om.
+    """
+    started = time.perf_counter()
+    columns = tuple(columns)
+    ensure_sync_schema(conn)
+    received = _stage(conn, columns, rows)
+    staged = conn.execute(f'SELECT COUNT(*) FROM {STAGING_TABLE}').fetchone()[0]
+    adopted = sum(_adopt(conn, source, key) for key in adopt_keys or ())
+
+    column_list = ', '.join(columns)
+    staged_columns = ', '.join(f's.{column}' for column in columns)
+    differs = ' OR '.join(f'p.{column} IS NOT s.{column}' for column in columns)
+    updated = conn.execute(f'''
+        UPDATE official_places AS p
+        SET ({column_list}) = (SELECT {staged_columns} FROM {STAGING_TABLE} s WHERE s.source_id = p.source_id)
+        WHERE p.source = ? AND EXISTS (
+            SELECT 1 FROM {STAGING_TABLE} s WHERE s.source_id = p.source_id AND ({differs})
+        )
+    ''', (source,)).rowcount
+    inserted = conn.execute(f'''
+        INSERT INTO official_places (source, source_id, {column_list})
+        SELECT ?, s.source_id, {staged_columns} FROM {STAGING_TABLE} s
+        WHERE NOT EXISTS (SELECT 1 FROM official_places p WHERE p.source = ? AND p.source_id = s.source_id)
+        ORDER BY s.rowid
+    ''', (source, source)).rowcount
+    removed = 0
+    if remove_missing:
+        removed = conn.execute(f'''
+            DELETE FROM official_places
+            WHERE source = ? AND source_id NOT IN (SELECT source_id FROM {STAGING_TABLE})
+        ''', (source,)).rowcount
+    replaced = _replace_leftovers(conn, source, adopt_keys[-1]) if adopt_keys else {}
+    legacy = conn.execute('SELECT COUNT(*) FROM official_places WHERE source IS NULL').fetchone()[0]
+    conn.execute(f'DROP TABLE temp.{STAGING_TABLE}')
+    return {
+        'source': source,
+        'received': received,
+        'duplicates': received - staged,
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': staged - inserted - updated,
+        'removed': removed,
+        'adopted': adopted,
+        'replaced': len(replaced),
+        'legacy_remaining': legacy,
+        'replaced_ids': replaced,
+        'ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def remap_matched_place_ids(places_db_path: str, replaced: Dict[int, int]) -> int:
+    """Pekar om places.matched_place_id i användarens platsdatabas från borttagna till ersättande id."""
+    if not replaced or not os.path.exists(places_db_path):
+        return 0
+    conn = sqlite3.connect(places_db_path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'places'").fetchone():
+            return 0
+        with conn:
+            # matched_place_id kan vara lagrat som heltal eller text beroende på vem som skapat tabellen
+            return sum(
+                conn.execute('UPDATE places SET matched_place_id = ? WHERE matched_place_id IN (?, ?)',
+                             (new_id, old_id, str(old_id))).rowcount
+                for old_id, new_id in replaced.items()
+            )
+    finally:
+        conn.close()
@@ -0,0 +1,201 @@
+"""
+Place Tree Cache - Cachat registerträd för /official_places/full_tree
+
+Trädet (Land > Län > Kommun > Församling > Ort) och den platta listan byggs
+per (län, kommun)-grupp och hålls i minnet som färdigserialiserade
+JSON-fragment. Hela svaret sätts ihop av fragmenten och sparas även som
+ögonblicksbild på disk, så att en omstart inte behöver bygga om allt.
+
+Invalidering:
+  - invalidate(places, version_before): API-rutter som ändrar official_places
+    anger de rader (före/efter ändring) som påverkats och data_version före
+    ändringen; bara deras kommungrupper byggs om.
+  - data_version (se official_place_database.ensure_version_tracking): ändringar
+    som gjorts utanför API:t (t.ex. importskript) ger full ombyggnad.
+
+Svaret har en ETag så att oförändrade klienter kan få 304 Not Modified.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from official_place_database import UNKNOWN_MUNICIPALITY, UNKNOWN_REGION, tree_place
+
+
+SNAPSHOT_FORMAT = 1
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def group_key(place: Dict) -> Tuple[str, str]:
+    """(län, kommun)-nyckel för en plats, med trädets visningsnamn för tomma värden."""
+    if 'region' not in place or 'municipality' not in place:
+        place = tree_place(place)
+    return (place.get('region') or UNKNOWN_REGION, place.get('municipality') or UNKNOWN_MUNICIPALITY)
+
+
+def _build_group(places: Iterable[Dict]) -> Dict[str, Dict[str, str]]:
+    """Bygger kommunnoden och listfragmentet för en grupp, per land."""
+    by_country: Dict[str, Dict] = {}
+    for place in places:
+        # Filtrera bort platser utan län, kommun och församling/ort
+        if not (place.get('region') and place.get('municipality') and (place.get('parish') or place.get('village'))):
+            continue
+        country = place.get('country', 'Sverige') or 'Sverige'
+        entry = by_country.get(country)
+        if entry is None:
+            entry = {'list': [], 'node': {'municipality': place.get('municipality'), 'children': {}}}
+            by_country[country] = entry
+        entry['list'].append(place)
+        children = entry['node']['children']
+        parish = place.get('parish')
+        village = place.get('village')
+        if parish:
+            if parish not in children:
+                children[parish] = {'parish': parish, 'children': {}}
+            parish_node = children[parish]
+        else:
+            parish_node = None
+        if village:
+            if parish_node:
+                if village not in parish_node['children']:
+                    parish_node['children'][village] = {'village': village, 'children': {}}
+            elif village not in children:
+                children[village] = {'village': village, 'children': {}}
+
+    def node_to_item(node):
+        # Konvertera till arraystruktur för frontend
+        item = {k: v for k, v in node.items() if k != 'children'}
+        item['children'] = [node_to_item(child) for child in node['children'].values()]
+        return item
+
+    return {
+        country: {
+            'list_json': _dumps(entry['list'])[1:-1],
+            'node_json': _dumps(node_to_item(entry['node'])),
+        }
+        for country, entry in by_country.items()
+    }
+
+
+class PlaceTreeCache:
+    """Inkrementellt invaliderad cache för registerträdet."""
+
+    def __init__(self, place_db, snapshot_path: Optional[str] = None):
+        self.place_db = place_db
+        self.snapshot_path = snapshot_path or os.path.splitext(place_db.db_path)[0] + '_tree_cache.json'
+        self._lock = threading.Lock()
+        self._groups: Optional[Dict[Tuple[str, str], Dict]] = None
+        self._dirty = set()
+        self._version = None
+        self._payload: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self.stats = {'hits': 0, 'full_rebuilds': 0, 'group_rebuilds': 0, 'snapshot_loads': 0}
+        self._load_snapshot()
+
+    def get_payload(self) -> Tuple[bytes, str]:
+        """Returnerar (JSON-bytes, etag) för {'list': [...], 'tree': [...]}."""
+        with self._lock:
+            current = self.place_db.get_data_version()
+            if self._groups is None or current != self._version:
+                self._full_rebuild()
+                self._version = current
+            elif self._dirty:
+                self._rebuild_dirty()
+            if self._payload is None:
+                self._assemble()
+                self._save_snapshot()
+            else:
+                self.stats['hits'] += 1
+            return self._payload, self._etag
+
+    def invalidate(self, places: Iterable[Optional[Dict]], version_before: Optional[int] = None):
+        """
+        Markerar kommungrupperna för de angivna raderna (före och/eller efter ändring) som inaktuella.
+        version_before är data_version innan API-ändringen gjordes.
+        """
+        with self._lock:
+            for place in places:
+                if place:
+                    self._dirty.add(group_key(place))
+            self._payload = None
+            # Versionsökningen räknas som hanterad bara om cachen var aktuell före ändringen;
+            # annars finns ändringar utanför API:t och nästa get_payload bygger om allt
+            if self._groups is not None and version_before is not None and version_before == self._version:
+                self._version = self.place_db.get_data_version()
+
+    def invalidate_all(self):
+        with self._lock:
+            self._groups = None
+            self._dirty.clear()
+            self._payload = None
+
+    def _full_rebuild(self):
+        grouped: Dict[Tuple[str, str], list] = {}
+        for place in self.place_db.get_all_places():
+            grouped.setdefault(group_key(place), []).append(place)
+        self._groups = {key: _build_group(places) for key, places in grouped.items()}
+        self._dirty.clear()
+        self._payload = None
+        self.stats['full_rebuilds'] += 1
+
+    def _rebuild_dirty(self):
+        for key in self._dirty:
+            group = _build_group(self.place_db.get_places_in_municipality(*key))
+            if group:
+                self._groups[key] = group
+            else:
+                self._groups.pop(key, None)
+            self.stats['group_rebuilds'] += 1
+        self._dirty.clear()
+        self._payload = None
+
+    def _assemble(self):
+        lists = []
+        tree: Dict[str, Dict[str, list]] = {}
+        for (region, _municipality) in sorted(self._groups):
+            for country, fragment in self._groups[(region, _municipality)].items():
+                if fragment['list_json']:
+                    lists.append(fragment['list_json'])
+                tree.setdefault(country, {}).setdefault(region, []).append(fragment['node_json'])
+        tree_json = ','.join(
+            '{"country":%s,"children":[%s]}' % (
+                _dumps(country),
+                ','.join('{"region":%s,"children":[%s]}' % (_dumps(region), ','.join(nodes)) for region, nodes in regions.items())
+            )
+            for country, regions in tree.items()
+        )
+        payload = '{"list":[%s],"tree":[%s]}' % (','.join(lists), tree_json)
+        self._payload = payload.encode('utf-8')
+        self._etag = hashlib.sha1(self._payload).hexdigest()
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot.get('format') != SNAPSHOT_FORMAT or snapshot.get('version') != self.place_db.get_data_version():
+                return
+            self._groups = {(region, municipality): group for region, municipality, group in snapshot['groups']}
+            self._version = snapshot['version']
+            self.stats['snapshot_loads'] += 1
+        except (OSError, ValueError, KeyError, TypeError):
+            self._groups = None
+
+    def _save_snapshot(self):
+        snapshot = {
+            'format': SNAPSHOT_FORMAT,
+            'version': self._version,
+            'groups': [[region, municipality, group] for (region, municipality), group in self._groups.items()],
+        }
+        tmp_path = self.snapshot_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"[DEBUG] Kunde inte spara trädcache till {self.snapshot_path}: {e}")
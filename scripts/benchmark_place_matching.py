@@ -0,0 +1,100 @@
+# Benchmark: automatisk matchning av platssträngar mot official_places
+# Bygger samma syntetiska register som benchmark_place_search.py och mäter
+# hur många GEDCOM-liknande platssträngar per sekund PlaceMatcher klarar,
+# med och utan cache (upprepade strängar), samt andelen korrekta träffar.
+# Som i Lantmäteriets register får de flesta ort- och församlingsnamn en
+# länsbokstav ("Ekby (H)"), medan platssträngarna skrivs utan den.
+#
+# Användning:
+#   python scripts/benchmark_place_matching.py [--rows 200000] [--places 5000]
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmark_place_search import LÄN, build_register
+from official_place_database import OfficialPlaceDatabase
+from place_matcher import PlaceMatcher
+
+
+# Länsbokstav per län i LÄN (samma ordning)
+LÄNSBOKSTAV = ('K', 'H', 'G', 'M', 'N', 'C', 'U', 'W', 'X', 'Z')
+# Var n:te rad får ingen bokstav (i official_places saknar ungefär var 16:e rad bokstav)
+QUALIFIER_EVERY = 16
+_QUALIFIER = re.compile(r'\s*\([A-Z]{1,2}\)$')
+
+
+def add_county_qualifiers(db_path):
+    conn = sqlite3.connect(db_path)
+    for lan, letter in enumerate(LÄNSBOKSTAV):
+        conn.execute('''
+            UPDATE official_places
+            SET ortnamn = ortnamn || ?, sockenstadnamn = sockenstadnamn || ?
+            WHERE lanskod = ? AND id % ? != 0
+        ''', (f' ({letter})', f' ({letter})', f'{lan:02d}', QUALIFIER_EVERY))
+    conn.commit()
+    conn.close()
+
+
+def misspell(rnd, name):
+    # Enkla stavfel/gamla stavningar som i äldre källor
+    if len(name) > 4 and rnd.random() < 0.5:
+        i = rnd.randrange(1, len(name) - 1)
+        return name[:i] + name[i + 1:]
+    return name.replace('v', 'w')
+
+
+def sample_places(db, count, rnd):
+    rows = db.pool.connection().execute(
+        'SELECT id, ortnamn, sockenstadnamn, lansnamn FROM official_places ORDER BY random() LIMIT ?', (count,)
+    ).fetchall()
+    samples = []
+    for row in rows:
+        ortnamn = _QUALIFIER.sub('', row['ortnamn'])
+        name = misspell(rnd, ortnamn) if rnd.random() < 0.3 else ortnamn
+        parish = _QUALIFIER.sub('', row['sockenstadnamn'])
+        samples.append((row['id'], f"{name}, {parish}, {row['lansnamn']} län, Sverige"))
+    return samples
+
+
+def run(matcher, samples):
+    start = time.perf_counter()
+    results = matcher.match_many([text for _, text in samples], limit=1)
+    elapsed = time.perf_counter() - start
+    matched = sum(1 for r in results if r and r[0]['score'] >= 0.85)
+    return elapsed, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mät genomströmning för platsmatchning')
+    parser.add_argument('--rows', type=int, default=200000, help='Antal syntetiska platser i registret')
+    parser.add_argument('--places', type=int, default=5000, help='Antal platssträngar att matcha')
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench_official_places.db')
+        print(f'Bygger syntetiskt register med {args.rows} platser...')
+        build_register(db_path, args.rows)
+        add_county_qualifiers(db_path)
+        db = OfficialPlaceDatabase(db_path=db_path)
+        samples = sample_places(db, args.places, rnd)
+        matcher = PlaceMatcher(db)
+
+        elapsed, matched = run(matcher, samples)
+        print(f'Kall cache:  {len(samples) / elapsed:>10.0f} platser/s  ({matched}/{len(samples)} matchade över tröskeln)')
+        elapsed, _ = run(matcher, samples)
+        print(f'Varm cache:  {len(samples) / elapsed:>10.0f} platser/s')
+        print('Statistik:', matcher.stats)
+        db.pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
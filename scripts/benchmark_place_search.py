@@ -0,0 +1,113 @@
+# Benchmark: LIKE-sökning mot FTS5 (trigram) i official_places
+# Bygger ett syntetiskt ortregister i en temporär databas och mäter
+# söktiden för den gamla LIKE-frågan och OfficialPlaceDatabase.search_places.
+#
+# Användning:
+#   python scripts/benchmark_place_search.py [--rows 500000] [--repeat 5]
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from official_place_database import OfficialPlaceDatabase, ensure_search_index
+
+PREFIX = ['Norr', 'Söder', 'Väster', 'Öster', 'Stora', 'Lilla', 'Gamla', 'Nya', '', '']
+STAMMAR = ['berg', 'by', 'torp', 'ås', 'hult', 'näs', 'holm', 'sjö', 'köping', 'stad', 'ryd', 'boda', 'lid', 'vik', 'måla']
+FÖRLED = ['Ek', 'Björk', 'Lind', 'Al', 'Gran', 'Tall', 'Hag', 'Kvarn', 'Kyrk', 'Sand', 'Sten', 'Mal', 'Å', 'Ängs', 'Hög']
+LÄN = ['Blekinge', 'Kalmar', 'Kronoberg', 'Skåne', 'Halland', 'Uppsala', 'Västmanland', 'Dalarna', 'Gävleborg', 'Jämtland']
+
+QUERIES = ['kvarn', 'Ekby', 'näs', 'Lilla Björk', 'Hagholm', 'sjö', 'Blekinge', 'måla']
+
+
+def random_name(rnd):
+    return f"{rnd.choice(PREFIX)}{rnd.choice(FÖRLED)}{rnd.choice(STAMMAR)}".strip()
+
+
+def build_register(db_path, rows):
+    rnd = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE official_places (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ortnamn TEXT, sockenstadnamn TEXT, sockenstadkod TEXT,
+            kommunkod TEXT, kommunnamn TEXT, lanskod TEXT, lansnamn TEXT, detaljtyp TEXT
+        )
+    ''')
+    batch = []
+    for i in range(rows):
+        lan = rnd.randrange(len(LÄN))
+        batch.append((
+            random_name(rnd), random_name(rnd), f'{lan:02d}{i % 500:04d}',
+            f'{lan:02d}{i % 20:02d}', random_name(rnd), f'{lan:02d}', LÄN[lan], 'BY',
+        ))
+        if len(batch) >= 10000:
+            conn.executemany('INSERT INTO official_places (ortnamn, sockenstadnamn, sockenstadkod, kommunkod, kommunnamn, lanskod, lansnamn, detaljtyp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            batch = []
+    if batch:
+        conn.executemany('INSERT INTO official_places (ortnamn, sockenstadnamn, sockenstadkod, kommunkod, kommunnamn, lanskod, lansnamn, detaljtyp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+    conn.commit()
+    start = time.perf_counter()
+    ensure_search_index(conn)
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - start
+
+
+def like_search(conn, query):
+    # Den tidigare frågan i search_places (utan LIMIT)
+    q = f"%{query.strip().lower()}%"
+    return conn.execute('''
+        SELECT * FROM official_places
+        WHERE LOWER(ortnamn) LIKE ? OR LOWER(sockenstadnamn) LIKE ? OR LOWER(kommunnamn) LIKE ? OR LOWER(lansnamn) LIKE ?
+    ''', (q, q, q, q)).fetchall()
+
+
+def timed(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Jämför LIKE och FTS5 för platssökning')
+    parser.add_argument('--rows', type=int, default=500000, help='Antal syntetiska platser')
+    parser.add_argument('--repeat', type=int, default=5, help='Antal körningar per fråga (bästa tid används)')
+    parser.add_argument('--limit', type=int, default=50, help='Max antal träffar per sökning')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench_official_places.db')
+        print(f'Bygger syntetiskt register med {args.rows} platser...')
+        index_time = build_register(db_path, args.rows)
+        print(f'FTS5-index byggt på {index_time:.2f} s')
+
+        db = OfficialPlaceDatabase(db_path=db_path)
+        raw = sqlite3.connect(db_path)
+        print(f"\n{'fråga':<14} {'LIKE (ms)':>10} {'FTS5 (ms)':>10} {'faktor':>8} {'träffar':>8}")
+        print('-' * 54)
+        total_like = total_fts = 0.0
+        for query in QUERIES:
+            like_time, _ = timed(lambda: like_search(raw, query), args.repeat)
+            fts_time, hits = timed(lambda: db.search_places(query, limit=args.limit), args.repeat)
+            total_like += like_time
+            total_fts += fts_time
+            factor = like_time / fts_time if fts_time else float('inf')
+            print(f'{query:<14} {like_time * 1000:>10.2f} {fts_time * 1000:>10.2f} {factor:>7.1f}x {len(hits):>8}')
+        print('-' * 54)
+        print(f"{'totalt':<14} {total_like * 1000:>10.2f} {total_fts * 1000:>10.2f} {total_like / total_fts:>7.1f}x")
+        raw.close()
+        db.pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
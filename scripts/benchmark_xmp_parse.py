@@ -0,0 +1,105 @@
+# Benchmark: tolkning av XMP med många ansiktsregioner
+# Jämför den tidigare regex-baserade extraktionen (en sökning per fält och
+# upp till sex re.search per region) med ett svep via xmp_reader.parse_xmp.
+#
+# Användning:
+#   python scripts/benchmark_xmp_parse.py [--regions 10 100 500] [--repeat 20]
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from xmp_reader import parse_xmp
+
+
+def build_packet(regions):
+    items = []
+    for i in range(regions):
+        # Varannan region med attributen i exiftools (alfabetiska) ordning
+        if i % 2:
+            area = f'stArea:x="0.{i % 9 + 1}" stArea:y="0.2" stArea:w="0.1" stArea:h="0.1" stArea:unit="normalized"'
+        else:
+            area = f'stArea:h="0.1" stArea:unit="normalized" stArea:w="0.1" stArea:x="0.{i % 9 + 1}" stArea:y="0.2"'
+        items.append(
+            '<rdf:li><mwg-rs:Region>'
+            f'<mwg-rs:Name>Person {i} Åberg</mwg-rs:Name><mwg-rs:Type>Face</mwg-rs:Type>'
+            f'<mwg-rs:Area {area}/>'
+            '</mwg-rs:Region></rdf:li>'
+        )
+    subjects = ''.join(f'<rdf:li>Ämne {i}</rdf:li>' for i in range(regions))
+    persons = ''.join(f'<rdf:li>Person {i} Åberg</rdf:li>' for i in range(regions))
+    return (
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/"'
+        ' xmlns:lr="http://ns.adobe.com/lightroom/1.0/"'
+        ' xmlns:mwg-rs="http://www.metadataworkinggroup.com/schemas/regions/"'
+        ' xmlns:stArea="http://ns.adobe.com/xmp/sType/Area#"'
+        ' xmlns:Iptc4xmpExt="http://iptc.org/std/Iptc4xmpExt/2008-02-29/">'
+        '<dc:title><rdf:Alt><rdf:li xml:lang="x-default">Släktmöte</rdf:li></rdf:Alt></dc:title>'
+        '<dc:creator><rdf:Seq><rdf:li>Fotograf</rdf:li></rdf:Seq></dc:creator>'
+        f'<dc:subject><rdf:Bag>{subjects}</rdf:Bag></dc:subject>'
+        f'<mwg-rs:Regions rdf:parseType="Resource"><mwg-rs:RegionList><rdf:Bag>{"".join(items)}</rdf:Bag></mwg-rs:RegionList></mwg-rs:Regions>'
+        '</rdf:Description>'
+        f'<rdf:Description rdf:about="" xmlns:Iptc4xmpExt="http://iptc.org/std/Iptc4xmpExt/2008-02-29/"><Iptc4xmpExt:PersonInImage><rdf:Bag>{persons}</rdf:Bag></Iptc4xmpExt:PersonInImage></rdf:Description>'
+        '</rdf:RDF></x:xmpmeta>'
+    ).encode('utf-8')
+
+
+def legacy_extract(xmp_bytes):
+    """De tidigare regex-sökningarna i ExifManager, för jämförelse."""
+    xmp_str = xmp_bytes.decode('utf-8')
+    faces = []
+    for region_match in re.finditer(r'<mwg-rs:Region>\s*(.*?)\s*</mwg-rs:Region>', xmp_str, re.DOTALL):
+        content = region_match.group(1)
+        name = re.search(r'<mwg-rs:Name>([^<]+)</mwg-rs:Name>', content)
+        region_type = re.search(r'<mwg-rs:Type>([^<]+)</mwg-rs:Type>', content)
+        area = re.search(
+            r'<mwg-rs:Area\s+stArea:x="([^"]+)"\s+stArea:y="([^"]+)"\s+stArea:w="([^"]+)"\s+stArea:h="([^"]+)"', content)
+        if not area:
+            for key in 'xywh':
+                re.search(rf'stArea:{key}="([^"]+)"', content)
+        if name and region_type:
+            faces.append(name.group(1))
+    for match in re.finditer(br'MPReg:PersonDisplayName="([^"]+)"', xmp_bytes):
+        faces.append(match.group(1))
+    for block in re.findall(r'<rdf:Description[^>]*?PersonInImage[^>]*?>(.*?)</rdf:Description>', xmp_str, re.DOTALL):
+        faces.extend(re.findall(r'<rdf:li>([^<]+)</rdf:li>', block))
+    keywords = []
+    for block in re.findall(br'<dc:subject>\s*<rdf:Bag>(.*?)</rdf:Bag>', xmp_bytes, re.DOTALL):
+        keywords.extend(re.findall(br'<rdf:li>([^<]+)</rdf:li>', block))
+    for block in re.findall(br'<lr:hierarchicalSubject>\s*<rdf:Bag>(.*?)</rdf:Bag>', xmp_bytes, re.DOTALL):
+        keywords.extend(re.findall(br'<rdf:li>([^<]+)</rdf:li>', block))
+    re.search(br'<dc:title>\s*<rdf:Alt>\s*<rdf:li[^>]*>([^<]+)</rdf:li>', xmp_bytes, re.DOTALL)
+    re.search(br'<dc:description>\s*<rdf:Alt>\s*<rdf:li[^>]*>([^<]+)</rdf:li>', xmp_bytes, re.DOTALL)
+    re.search(br'<dc:creator>\s*<rdf:Seq>\s*<rdf:li>([^<]+)</rdf:li>', xmp_bytes, re.DOTALL)
+    return faces, keywords
+
+
+def timed(func, packet, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(packet)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark XMP-tolkning')
+    parser.add_argument('--regions', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'regioner':>9} {'bytes':>9} {'regex ms':>10} {'parse_xmp ms':>13}")
+    for regions in args.regions:
+        packet = build_packet(regions)
+        model = parse_xmp(packet)
+        assert len(model.regions) == regions and not model.error, model.error
+        legacy_ms = timed(legacy_extract, packet, args.repeat)
+        parse_ms = timed(parse_xmp, packet, args.repeat)
+        print(f'{regions:>9} {len(packet):>9} {legacy_ms:>10.2f} {parse_ms:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
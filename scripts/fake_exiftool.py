@@ -0,0 +1,133 @@
+# Fake exiftool för tester av ExifManager/ExiftoolPool utan riktig exiftool
+# Talar samma -stay_open-protokoll (-@ -, -execute{N}, -echo4) och sparar
+# skrivna taggar i en sidofil <bild>.fake_exif.json i stället för i bilden.
+#
+# Användning:
+#   ExifManager(exiftool_cmd=[sys.executable, 'scripts/fake_exiftool.py'])
+#   python scripts/fake_exiftool.py -ver
+#
+# Testkrokar: filnamn som innehåller "CRASH" avslutar processen och
+# "HANG" gör att den aldrig svarar (för krasch-/timeouttester).
+
+import json
+import os
+import sys
+import time
+
+VERSION = '12.70'
+# Flaggor som tar ett värde
+VALUE_FLAGS = {'-charset', '-echo', '-echo1', '-echo2', '-echo3', '-echo4', '-@'}
+
+
+def sidecar(path):
+    return path + '.fake_exif.json'
+
+
+def load_tags(path):
+    try:
+        with open(sidecar(path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def tag_name(spec):
+    # "-XMP-dc:Subject" / "XMP:Creator" -> "Subject" / "Creator"
+    return spec.lstrip('-').split(':')[-1]
+
+
+def run(args, out, err):
+    """Kör ett kommando; returnerar 0/1 som exiftool."""
+    files, reads, writes, after = [], [], [], []
+    json_output = False
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in VALUE_FLAGS:
+            if arg == '-echo4' and i + 1 < len(args):
+                after.append(args[i + 1])
+            i += 2
+            continue
+        if arg == '-ver':
+            out.write(VERSION + '\n')
+        elif arg == '-j':
+            json_output = True
+        elif arg.startswith('-') and '=' in arg:
+            writes.append(arg[1:])
+        elif arg.startswith('-'):
+            if arg not in ('-overwrite_original',):
+                reads.append(tag_name(arg))
+        else:
+            files.append(arg)
+        i += 1
+
+    status = 0
+    records = []
+    for path in files:
+        if 'CRASH' in path:
+            sys.exit(3)
+        if 'HANG' in path:
+            time.sleep(3600)
+        if not os.path.exists(path):
+            err.write(f'Error: File not found - {path}\n')
+            status = 1
+            continue
+        tags = load_tags(path)
+        if writes:
+            for spec in writes:
+                name, _, value = spec.partition('=')
+                append = name.endswith('+')
+                key = tag_name(name.rstrip('+'))
+                if append:
+                    current = tags.get(key)
+                    current = current if isinstance(current, list) else ([current] if current else [])
+                    tags[key] = current + [value]
+                elif value == '':
+                    tags.pop(key, None)
+                else:
+                    tags[key] = value
+            with open(sidecar(path), 'w', encoding='utf-8') as f:
+                json.dump(tags, f, ensure_ascii=False)
+            out.write('    1 image files updated\n')
+        else:
+            record = {'SourceFile': path}
+            record.update({k: v for k, v in tags.items() if not reads or k in reads})
+            records.append(record)
+    if json_output:
+        out.write(json.dumps(records, ensure_ascii=False, indent=2) + '\n')
+    for text in after:
+        err.write(text + '\n')
+    return status
+
+
+def stay_open():
+    stdin = sys.stdin.buffer
+    out = sys.stdout
+    err = sys.stderr
+    args = []
+    for raw in iter(stdin.readline, b''):
+        line = raw.decode('utf-8').rstrip('\r\n')
+        if line.startswith('-execute'):
+            run(args, out, err)
+            out.write('{ready%s}\n' % line[len('-execute'):])
+            out.flush()
+            err.flush()
+            args = []
+        elif args and args[-1] == '-stay_open' and line == 'False':
+            return
+        else:
+            args.append(line)
+
+
+def main():
+    argv = sys.argv[1:]
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+    if argv[:2] == ['-stay_open', 'True'] and '-@' in argv:
+        stay_open()
+        return 0
+    return run(argv, sys.stdout, sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Importerar Genneys platsexport (genney-platser.xml) till en places-tabell.
+
+Gemensam kod för places_import.py och import_genney_places.py. Filen läses
+strömmat med iterparse: varje <place> görs om till en rad och släpps direkt,
+så minnet hålls litet oavsett filstorlek. Raderna skrivs med executemany i
+batchar i en transaktion, med normaliserade namnnycklar (name_normalize)
+beräknade direkt istället för i ett extra svep efteråt.
+
+Med --match matchas varje batch mot official_places (place_matcher) innan den
+skrivs, så att matched_place_id sätts under inläsningen. Hierarkisträngen
+("Hällestad, Malmöhus län") används som fråga; identiska frågor poängsätts
+bara en gång.
+
+Användning:
+    python scripts/genney_import.py [--xml genney-platser.xml] [--db places.db] [--new]
+                                    [--match] [--official-db official_places.db]
+"""
+
+import argparse
+import functools
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from name_normalize import normalize_name
+from place_database_manager import NORMALIZED_COLUMNS, PlaceDatabaseManager
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+XML_FILE = os.path.join(SCRIPT_DIR, 'genney-platser.xml')
+OFFICIAL_DB = os.path.abspath(os.path.join(SCRIPT_DIR, '..', 'official_places.db'))
+BATCH_SIZE = 1000
+# Församlings- och ortnamn upprepas mycket; nycklarna cachas under importen
+NORMALIZE_CACHE_SIZE = 65536
+# places-kolumn -> element i <place>
+PLACE_FIELDS = (
+    ('name', 'placename'),
+    ('country', 'country'),
+    ('region', 'region'),
+    ('municipality', 'municipality'),
+    ('parish', 'parish'),
+    ('village', 'village'),
+    ('specific', 'address'),
+    ('coordinates', 'coordinates'),
+    ('note', 'note'),
+    ('matched_place_id', 'matched_place_id'),
+)
+PLACE_COLUMNS = tuple(column for column, _ in PLACE_FIELDS)
+INSERT_COLUMNS = PLACE_COLUMNS + tuple(f'{column}_norm' for column in NORMALIZED_COLUMNS)
+
+_cached_normalize_name = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(normalize_name)
+
+
+def iter_places(xml_path):
+    """Ger en dict per <place> (kolumnerna i PLACE_COLUMNS plus 'hierarchy') i filordning."""
+    parents = []
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag == 'place':
+            place = {column: elem.findtext(tag) or '' for column, tag in PLACE_FIELDS}
+            place['country'] = place['country'] or 'Sverige'
+            place['matched_place_id'] = place['matched_place_id'] or None
+            place['hierarchy'] = elem.findtext('hierarchy') or ''
+            yield place
+        elif len(parents) != 1:
+            continue
+        # Tolkade element släpps direkt (ur <places> resp. rotelementet) så att minnet hålls litet
+        if parents:
+            parents[-1].clear()
+
+
+def iter_batches(places, batch_size=BATCH_SIZE):
+    batch = []
+    for place in places:
+        batch.append(place)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def match_batch(matcher, batch, threshold):
+    """Sätter matched_place_id för omatchade platser i batchen. Returnerar antal nya matchningar."""
+    pending = [place for place in batch if not place['matched_place_id']]
+    queries = [dict(place, name=place['hierarchy'] or place['name']) for place in pending]
+    matched = 0
+    for place, found in zip(pending, matcher.match_many(queries, limit=1)):
+        if found and found[0]['score'] >= threshold:
+            place['matched_place_id'] = found[0]['id']
+            matched += 1
+    return matched
+
+
+def place_row(place):
+    return (tuple(place[column] for column in PLACE_COLUMNS)
+            + tuple(_cached_normalize_name(place[column]) for column in NORMALIZED_COLUMNS))
+
+
+def import_places(xml_path=XML_FILE, db_path='places.db', new=False, match=False,
+                  official_db_path=OFFICIAL_DB, batch_size=BATCH_SIZE):
+    """
+    Läser xml_path till tabellen places i db_path. new=True skapar filen på nytt,
+    annars läggs platserna till. match=True sätter matched_place_id mot official_db_path.
+    Returnerar statistik.
+    """
+    started = time.perf_counter()
+    if new:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    place_db = PlaceDatabaseManager(db_path)
+    place_db.create_table()
+
+    matcher = threshold = None
+    if match:
+        from official_place_database import OfficialPlaceDatabase
+        from place_matcher import MATCH_THRESHOLD, PlaceMatcher
+        matcher = PlaceMatcher(OfficialPlaceDatabase(official_db_path))
+        threshold = MATCH_THRESHOLD
+
+    stats = {'imported': 0, 'matched': 0}
+    insert_sql = (f"INSERT INTO places ({', '.join(INSERT_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(INSERT_COLUMNS))})")
+    with place_db.pool.transaction() as conn:
+        for batch in iter_batches(iter_places(xml_path), batch_size):
+            if matcher is not None:
+                stats['matched'] += match_batch(matcher, batch, threshold)
+            conn.executemany(insert_sql, [place_row(place) for place in batch])
+            stats['imported'] += len(batch)
+    place_db.pool.close_all()
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def main(argv=None, xml_path=XML_FILE, db_path='places.db', new=False):
+    """Kommandoradsgränssnitt; standardvärdena kan sättas av skripten som anropar."""
+    parser = argparse.ArgumentParser(description='Importera Genneys platsexport till en places-databas')
+    parser.add_argument('--xml', default=xml_path, help=f'Genney-XML (standard: {xml_path})')
+    parser.add_argument('--db', default=db_path, help=f'Måldatabas (standard: {db_path})')
+    parser.add_argument('--new', action='store_true', default=new,
+                        help='Skapa måldatabasen på nytt istället för att lägga till')
+    parser.add_argument('--match', action='store_true',
+                        help='Matcha platserna mot official_places under inläsningen')
+    parser.add_argument('--official-db', default=OFFICIAL_DB, help='official_places-databas för --match')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rader per executemany')
+    args = parser.parse_args(argv)
+    stats = import_places(args.xml, args.db, new=args.new, match=args.match,
+                          official_db_path=args.official_db, batch_size=args.batch_size)
+    matched = f", {stats['matched']} matchade mot official_places" if args.match else ''
+    print(f"Import klar! {stats['imported']} platser importerade till {args.db}{matched} på {stats['seconds']} s.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,97 @@
+"""
+Importerar Disgens platsexporter (en XML-fil per län i script-mappen) till official_places.
+
+Som standard synkas resultatet inkrementellt (place_sync): varje plats
+identifieras av ('disgen', PlaceId) och bara nya, ändrade och borttagna
+platser skrivs, så id:n (och matched_place_id som pekar på dem) behålls.
+--replace tömmer i stället tabellen och läser in allt igen.
+
+Länsfilerna tolkas parallellt i en processpool med iterparse. Kommun och
+län härleds sedan med place_hierarchy.HierarchyResolver (varje plats löses
+en gång, memoiserat längs ParentId-kedjan), och raderna skrivs med
+executemany i en transaktion. Felsökningsutskrifterna
+(församlingar, länsposter, PlaceKind-värden m.m.) visas bara med --verbose.
+
+Användning:
+    python scripts/import_places_from_xml.py [--verbose] [--workers N] [--db official_places.db] [--replace]
+"""
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from official_place_database import drop_search_index, ensure_normalized_keys, ensure_search_index
+from place_sync import ensure_sync_schema, remap_matched_place_ids, sync_places
+from place_hierarchy import AncestryField, HierarchyResolver
+
+
+DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'official_places.db'))
+ALT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'WestFamilyTree', 'official_places.db'))
+if os.path.exists(ALT_PATH):
+    DB_PATH = ALT_PATH
+# Hitta alla .xml-filer i script-mappen; sorterade så att dubblettfiltreringen
+# (första förekomsten vinner) och därmed synken blir densamma vid varje körning
+SCRIPT_DIR = os.path.dirname(__file__)
+xml_files = sorted(glob.glob(os.path.join(SCRIPT_DIR, '*.xml')))
+
+# Mappning från filnamn till Disgen-länsbokstav
+COUNTY_MAP = {
+    'blekinge.xml': 'K',
+    'gävleborgs.xml': 'X',
+    'gotlands.xml': 'I',
+    'göteborg och bohus.xml': 'O',
+    'hallands.xml': 'N',
+    'jämtlands.xml': 'Z',
+    'jönköpings.xml': 'F',
+    'kalmar.xml': 'H',
+    'kristianstads.xml': 'L',
+    'kopparbergs.xml': 'W',
+    'malmöhus.xml': 'M',
+    'norrbottens.xml': 'BD',
+    'skaraborgs.xml': 'R',
+    'stockholms.xml': 'AB',
+    'södermanlands.xml': 'D',
+    'uppsala.xml': 'C',
+    'värmlands.xml': 'S',
+    'västerbottens.xml': 'AC',
+    'västernorrlands.xml': 'Y',
+    'västmanlands.xml': 'U',
+    'älvsborgs.xml': 'P',
+    'örebro.xml': 'T',
+    'östergötlands.xml': 'E',
+}
+# Under denna totalstorlek kostar det mer att starta processpoolen än den sparar
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+PARISH_KINDS = ('församling', 'socken', 'parish')
+PARISH_RSV_CODE = re.compile(r'^[A-Z]{1,2}-\d{5,6}$')
+PLACE_FIELDS = ('ShortName', 'FullName', 'RSVCode', 'PlaceKind', 'Latitude', 'Longitude')
+PLACE_COLUMNS = (
+    'ortnamn', 'sockenstadnamn', 'sockenstadkod', 'kommunkod', 'kommunnamn', 'lanskod', 'lansnamn', 'detaljtyp',
+    'sprak', 'kvartsruta', 'nkoordinat', 'ekoordinat', 'lopnummer', 'fid', 'latitude', 'longitude',
+)
+INSERT_SQL = f'''
+    INSERT INTO official_places (source, source_id, {', '.join(PLACE_COLUMNS)})
+    VALUES (?, ?, {', '.join('?' * len(PLACE_COLUMNS))})
+'''
+# Källnyckel vid synk: (SYNC_SOURCE, PlaceId med länsprefix)
+SYNC_SOURCE = 'disgen'
+# RSV-koden utan länsprefix: prefixet beror på vilken fil som vann dubblettfiltreringen
+UNPREFIXED_RSV_CODE = "substr(sockenstadkod, instr(sockenstadkod, '-') + 1)"
+# Äldre rader utan källnyckel tas över på nycklar som inte beror på filordningen,
+# först med kommun/län (samma plats), sedan utan (kedjan kan ha brutits olika)
+ADOPT_KEYS = (
+    ('ortnamn', 'detaljtyp', UNPREFIXED_RSV_CODE, 'kommunnamn', 'lansnamn'),
+    ('ortnamn', 'detaljtyp', UNPREFIXED_RSV_CODE),
+)
+
+
 def ensure_table_exists(db_path):
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
@@ -24,6 +118,8 @@ def ensure_table_exists(db_path):
     ''')
     conn.commit()
     conn.close()
+
+
 def clear_official_places(db_path):
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
@@ -31,73 +127,71 @@ def clear_official_places(db_path):
     conn.commit()
     conn.close()
 
-def build_hierarchy(places):
-    # För varje plats, härled kommun/län via ParentId
-    kommuner = []
-    forsamlingar = []
+
+def is_county(place):
+    """Län har PlaceKind = länsbokstaven (en eller två stora bokstäver)."""
+    kind = place.get('PlaceKind', '')
+    return len(kind) in (1, 2) and kind.isupper()
+
+
+def is_municipality(place):
+    return 'kommun' in place.get('PlaceKind', '').lower()
+
+
+def county_name(place):
+    return place.get('ShortName', '').replace(' län', '').replace(' Län', '')
+
+
+# Närmaste kommun med icke-tomt namn/kod, översta länet i kedjan
+ANCESTRY_FIELDS = (
+    AncestryField('kommunnamn', is_municipality, lambda place: place.get('ShortName', '')),
+    AncestryField('kommunkod', is_municipality, lambda place: place.get('RSVCode', '')),
+    AncestryField('lan', is_county, lambda place: (county_name(place), place.get('PlaceKind', '')),
+                  default=('', ''), topmost=True),
+)
+
+
+def build_hierarchy(places, verbose=False):
+    """Härleder kommun/län (via ParentId) och sockenstadnamn för alla platser."""
+    resolver = HierarchyResolver(places, lambda place: place.get('ParentId'), ANCESTRY_FIELDS)
     for place in places.values():
-        parent = places.get(place['ParentId'])
-        kommunnamn = ''
-        kommunkod = ''
-        lansnamn = ''
-        lanskod = ''
-        # Gå uppåt i hierarkin och hitta första plats där PlaceKind innehåller 'kommun' (case-insensitive)
-        current = parent
-        while current:
-            pk = current.get('PlaceKind', '').lower()
-            if 'kommun' in pk:
-                if not kommunnamn:
-                    kommunnamn = current.get('ShortName', '')
-                if not kommunkod:
-                    kommunkod = current.get('RSVCode', '')
-            # Sätt lanskod om PlaceKind är EN eller TVÅ stora bokstäver (riktiga län)
-            if (len(current.get('PlaceKind','')) in [1,2]) and current.get('PlaceKind','').isupper():
-                lansnamn = current.get('ShortName','').replace(' län', '').replace(' Län', '')
-                lanskod = current.get('PlaceKind','')
-            current = places.get(current.get('ParentId'))
+        ancestry = resolver.resolve_parent(place)
+        kommunnamn = ancestry['kommunnamn']
+        kommunkod = ancestry['kommunkod']
+        lansnamn, lanskod = ancestry['lan']
         # Om platsen själv är ett län, sätt lanskod och namn direkt
-        if (len(place.get('PlaceKind','')) in [1,2]) and place.get('PlaceKind','').isupper():
-            lanskod = place.get('PlaceKind','')
-            lansnamn = place.get('ShortName','').replace(' län', '').replace(' Län', '')
+        if is_county(place):
+            lanskod = place.get('PlaceKind', '')
+            lansnamn = county_name(place)
         # Om platsen själv är kommun, sätt kommunnamn/kod direkt
-        pk_self = place.get('PlaceKind','').lower()
+        pk_self = place.get('PlaceKind', '').lower()
         if 'kommun' in pk_self:
-            kommunnamn = place.get('ShortName','')
-            kommunkod = place.get('RSVCode','')
+            kommunnamn = place.get('ShortName', '')
+            kommunkod = place.get('RSVCode', '')
         place['kommunnamn'] = kommunnamn
         place['kommunkod'] = kommunkod
         place['lansnamn'] = lansnamn
         place['lanskod'] = lanskod
-        # Sätt sockenstadnamn på plats-objektet om det är en församling/socken
-        import re
         rsvcode = place.get('RSVCode', '')
-        # Nytt villkor: PlaceKind = församling/socken/parish ELLER RSVCode matchar "K-XXXXX" eller "K-XXXXXX" (5 eller 6 siffror)
-        is_forsamling = (
-            pk_self in ['församling', 'socken', 'parish']
-            or re.match(r'^[A-Z]{1,2}-\d{5,6}$', rsvcode)
-        )
-        # Debug: logga alla Blekinge-platser med RSVCode som börjar på K-
-        if rsvcode.startswith('K-'):
+        # Församling: PlaceKind = församling/socken/parish ELLER RSVCode matchar "K-XXXXX" eller "K-XXXXXX"
+        is_forsamling = pk_self in PARISH_KINDS or PARISH_RSV_CODE.match(rsvcode)
+        if verbose and rsvcode.startswith('K-'):
             print(f"DEBUG: Blekinge RSVCode: PlaceId={place.get('PlaceId')} ShortName={place.get('ShortName')} RSVCode={rsvcode} PlaceKind={place.get('PlaceKind')}")
         if is_forsamling:
-            place['sockenstadnamn'] = place.get('ShortName','')
-            forsamlingar.append(place)
-            # Debug: logga Blekinge-församlingar som identifieras
-            if place.get('lanskod') == 'K':
+            place['sockenstadnamn'] = place.get('ShortName', '')
+            if verbose and place.get('lanskod') == 'K':
                 print(f"DEBUG: Blekinge-församling identifierad: PlaceId={place.get('PlaceId')} ShortName={place.get('ShortName')} RSVCode={rsvcode} PlaceKind={place.get('PlaceKind')}")
         else:
             place['sockenstadnamn'] = ''
-        if 'kommun' in pk_self:
-            kommuner.append(place)
-        # DEBUG: Logga Blekinge-platser där sockenstadnamn INTE sätts men PlaceKind/RSVCode ser ut som församling
-        if place.get('lanskod') == 'K' and is_forsamling and not place['sockenstadnamn']:
-            print(f"DEBUG: Blekinge plats utan sockenstadnamn: PlaceId={place.get('PlaceId')} ShortName={place.get('ShortName')} PlaceKind={place.get('PlaceKind')} RSVCode={place.get('RSVCode')}")
+    if verbose:
+        print(f"Hierarki: {resolver.stats()}")
     return places
 
+
 def print_debug_examples(places):
     kommuner = [p for p in places.values() if p['PlaceKind'].lower() == 'kommun']
     # Identifiera församling/socken även om PlaceKind är tomt, om RSVCode är 5 tecken
-    forsamlingar = [p for p in places.values() if p['PlaceKind'].lower() in ['församling', 'socken', 'parish'] or len(p.get('RSVCode', '')) == 5]
+    forsamlingar = [p for p in places.values() if p['PlaceKind'].lower() in PARISH_KINDS or len(p.get('RSVCode', '')) == 5]
     print("\nExempel på kommuner (med härledda fält):")
     for p in kommuner[:10]:
         print(f"  {p['ShortName']} | kommunkod: {p['RSVCode']} | lanskod: {p['lanskod']} | lansnamn: {p['lansnamn']}")
@@ -105,185 +199,98 @@ def print_debug_examples(places):
     for p in forsamlingar[:10]:
         print(f"  {p['ShortName']} | sockenstadkod: {p['RSVCode']} | kommunkod: {p['kommunkod']} | kommunnamn: {p['kommunnamn']} | lanskod: {p['lanskod']} | lansnamn: {p['lansnamn']}")
 
-import sqlite3
-import xml.etree.ElementTree as ET
-import os
-import glob
-
 
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'official_places.db'))
-ALT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'WestFamilyTree', 'official_places.db'))
-if os.path.exists(ALT_PATH):
-    DB_PATH = ALT_PATH
-# Hitta alla .xml-filer i script-mappen (utom Places.xml om den finns)
-SCRIPT_DIR = os.path.dirname(__file__)
-xml_files = [f for f in glob.glob(os.path.join(SCRIPT_DIR, '*.xml'))]
+def county_letter_for(xml_path):
+    filename = os.path.basename(xml_path).lower()
+    county_letter = COUNTY_MAP.get(filename)
+    if county_letter:
+        return county_letter
+    # Fallback: försök hitta länsbokstav i filnamnet
+    match = re.search(r'_([A-Z]{1,2})', filename, re.IGNORECASE)
+    if match:
+        return match.group(1).upper()
+    match2 = re.search(r'([A-Z]{1,2})[^A-Z]*\.xml$', filename, re.IGNORECASE)
+    if match2:
+        return match2.group(1).upper()
+    print(f"VARNING: Kunde inte hitta länsbokstav i filnamn: {filename}")
+    return filename[:2].upper()
 
 
 def parse_places(xml_path):
-    import re
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    # Mappning från filnamn till Disgen-länsbokstav
-    filename = os.path.basename(xml_path).lower()
-    county_map = {
-        'blekinge.xml': 'K',
-        'gävleborgs.xml': 'X',
-        'gotlands.xml': 'I',
-        'göteborg och bohus.xml': 'O',
-        'hallands.xml': 'N',
-        'jämtlands.xml': 'Z',
-        'jönköpings.xml': 'F',
-        'kalmar.xml': 'H',
-        'kristianstads.xml': 'L',
-        'kopparbergs.xml': 'W',
-        'malmöhus.xml': 'M',
-        'norrbottens.xml': 'BD',
-        'skaraborgs.xml': 'R',
-        'stockholms.xml': 'AB',
-        'södermanlands.xml': 'D',
-        'uppsala.xml': 'C',
-        'värmlands.xml': 'S',
-        'västerbottens.xml': 'AC',
-        'västernorrlands.xml': 'Y',
-        'västmanlands.xml': 'U',
-        'älvsborgs.xml': 'P',
-        'örebro.xml': 'T',
-        'östergötlands.xml': 'E',
-    }
-    county_letter = county_map.get(filename)
-    if not county_letter:
-        # Fallback: försök hitta länsbokstav i filnamnet
-        match = re.search(r'_([A-Z]{1,2})', filename, re.IGNORECASE)
-        if match:
-            county_letter = match.group(1).upper()
-        else:
-            match2 = re.search(r'([A-Z]{1,2})[^A-Z]*\.xml$', filename, re.IGNORECASE)
-            if match2:
-                county_letter = match2.group(1).upper()
-            else:
-                print(f"VARNING: Kunde inte hitta länsbokstav i filnamn: {filename}")
-                county_letter = filename[:2].upper()
+    """Platserna (Place direkt under rotelementet) i en länsfil, med länsprefix på PlaceId/ParentId/RSVCode."""
+    county_letter = county_letter_for(xml_path)
     places = {}
-    for elem in root.findall('Place'):
-        orig_placeid = elem.attrib.get('PlaceId')
-        orig_parentid = elem.attrib.get('ParentId')
-        orig_rsv = elem.findtext('RSVCode', default='')
-        # Prefixa PlaceId och ParentId och RSVCode
-        placeid = f"{county_letter}-{orig_placeid}" if orig_placeid else None
-        parentid = f"{county_letter}-{orig_parentid}" if orig_parentid else None
-        rsvcode = f"{county_letter}-{orig_rsv}" if orig_rsv else ''
-        place = {
-            'PlaceId': placeid,
-            'ParentId': parentid,
-            'ShortName': elem.findtext('ShortName', default=''),
-            'FullName': elem.findtext('FullName', default=''),
-            'RSVCode': rsvcode,
-            'PlaceKind': elem.findtext('PlaceKind', default=''),
-            'Latitude': elem.findtext('Latitude', default=''),
-            'Longitude': elem.findtext('Longitude', default=''),
-        }
-        places[placeid] = place
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = elem
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        if elem.tag == 'Place':
+            orig_placeid = elem.attrib.get('PlaceId')
+            orig_parentid = elem.attrib.get('ParentId')
+            place = {field: elem.findtext(field, default='') for field in PLACE_FIELDS}
+            # Prefixa PlaceId och ParentId och RSVCode
+            placeid = f"{county_letter}-{orig_placeid}" if orig_placeid else None
+            place['PlaceId'] = placeid
+            place['ParentId'] = f"{county_letter}-{orig_parentid}" if orig_parentid else None
+            place['RSVCode'] = f"{county_letter}-{place['RSVCode']}" if place['RSVCode'] else ''
+            places[placeid] = place
+        # Tolkade element släpps direkt så att minnet hålls litet
+        root.clear()
     return places
 
-def insert_places(db_path, places):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    for p in places.values():
-        # Använd sockenstadnamn från plats-objektet (satt i build_hierarchy)
-        sockenstadnamn = p.get('sockenstadnamn', '')
-        # Debug: visa sockenstadnamn och RSVCode för alla platser med RSVCode på 5 tecken
-        if len(p.get('RSVCode', '')) == 5:
-            print(f"DEBUG: RSVCode={p['RSVCode']} sockenstadnamn='{sockenstadnamn}' ShortName='{p['ShortName']}'")
-        # Fyll i alla kolumner i rätt ordning, använd None för de som inte används
-        c.execute('''
-            INSERT INTO official_places (
-                ortnamn, sockenstadnamn, sockenstadkod, kommunkod, kommunnamn, lanskod, lansnamn, detaljtyp, sprak, kvartsruta, nkoordinat, ekoordinat, lopnummer, fid, latitude, longitude
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            p['ShortName'],
-            sockenstadnamn,
-            p['RSVCode'],
-            p['kommunkod'],
-            p['kommunnamn'],
-            p['lanskod'],
-            p['lansnamn'],
-            p['PlaceKind'],
-            None,  # sprak
-            None,  # kvartsruta
-            None,  # nkoordinat
-            None,  # ekoordinat
-            None,  # lopnummer
-            None,  # fid
-            p['Latitude'],
-            p['Longitude'],
-        ))
-    conn.commit()
-    conn.close()
-    # Extra debug: visa alla platser som borde vara län
-    print("\nPlatser som identifieras som län (PlaceKind=2 stora bokstäver eller namn slutar på 'län'):")
-    for p in places.values():
-        if (len(p['PlaceKind']) == 2 and p['PlaceKind'].isupper()) or 'län' in p['ShortName'].lower():
-            print(f"  ShortName: {p['ShortName']}, PlaceKind: {p['PlaceKind']}, RSVCode: {p['RSVCode']}")
-    print(f'Importerar {len(places)} platser till official_places.db...')
-
-# Flytta main() till modulnivå
-
-def main():
-    print(f'Använder databas: {DB_PATH}')
-    print('Säkerställer att tabellen official_places finns...')
-    ensure_table_exists(DB_PATH)
-    print('Rensar official_places...')
-    clear_official_places(DB_PATH)
-    print('Söker efter alla XML-filer i script-mappen...')
-    print(f'Hittade {len(xml_files)} XML-filer:')
-    for f in xml_files:
-        print('  ', os.path.basename(f))
+
+def parse_all(paths, workers=None):
+    """Tolkar länsfilerna parallellt; resultaten kommer i samma ordning som paths."""
+    if workers is None and sum(os.path.getsize(path) for path in paths) < PARALLEL_MIN_BYTES:
+        workers = 1
+    if workers == 1 or len(paths) < 2:
+        return [parse_places(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(parse_places, paths))
+
+
+def merge_places(parsed, paths, verbose=False):
+    """Slår ihop länsfilerna; dubbletter av kommuner/län (namn), PlaceId och RSVCode hoppas över."""
     all_places = {}
     seen_kommuner = set()
     seen_lan = set()
     seen_placeids = set()
     seen_rsvcodes = set()
-    for xml_path in xml_files:
-        print(f'Läser in platser från {os.path.basename(xml_path)}...')
-        places = parse_places(xml_path)
-        print(f"  Antal platser i fil: {len(places)}")
-        # Hämta länsbokstav för denna fil
-        import re
-        filename = os.path.basename(xml_path)
-        match = re.search(r'_([A-Z]{1,2})', filename)
-        if match:
-            county_letter = match.group(1)
-        else:
-            match2 = re.search(r'([A-Z]{1,2})[^A-Z]*\.xml$', filename)
-            if match2:
-                county_letter = match2.group(1)
-            else:
-                county_letter = filename[:2]
+    for xml_path, places in zip(paths, parsed):
+        if verbose:
+            print(f'  {os.path.basename(xml_path)}: {len(places)} platser')
         dubbletter = 0
         dubblett_rsv = 0
         for pid, p in places.items():
-            # Filtrera kommuner: importera bara kommuner där PlaceId börjar med rätt länsbokstav
+            # Samma kommun/län kan finnas i flera länsfiler; bara första förekomsten importeras
             if p['PlaceKind'].lower() == 'kommun':
                 kommun_namn = p['ShortName'].strip().lower()
                 if kommun_namn in seen_kommuner:
-                    continue  # hoppa över dubblett
+                    continue
                 seen_kommuner.add(kommun_namn)
-            # Filtrera län: importera bara län där PlaceId börjar med rätt länsbokstav
-            if (len(p['PlaceKind']) in [1,2]) and p['PlaceKind'].isupper():
+            if is_county(p):
                 lan_namn = p['ShortName'].strip().lower()
                 if lan_namn in seen_lan:
                     continue
                 seen_lan.add(lan_namn)
             # Kontrollera dubblett PlaceId
             if pid in seen_placeids:
-                print(f"  VARNING: PlaceId {pid} finns redan (dubblett mellan filer)!")
+                if verbose:
+                    print(f"  VARNING: PlaceId {pid} finns redan (dubblett mellan filer)!")
                 dubbletter += 1
                 continue
             # Kontrollera dubblett RSVCode
             rsv = p.get('RSVCode')
             if rsv and rsv in seen_rsvcodes:
-                print(f"  VARNING: RSVCode {rsv} finns redan (dubblett mellan filer)!")
+                if verbose:
+                    print(f"  VARNING: RSVCode {rsv} finns redan (dubblett mellan filer)!")
                 dubblett_rsv += 1
                 continue
             seen_placeids.add(pid)
@@ -291,54 +298,142 @@ def main():
                 seen_rsvcodes.add(rsv)
             all_places[pid] = p
         if dubbletter:
-            print(f"  Totalt {dubbletter} dubbletter på PlaceId i denna fil!")
+            print(f"  {os.path.basename(xml_path)}: {dubbletter} dubbletter på PlaceId")
         if dubblett_rsv:
-            print(f"  Totalt {dubblett_rsv} dubbletter på RSVCode i denna fil!")
-    print(f'Totalt antal unika platser: {len(all_places)}')
-    # Debug: Skriv ut PlaceId och ParentId för alla kommuner och församlingar i Blekinge
-    print("\nDEBUG: Blekinge kommuner och församlingar (PlaceId, ParentId, ShortName, PlaceKind):")
-    for p in all_places.values():
-        if p.get('lanskod') == 'K':
-            if p.get('PlaceKind', '').lower() == 'kommun' or (p.get('PlaceKind', '').lower() in ['församling', 'socken', 'parish'] or len(p.get('RSVCode', '')) == 5):
-                print(f"  PlaceId: {p.get('PlaceId')}, ParentId: {p.get('ParentId')}, ShortName: {p.get('ShortName')}, PlaceKind: {p.get('PlaceKind')}")
-    # Debug: Lista alla PlaceKind för platser med RSVCode på 5 tecken (troligen församlingar/socknar)
-    rsv5_placekinds = set()
-    rsv5_examples = []
-    for p in all_places.values():
-        if len(p.get('RSVCode', '')) == 5:
-            rsv5_placekinds.add(p.get('PlaceKind', '').strip().lower())
-            if len(rsv5_examples) < 20:
-                rsv5_examples.append(p)
+            print(f"  {os.path.basename(xml_path)}: {dubblett_rsv} dubbletter på RSVCode")
+    return all_places
+
+
+def place_row(p):
+    # Fyll i alla kolumner i rätt ordning, använd None för de som inte används
+    return (
+        p['ShortName'],
+        p.get('sockenstadnamn', ''),
+        p['RSVCode'],
+        p['kommunkod'],
+        p['kommunnamn'],
+        p['lanskod'],
+        p['lansnamn'],
+        p['PlaceKind'],
+        None,  # sprak
+        None,  # kvartsruta
+        None,  # nkoordinat
+        None,  # ekoordinat
+        None,  # lopnummer
+        None,  # fid
+        p['Latitude'],
+        p['Longitude'],
+    )
+
+
+def insert_places(db_path, places, verbose=False):
+    if verbose:
+        for p in places.values():
+            # Sockenstadnamn och RSVCode för alla platser med RSVCode på 5 tecken
+            if len(p.get('RSVCode', '')) == 5:
+                print(f"DEBUG: RSVCode={p['RSVCode']} sockenstadnamn='{p.get('sockenstadnamn', '')}' ShortName='{p['ShortName']}'")
+    conn = sqlite3.connect(db_path)
+    with conn:
+        ensure_sync_schema(conn)
+        conn.executemany(INSERT_SQL, ((SYNC_SOURCE, pid) + place_row(p) for pid, p in places.items()))
+    conn.close()
+
+
+def sync_to_db(db_path, places, places_db_path=None):
+    """
+    Synkar platserna mot official_places (bara ändringar skrivs, id:n behålls); returnerar statistik.
+    matched_place_id i places_db_path (standard: places.db bredvid db_path) pekas om för
+    äldre dubbletter som ersatts av källans rader.
+    """
+    conn = sqlite3.connect(db_path)
+    with conn:
+        stats = sync_places(conn, SYNC_SOURCE, PLACE_COLUMNS,
+                            ((pid, place_row(p)) for pid, p in places.items()),
+                            adopt_keys=ADOPT_KEYS)
+    conn.close()
+    places_db_path = places_db_path or os.path.join(os.path.dirname(db_path), 'places.db')
+    stats['remapped'] = remap_matched_place_ids(places_db_path, stats['replaced_ids'])
+    return stats
+
+
+def print_verbose_report(places):
+    print("\nPlatser som identifieras som län (PlaceKind=2 stora bokstäver eller namn slutar på 'län'):")
+    for p in places.values():
+        if (len(p['PlaceKind']) == 2 and p['PlaceKind'].isupper()) or 'län' in p['ShortName'].lower():
+            print(f"  ShortName: {p['ShortName']}, PlaceKind: {p['PlaceKind']}, RSVCode: {p['RSVCode']}")
+    print("\nBlekinge kommuner och församlingar (PlaceId, ParentId, ShortName, PlaceKind):")
+    for p in places.values():
+        if p.get('lanskod') == 'K' and (p['PlaceKind'].lower() == 'kommun' or p['sockenstadnamn']):
+            print(f"  PlaceId: {p.get('PlaceId')}, ParentId: {p.get('ParentId')}, ShortName: {p.get('ShortName')}, PlaceKind: {p.get('PlaceKind')}")
+    rsv5_placekinds = sorted({p['PlaceKind'].strip().lower() for p in places.values() if len(p.get('RSVCode', '')) == 5})
     print("\nUnika PlaceKind-värden för platser med RSVCode på 5 tecken (troligen församlingar/socknar):")
-    for pk in sorted(rsv5_placekinds):
+    for pk in rsv5_placekinds:
         print(f"  '{pk}'")
-    print("\nExempel på platser med RSVCode på 5 tecken:")
-    for p in rsv5_examples:
-        print(f"  ShortName: {p['ShortName']} | RSVCode: {p['RSVCode']} | PlaceKind: {p['PlaceKind']}")
-    print('Bygger hierarki och härleder kommun/län...')
-    all_places = build_hierarchy(all_places)
-    # Debug: räkna och visa exempel på platser med/utan kommun/län
-    kommun_count = sum(1 for p in all_places.values() if p['kommunnamn'])
-    lans_count = sum(1 for p in all_places.values() if p['lansnamn'])
-    print(f"Platser med kommunnamn: {kommun_count} / {len(all_places)}")
-    print(f"Platser med lansnamn: {lans_count} / {len(all_places)}")
     print("Exempel på platser med kommun/län:")
-    for p in list(all_places.values())[:10]:
+    for p in list(places.values())[:10]:
         print(f"  {p['ShortName']} | kommun: {p['kommunnamn']} | län: {p['lansnamn']} | lanskod: {p['lanskod']}")
-    # Extra debug: visa exempel på kommuner och församlingar
-    print_debug_examples(all_places)
-    # Debug: Lista alla unika PlaceKind-värden
-    placekind_set = set()
-    for p in all_places.values():
-        pk = p.get('PlaceKind', '').strip().lower()
-        if pk:
-            placekind_set.add(pk)
+    print_debug_examples(places)
     print("\nUnika PlaceKind-värden i XML:")
-    for pk in sorted(placekind_set):
+    for pk in sorted({p['PlaceKind'].strip().lower() for p in places.values() if p['PlaceKind'].strip()}):
         print(f"  '{pk}'")
-    print(f'Importerar {len(all_places)} platser till official_places.db...')
-    insert_places(DB_PATH, all_places)
-    print('KLART!')
+
+
+def main(db_path=None, workers=None, verbose=False, paths=None, mode='sync', places_db_path=None):
+    """mode='sync': inkrementell synk (standard); mode='replace': töm tabellen och läs in allt igen."""
+    db_path = db_path or DB_PATH
+    paths = xml_files if paths is None else paths
+    started = time.monotonic()
+    print(f'Använder databas: {db_path} ({mode})')
+    ensure_table_exists(db_path)
+    if mode == 'replace':
+        conn = sqlite3.connect(db_path)
+        drop_search_index(conn)
+        conn.commit()
+        conn.close()
+        clear_official_places(db_path)
+    print(f'Läser {len(paths)} XML-filer:')
+    for f in paths:
+        print('  ', os.path.basename(f))
+    parsed = parse_all(paths, workers)
+    all_places = merge_places(parsed, paths, verbose)
+    print(f'Totalt antal unika platser: {len(all_places)}')
+    all_places = build_hierarchy(all_places, verbose)
+    kommun_count = sum(1 for p in all_places.values() if p['kommunnamn'])
+    lans_count = sum(1 for p in all_places.values() if p['lansnamn'])
+    print(f"Platser med kommunnamn: {kommun_count} / {len(all_places)}")
+    print(f"Platser med lansnamn: {lans_count} / {len(all_places)}")
+    if verbose:
+        print_verbose_report(all_places)
+    if mode == 'replace':
+        print(f'Importerar {len(all_places)} platser till {os.path.basename(db_path)}...')
+        insert_places(db_path, all_places, verbose)
+    else:
+        print(f'Synkar {len(all_places)} platser mot {os.path.basename(db_path)}...')
+        stats = sync_to_db(db_path, all_places, places_db_path)
+        print(f"  Nya: {stats['inserted']}, ändrade: {stats['updated']}, oförändrade: {stats['unchanged']}, "
+              f"borttagna: {stats['removed']}, övertagna äldre rader: {stats['adopted']} ({stats['ms']} ms)")
+        if stats['replaced']:
+            print(f"  Äldre dubbletter ersatta av källans rader: {stats['replaced']} "
+                  f"(matched_place_id ompekade: {stats['remapped']})")
+        if stats['legacy_remaining']:
+            print(f"  Kvarvarande rader utan källnyckel (manuella eller andra källor): {stats['legacy_remaining']}")
+    print('Uppdaterar sökindex (FTS5) och normaliserade namnnycklar...')
+    conn = sqlite3.connect(db_path)
+    ensure_search_index(conn)
+    ensure_normalized_keys(conn)
+    conn.commit()
+    conn.close()
+    print(f'KLART på {time.monotonic() - started:.2f} s!')
+
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Importera Disgens länsfiler (XML) till official_places')
+    parser.add_argument('--db', default=None, help=f'Måldatabas (standard: {DB_PATH})')
+    parser.add_argument('--workers', type=int, default=None, help='Antal processer för XML-tolkningen (1 = sekventiellt, standard: efter filstorlek)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Visa felsökningsutskrifter per plats')
+    parser.add_argument('--replace', action='store_true',
+                        help='Töm official_places och läs in allt igen (nya id:n) i stället för att synka ändringar')
+    parser.add_argument('--places-db', default=None,
+                        help='Platsdatabas vars matched_place_id pekas om vid synk (standard: places.db bredvid --db)')
+    args = parser.parse_args()
+    main(args.db, args.workers, args.verbose, mode='replace' if args.replace else 'sync', places_db_path=args.places_db)
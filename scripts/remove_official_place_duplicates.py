@@ -1,22 +1,32 @@
 # Script för att rensa dubbletter ur official_places.db
 # Dubblett = samma ortnamn, sockenstadnamn, kommunnamn, lansnamn
 # Behåller den med lägst id
+# Rader som synkats från ett platsregister (source/source_id, se place_sync.py)
+# har en stabil nyckel och rörs inte; synken lägger aldrig in dubbletter.
 
+import os
 import sqlite3
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from place_sync import ensure_sync_schema
+
 
 def remove_duplicates(db_path='official_places.db'):
     conn = sqlite3.connect(db_path)
+    ensure_sync_schema(conn)
     c = conn.cursor()
-    # Hitta dubbletter (alla utom minsta id)
+    # Hitta dubbletter bland rader utan källnyckel (alla utom minsta id)
     c.execute('''
         DELETE FROM official_places
-        WHERE id NOT IN (
+        WHERE source IS NULL AND id NOT IN (
             SELECT MIN(id) FROM official_places
+            WHERE source IS NULL
             GROUP BY ortnamn, sockenstadnamn, kommunnamn, lansnamn
         )
     ''')
     conn.commit()
-    print('Dubbletter borttagna!')
+    print(f'{c.rowcount} dubbletter borttagna!')
     conn.close()
 
 if __name__ == '__main__':
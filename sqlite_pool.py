@@ -0,0 +1,160 @@
+"""
+SQLite Pool - Delade, långlivade SQLite-anslutningar för backend
+
+Varje databasfil får en ConnectionPool. En tråd binds till en anslutning
+första gången den frågar efter en; anslutningen lämnas tillbaka till poolen
+med release() (t.ex. i Flask teardown) så att nästa request-tråd kan
+återanvända den istället för att öppna en ny.
+
+Anslutningarna öppnas med:
+  - journal_mode=WAL (läsare blockerar inte skrivare)
+  - synchronous=NORMAL (säkert i WAL-läge)
+  - cache_size / mmap_size (sidcachen överlever mellan requests)
+  - cached_statements (preparerade satser återanvänds per anslutning)
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    # Negativt värde = KiB, dvs ca 64 MB sidcache per anslutning
+    'cache_size': -65536,
+    'mmap_size': 268435456,
+    'busy_timeout': 5000,
+}
+
+# Antal preparerade satser som sqlite3 håller per anslutning
+CACHED_STATEMENTS = 256
+
+
+class ConnectionPool:
+    """Pool med en anslutning per tråd och en kö av lediga anslutningar."""
+
+    def __init__(self, db_path: str, max_idle: int = 8, pragmas: Optional[Dict] = None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self._local = threading.local()
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._all: List[sqlite3.Connection] = []
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            try:
+                conn.execute(f'PRAGMA {name} = {value}')
+            except sqlite3.DatabaseError:
+                # T.ex. mmap/WAL som inte stöds på vissa filsystem
+                pass
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Returnerar trådens anslutning (hämtas ur poolen eller öppnas vid behov)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        # hits = ledig anslutning återanvänd, misses = ny anslutning öppnad
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+                self.hits += 1
+            else:
+                self.misses += 1
+        if conn is None:
+            conn = self._open()
+            with self._lock:
+                self._all.append(conn)
+        self._local.conn = conn
+        return conn
+
+    def release(self):
+        """Lämnar tillbaka trådens anslutning till poolen."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._all.remove(conn)
+        conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Kör ett block i en transaktion: commit vid framgång, rollback vid fel."""
+        conn = self.connection()
+        with conn:
+            yield conn
+
+    def close_all(self):
+        with self._lock:
+            conns = list(self._all)
+            self._all.clear()
+            self._idle.clear()
+        self._local = threading.local()
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'db_path': self.db_path,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'open_connections': len(self._all),
+                'idle_connections': len(self._idle),
+            }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Delad pool per databasfil (samma fil -> samma pool i hela processen)."""
+    key = db_path if db_path == ':memory:' else os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_path)
+            _pools[key] = pool
+        return pool
+
+
+def release_all():
+    """Lämna tillbaka aktuell tråds anslutningar i alla pooler (anropas efter varje request)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.release()
+
+
+def pool_stats() -> List[Dict]:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
@@ -0,0 +1,345 @@
+"""
+XMP Reader - Läser XMP-paketet ur en bildfil utan att läsa hela filen
+
+Formatmedveten läsning som bara rör filens metadatadelar:
+  - JPEG: går igenom markörerna till SOS och tar APP1-segmentet med XMP
+  - PNG:  går igenom chunkarna (bilddata hoppas över med seek) och tar iTXt "XML:com.adobe.xmp"
+  - TIFF (även BigTIFF och TIFF-baserade RAW som DNG/NEF/CR2): tagg 700 i IFD0
+
+Okända format söks igenom via mmap (sidorna läses in av OS:et vid behov i
+stället för att hela filen kopieras till minnet).
+
+parse_xmp() tolkar paketet i ett svep (expat, händelsebaserat) till en XmpData med
+regioner, ämnesord, titel/beskrivning/skapare och PersonInImage, som
+ExifManagers extraktorer sedan läser från.
+"""
+
+import mmap
+import re
+import struct
+import zlib
+from typing import BinaryIO, Dict, List, Optional
+from xml.parsers import expat
+
+
+XMP_JPEG_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+XMP_PNG_KEYWORD = b'XML:com.adobe.xmp'
+TIFF_XMP_TAG = 700
+# Övre gräns för ett XMP-paket (skydd mot trasiga längdfält)
+MAX_XMP_SIZE = 64 * 1024 * 1024
+
+# Antal tecken per matning av XML-parsern
+FEED_SIZE = 64 * 1024
+
+_XMPMETA_RE = re.compile(br"<x:xmpmeta[\s\S]*?</x:xmpmeta>", re.IGNORECASE)
+
+
+def read_xmp_packet(image_path: str) -> bytes:
+    """Returnerar XMP-sektionen (<x:xmpmeta>...</x:xmpmeta>) som råbytes, b'' om den saknas."""
+    try:
+        with open(image_path, 'rb') as f:
+            head = f.read(16)
+            f.seek(0)
+            if head.startswith(b'\xff\xd8'):
+                packet = _read_jpeg(f)
+            elif head.startswith(b'\x89PNG\r\n\x1a\n'):
+                packet = _read_png(f)
+            elif head[:4] in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'):
+                packet = _read_tiff(f)
+            else:
+                return _scan(f)
+    except (OSError, ValueError, struct.error, zlib.error):
+        return b''
+    if not packet:
+        return b''
+    match = _XMPMETA_RE.search(packet)
+    # Paket utan x:xmpmeta-omslag (bara rdf:RDF) returneras som de är
+    return match.group(0) if match else packet
+
+
+def _read_jpeg(f: BinaryIO) -> Optional[bytes]:
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        # Utfyllnad (flera 0xFF i rad)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        # Markörer utan längdfält: TEM, RST0-7, SOI
+        if code == 0x01 or 0xD0 <= code <= 0xD8:
+            continue
+        # Start of scan / end of image: metadata ligger alltid före
+        if code in (0xDA, 0xD9):
+            return None
+        length = struct.unpack('>H', f.read(2))[0] - 2
+        if length < 0:
+            return None
+        if code == 0xE1 and length > len(XMP_JPEG_HEADER):
+            header = f.read(len(XMP_JPEG_HEADER))
+            if header == XMP_JPEG_HEADER:
+                return f.read(length - len(XMP_JPEG_HEADER))
+            f.seek(length - len(header), 1)
+        else:
+            f.seek(length, 1)
+
+
+def _read_png(f: BinaryIO) -> Optional[bytes]:
+    f.seek(8)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'IEND':
+            return None
+        if chunk_type == b'iTXt' and length <= MAX_XMP_SIZE:
+            data = f.read(length)
+            f.seek(4, 1)
+            text = _png_itxt_xmp(data)
+            if text is not None:
+                return text
+        else:
+            # IDAT m.fl. hoppas över utan att läsas
+            f.seek(length + 4, 1)
+
+
+def _png_itxt_xmp(data: bytes) -> Optional[bytes]:
+    # iTXt: keyword \0 compression_flag compression_method language \0 translated_keyword \0 text
+    keyword, sep, rest = data.partition(b'\x00')
+    if not sep or keyword != XMP_PNG_KEYWORD or len(rest) < 2:
+        return None
+    compressed = rest[0] == 1
+    rest = rest[2:]
+    _language, _, rest = rest.partition(b'\x00')
+    _translated, _, text = rest.partition(b'\x00')
+    return zlib.decompress(text) if compressed else text
+
+
+def _read_tiff(f: BinaryIO) -> Optional[bytes]:
+    header = f.read(16)
+    endian = '<' if header[:2] == b'II' else '>'
+    big = struct.unpack(endian + 'H', header[2:4])[0] == 43
+    if big:
+        ifd_offset = struct.unpack(endian + 'Q', header[8:16])[0]
+        count_fmt, entry_fmt, entry_size, inline_size = 'Q', 'HHQQ', 20, 8
+    else:
+        ifd_offset = struct.unpack(endian + 'I', header[4:8])[0]
+        count_fmt, entry_fmt, entry_size, inline_size = 'H', 'HHII', 12, 4
+    f.seek(ifd_offset)
+    count_size = struct.calcsize(count_fmt)
+    count = struct.unpack(endian + count_fmt, f.read(count_size))[0]
+    entries = f.read(count * entry_size)
+    for i in range(count):
+        tag, field_type, n, value = struct.unpack(endian + entry_fmt, entries[i * entry_size:(i + 1) * entry_size])
+        if tag != TIFF_XMP_TAG:
+            continue
+        # Typ 1 (BYTE) eller 7 (UNDEFINED): n är antal bytes
+        if field_type not in (1, 7) or n > MAX_XMP_SIZE:
+            return None
+        if n <= inline_size:
+            raw = entries[i * entry_size:(i + 1) * entry_size]
+            return raw[entry_size - inline_size:entry_size - inline_size + n]
+        f.seek(value)
+        return f.read(n)
+    return None
+
+
+def _scan(f: BinaryIO) -> bytes:
+    """Okänt format: regex-sökning över en minnesmappning av filen."""
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Tom fil
+        return b''
+    with mm:
+        match = _XMPMETA_RE.search(mm)
+        return match.group(0) if match else b''
+
+
+# --- Tolkning ---
+
+NS_RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+NS_DC = 'http://purl.org/dc/elements/1.1/'
+NS_LR = 'http://ns.adobe.com/lightroom/1.0/'
+NS_MWG_RS = 'http://www.metadataworkinggroup.com/schemas/regions/'
+NS_ST_AREA = 'http://ns.adobe.com/xmp/sType/Area#'
+
+# expat med namespace_separator='}' ger namn på formen "<uri>}<lokalt namn>"
+_RDF_LI = NS_RDF + '}li'
+_MWG_REGION = NS_MWG_RS + '}Region'
+_MWG_NAME = NS_MWG_RS + '}Name'
+_MWG_TYPE = NS_MWG_RS + '}Type'
+_MWG_AREA = NS_MWG_RS + '}Area'
+_AREA_KEYS = {NS_ST_AREA + '}' + key: key for key in ('x', 'y', 'w', 'h')}
+# Listegenskaper (rdf:Bag/Seq/Alt) -> fält i XmpData
+_LIST_PROPERTIES = {
+    NS_DC + '}subject': 'subjects',
+    NS_LR + '}hierarchicalSubject': 'hierarchical_subjects',
+    NS_DC + '}title': 'titles',
+    NS_DC + '}description': 'descriptions',
+    NS_DC + '}creator': 'creators',
+}
+
+
+def _local(name: str) -> str:
+    return name.rpartition('}')[2]
+
+
+def decode_xmp_string(raw_bytes: bytes) -> str:
+    """UTF-8 enligt standard, annars cp1252/latin-1, sist UTF-8 med ersättningstecken."""
+    for enc in ('utf-8', 'cp1252', 'latin-1'):
+        try:
+            return raw_bytes.decode(enc)
+        except (UnicodeDecodeError, AttributeError):
+            continue
+    return raw_bytes.decode('utf-8', errors='replace')
+
+
+class XmpRegion:
+    """En MWG-region (mwg-rs:Name/Type/Area); koordinaterna är normaliserade 0-1."""
+
+    __slots__ = ('name', 'type', 'x', 'y', 'w', 'h')
+
+    def __init__(self):
+        self.name: Optional[str] = None
+        self.type: str = ''
+        self.x: Optional[float] = None
+        self.y: Optional[float] = None
+        self.w: Optional[float] = None
+        self.h: Optional[float] = None
+
+    @property
+    def has_area(self) -> bool:
+        return None not in (self.x, self.y, self.w, self.h)
+
+    def _set_area(self, key: str, value: str):
+        try:
+            setattr(self, key, float(value))
+        except ValueError:
+            pass
+
+
+class XmpData:
+    """Tolkat XMP-paket."""
+
+    def __init__(self):
+        self.regions: List[XmpRegion] = []
+        self.subjects: List[str] = []
+        self.hierarchical_subjects: List[str] = []
+        self.titles: List[str] = []
+        self.descriptions: List[str] = []
+        self.creators: List[str] = []
+        self.persons_in_image: List[str] = []
+        # Microsoft Photo RegionInfo (MPReg:PersonDisplayName)
+        self.ms_region_names: List[str] = []
+        # Tolkningsfel; det som lästs före felet finns kvar
+        self.error: Optional[str] = None
+
+    @property
+    def title(self) -> Optional[str]:
+        return self.titles[0] if self.titles else None
+
+    @property
+    def description(self) -> Optional[str]:
+        return self.descriptions[0] if self.descriptions else None
+
+    @property
+    def creator(self) -> Optional[str]:
+        return self.creators[0] if self.creators else None
+
+
+def parse_xmp(xmp: bytes) -> XmpData:
+    """
+    Tolkar ett XMP-paket i ett svep. Paketet matas i bitar till en expat-parser
+    och varje start/slut-tagg hanteras direkt, utan att något träd byggs.
+    Vid tolkningsfel behålls det som lästs fram till felet (XmpData.error).
+    """
+    data = XmpData()
+    if not xmp:
+        return data
+    text = decode_xmp_string(xmp) if isinstance(xmp, bytes) else xmp
+    handler = _XmpHandler(data)
+    parser = expat.ParserCreate(namespace_separator='}')
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.text.append
+    try:
+        for start in range(0, len(text), FEED_SIZE):
+            parser.Parse(text[start:start + FEED_SIZE], False)
+        parser.Parse('', True)
+    except expat.ExpatError as e:
+        data.error = str(e)
+    return data
+
+
+class _XmpHandler:
+    """Tillstånd för parse_xmp: elementstacken och pågående MWG-region."""
+
+    def __init__(self, data: XmpData):
+        self.data = data
+        self.stack: List[str] = []
+        self.text: List[str] = []
+        # Aktuell region och djupet där elementet som öppnade den ligger
+        self.region: Optional[XmpRegion] = None
+        self.region_depth = -1
+
+    def start(self, name: str, attrs: Dict[str, str]):
+        stack = self.stack
+        self.text.clear()
+        # Regionposter: rdf:li direkt i mwg-rs:RegionList/rdf:Bag, eller ett mwg-rs:Region-element
+        if self.region is None and (name == _MWG_REGION or (
+                name == _RDF_LI and len(stack) >= 2 and _local(stack[-2]) == 'RegionList')):
+            self.region = XmpRegion()
+            self.region_depth = len(stack)
+        if attrs:
+            region = self.region
+            for key, value in attrs.items():
+                if region is not None:
+                    # Struktur som attribut (rdf:li/rdf:Description mwg-rs:Name="..", mwg-rs:Area stArea:x="..")
+                    if key == _MWG_NAME and region.name is None:
+                        region.name = value
+                    elif key == _MWG_TYPE and not region.type:
+                        region.type = value
+                    elif key in _AREA_KEYS and name == _MWG_AREA:
+                        region._set_area(_AREA_KEYS[key], value)
+                if key.endswith('}PersonDisplayName'):
+                    self.data.ms_region_names.append(value)
+                elif key.endswith('}PersonInImage') and value.strip():
+                    self.data.persons_in_image.append(value)
+        stack.append(name)
+
+    def end(self, name: str):
+        stack = self.stack
+        stack.pop()
+        value = ''.join(self.text) if self.text else ''
+        self.text.clear()
+        region = self.region
+        if value.strip():
+            if name == _RDF_LI and len(stack) >= 2:
+                prop = stack[-2]
+                field = _LIST_PROPERTIES.get(prop)
+                if field:
+                    getattr(self.data, field).append(value)
+                elif _local(prop) == 'PersonInImage':
+                    self.data.persons_in_image.append(value)
+            elif region is not None:
+                # Struktur som element (<mwg-rs:Name>..</mwg-rs:Name>, <stArea:x>..</stArea:x>)
+                if name == _MWG_NAME and region.name is None:
+                    region.name = value
+                elif name == _MWG_TYPE and not region.type:
+                    region.type = value
+                elif name in _AREA_KEYS and stack and stack[-1] == _MWG_AREA:
+                    region._set_area(_AREA_KEYS[name], value)
+            elif _local(name) == 'PersonDisplayName':
+                self.data.ms_region_names.append(value)
+        if region is not None and len(stack) == self.region_depth:
+            self.data.regions.append(region)
+            self.region = None